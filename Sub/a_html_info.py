@@ -1,96 +1,198 @@
 import os
 import re
-import chardet
 import pandas as pd
+from Sub.o_file_cache import cached, decode_file, file_encoding
+from Sub.s_mmap_reader import MappedFile, decode, is_wide
+from Sub.q_profile import track_file
+from Sub.u_batch import make_executor, match_files
+
+# 解析规则变化时加一，使共享缓存中旧的解析结果失效
+PARSE_VERSION = 1
+COLUMNS = [
+    'id', 'Type', 'Dates', 'Observatory',
+    'Reference Frame', 'Centre of Frame', 'Epoch of Equinox',
+    'Time Scale', 'Reduction', 'Coordinates', 'Diffraction', 'Receptor',
+    'Telescope', 'Observers', 'Relative To'
+]
+
+# 各段落中 "key: value" 行的键与输出列的对应关系
+KEY_TABLE = {
+    'Contents': {
+        'type': 'Type',
+        'dates': 'Dates',
+        'observatory': 'Observatory',
+    },
+    'Informations': {
+        'reference frame': 'Reference Frame',
+        'centre of frame': 'Centre of Frame',
+        'center of frame': 'Centre of Frame',
+        'epoch of equinox': 'Epoch of Equinox',
+        'time scale': 'Time Scale',
+        'reduction': 'Reduction',
+        'coordinates': 'Coordinates',
+        'diff. refraction': 'Diffraction',
+        'receptor': 'Receptor',
+        'telescope': 'Telescope',
+        'observers': 'Observers',
+        'relative to': 'Relative To',
+    },
+}
+CONTENTS_KEYS = list(dict.fromkeys(KEY_TABLE['Contents'].values()))
+INFORMATIONS_KEYS = list(dict.fromkeys(KEY_TABLE['Informations'].values()))
+
+SECTION_RE = re.compile(rb'^\s*(Contents|Reference|Informations|Comments|Format)\.\s*$')
+KEY_RE = re.compile(rb'^\s*([a-z][a-z .]*?)\s*:\s*(.*?)\s*$')
+SATELLITE_RE = re.compile(rb'J\s*(\d+)\s*-\s*([A-Za-z]*)\s*:\s*(\d+)')
+FORMAT_ITEM_RE = re.compile(rb'^\s*(\d+)\.\s+(.*?)\s*$')
+RULER_RE = re.compile(rb'^\s*(Columns|---)')
+CONTINUATION_RE = re.compile(rb'^\s*([^<\s].*?)\s*$')
+
+
+def parse_lines(lines, encoding=None):
+    # 在字节行（可以是映射文件的 memoryview 切片）上匹配，只解码用到的值
+    record = {}
+    relative_to = []
+    satellites = []
+    formats = []
+    total_number = None
+    has_informations = False
+
+    section = None
+    in_satellites = False
+    in_items = True
+    for line in lines:
+        section_match = SECTION_RE.match(line)
+        if section_match:
+            section = decode(section_match.group(1))
+            has_informations = has_informations or section == 'Informations'
+            in_satellites = False
+            continue
+
+        if section in KEY_TABLE:
+            key_match = KEY_RE.match(line)
+            key = decode(key_match.group(1)) if key_match else None
+            if section == 'Contents':
+                if key == 'satellites':
+                    in_satellites = True
+                elif key is not None:
+                    in_satellites = False
+                if in_satellites:
+                    satellites.extend(SATELLITE_RE.findall(line))
+                if key == 'total number':
+                    total_number = decode(key_match.group(2), encoding)
+            column = KEY_TABLE[section].get(key)
+            if column == 'Relative To':
+                relative_to.append(decode(key_match.group(2), encoding))
+            elif column is not None and column not in record:
+                record[column] = decode(key_match.group(2), encoding)
+
+        elif section == 'Format' and in_items:
+            # 编号的列说明，缩进的续行并入上一项，遇到列标尺后结束
+            if RULER_RE.match(line):
+                in_items = False
+                continue
+            item_match = FORMAT_ITEM_RE.match(line)
+            if item_match:
+                formats.append([int(item_match.group(1)), decode(item_match.group(2), encoding)])
+            elif formats:
+                continuation = CONTINUATION_RE.match(line)
+                if continuation:
+                    formats[-1][1] += ' ' + decode(continuation.group(1), encoding)
+
+    if has_informations:
+        for column in INFORMATIONS_KEYS:
+            record.setdefault(column, None)
+        record['Relative To'] = '; '.join(relative_to) if relative_to else None
+
+    return {
+        'record': record,
+        'has_informations': has_informations,
+        'satellites': [(f'J{decode(number)}', decode(name), int(count)) for number, name, count in satellites],
+        'total_number': total_number,
+        'formats': formats,
+    }
+
+
+def parse_html(html_content):
+    return parse_lines(html_content.encode('utf-8').splitlines(), 'utf-8')
+
+
+def parse_file(file_path):
+    encoding = file_encoding(file_path)
+    if is_wide(encoding):
+        return parse_html(decode_file(file_path))
+    with MappedFile(file_path) as mapped:
+        return parse_lines(mapped.lines(), encoding)
+
 
-def a_html_info(folder_path):
-    results = pd.DataFrame(columns=[
-        'id', 'Type', 'Dates', 'Observatory',
-        'Reference Frame', 'Centre of Frame', 'Epoch of Equinox',
-        'Time Scale', 'Reduction', 'Coordinates', 'Diffraction', 'Receptor',
-        'Telescope', 'Observers', 'Relative To'
-    ])
+def extract_file(file_path):
+    # 解析结果按文件内容缓存，修改 parse_lines 后需要更新 PARSE_VERSION
+    with track_file('a_html_info', file_path) as record:
+        def parse(path):
+            with record.phase('parse'):
+                return parse_file(path)
+        info = cached(f'html_sections:{PARSE_VERSION}', file_path, parse)
+        record.rows = len(info['formats'])
+    return info
+
+
+def a_html_info(folder_path, output_path='./result/informations.csv', max_workers=None, executor_type='process',
+                patterns=None):
+    # 按列收集，最后一次性构建 DataFrame
+    results = {column: [] for column in COLUMNS}
+    satellites = {'id': [], 'Satellite': [], 'Name': [], 'Count': []}
+    formats = {'id': [], 'Column': [], 'Description': []}
 
     status = {
         'success': [],
-        'failures': {}
+        'failures': {},
+        'mismatch': []
     }
 
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.html'):
-            file_path = os.path.join(folder_path, filename)
-            file_id = os.path.splitext(filename)[0]
-
-            with open(file_path, 'rb') as file:
-                raw_data = file.read()
-                result = chardet.detect(raw_data)
-                encoding = result['encoding']
-
-            with open(file_path, 'r', encoding=encoding) as file:
-                html_content = file.read()
-
-            current_file_results = {'id': file_id}
-
-            contents_patterns = {
-                'Type': r'\btype:\s*(.+)',
-                'Dates': r'\bdates:\s*(.+)',
-                'Observatory': r'\bobservatory:\s*(.+)'
-            }
-
-            for key, pattern in contents_patterns.items():
-                regex = re.compile(pattern)
-                match = regex.search(html_content)
-                if match:
-                    current_file_results[key] = match.group(1).strip()
-                    status['success'].append(filename)
-                else:
-                    if filename not in status['failures']:
-                        status['failures'][filename] = []
-                    status['failures'][filename].append(key)
-
-            informations_pattern = r'Informations\..*?(?=\b(Comments|Format)\.)'
-            informations_match = re.search(informations_pattern, html_content, re.DOTALL)
-            if informations_match:
-                informations_content = informations_match.group(0).strip()
-
-                fields_patterns = {
-                    'Reference Frame': r'\breference frame:\s*(.+)',
-                    'Centre of Frame': r'\bcentre of frame:\s*(.+)',
-                    'Epoch of Equinox': r'\bepoch of equinox:\s*(.+)',
-                    'Time Scale': r'\btime scale:\s*(.+)',
-                    'Reduction': r'\breduction:\s*(.+)',
-                    'Coordinates': r'\bcoordinates:\s*(.+)',
-                    'Diffraction': r'\bdiff. refraction:\s*(.+)',
-                    'Receptor': r'\breceptor:\s*(.+)',
-                    'Telescope': r'\btelescope:\s*(.+)',
-                    'Observers': r'\bobservers:\s*(.+)'
-                }
-
-                for field, pattern in fields_patterns.items():
-                    regex = re.compile(pattern)
-                    match = regex.search(informations_content)
-                    if match:
-                        current_file_results[field] = match.group(1).strip()
-                    else:
-                        current_file_results[field] = None
-
-                relative_pattern = r'\brelative to:\s*(.+)'
-                relative_matches = re.findall(relative_pattern, informations_content)
-                if relative_matches:
-                    current_file_results['Relative To'] = '; '.join(relative_matches)
-
+    html_files = match_files(sorted(f for f in os.listdir(folder_path) if f.endswith('.html')), patterns)
+    file_paths = [os.path.join(folder_path, f) for f in html_files]
+    with make_executor(executor_type, max_workers) as executor:
+        parsed = list(executor.map(extract_file, file_paths, chunksize=8))
+
+    for filename, info in zip(html_files, parsed):
+        file_id = os.path.splitext(filename)[0]
+        record = info['record']
+        record['id'] = file_id
+        for column in COLUMNS:
+            results[column].append(record.get(column))
+
+        for key in CONTENTS_KEYS:
+            if key in record:
+                status['success'].append(filename)
             else:
-                if filename not in status['failures']:
-                    status['failures'][filename] = []
-                status['failures'][filename].append('Informations')
-
-            results = results.append(current_file_results, ignore_index=True)
-
-    output_path = './result/informations.csv'
-    results.to_csv(output_path, index=False)
+                status['failures'].setdefault(filename, []).append(key)
+        if not info['has_informations']:
+            status['failures'].setdefault(filename, []).append('Informations')
+
+        for satellite, name, count in info['satellites']:
+            satellites['id'].append(file_id)
+            satellites['Satellite'].append(satellite)
+            satellites['Name'].append(name)
+            satellites['Count'].append(count)
+        if info['total_number'] is not None and info['satellites']:
+            counted = sum(count for _, _, count in info['satellites'])
+            if str(counted) != info['total_number']:
+                status['mismatch'].append(f"{filename}({info['total_number']} != {counted})")
+
+        for number, description in info['formats']:
+            formats['id'].append(file_id)
+            formats['Column'].append(number)
+            formats['Description'].append(description)
+
+    pd.DataFrame(results, columns=COLUMNS).to_csv(output_path, index=False)
+    output_dir = os.path.dirname(output_path)
+    pd.DataFrame(satellites).to_csv(os.path.join(output_dir, 'satellites.csv'), index=False)
+    pd.DataFrame(formats).to_csv(os.path.join(output_dir, 'formats.csv'), index=False)
 
     print(f"成功提取 {len(status['success'])} 项到 {output_path} ")
     if status['failures']:
         print("失败的项有：")
         for filename, missing_keys in status['failures'].items():
-            print(f"文件 {filename} 缺失以下信息：{', '.join(missing_keys)}")
\ No newline at end of file
+            print(f"文件 {filename} 缺失以下信息：{', '.join(missing_keys)}")
+    if status['mismatch']:
+        print("total number 与各卫星观测数之和不一致：" + ', '.join(status['mismatch']))
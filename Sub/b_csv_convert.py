@@ -1,66 +1,181 @@
 import os
-import chardet
-import csv
 import re
+import numpy as np
+from concurrent.futures import as_completed
 from tqdm import tqdm
+from Sub.o_file_cache import file_encoding, read_sample, shared_cache
+from Sub.q_profile import track_file
+from Sub.r_fixed_width import read_fixed_width, ruler_width
+from Sub.s_mmap_reader import MappedFile, decode
+from Sub.t_csv_writer import RowWriter
+from Sub.u_batch import make_executor, match_files
 
-def b_convert_csv(folder_path, csv_path):
+# 转换规则变化时加一，缓存中旧版本的记录全部重新转换
+CONVERT_VERSION = 2
+CONVERT_KIND = f'convert:{CONVERT_VERSION}'
+CHUNK_ROWS = 10000
+
+DELIMITER_PATTERNS = {',': re.compile(r'[^,]+'), '\t': re.compile(r'[^\t]+'), ' ': re.compile(r'[^\s]+')}
+
+
+def detect_delimiter(file_content):
+    max_match_count = 0
+    detected_delimiter = None
+    for delimiter, pattern in DELIMITER_PATTERNS.items():
+        matches = len(pattern.findall(file_content))
+        if matches > max_match_count:
+            max_match_count = matches
+            detected_delimiter = delimiter
+    return detected_delimiter
+
+
+def convert_kind(csv_file_path):
+    # 输出路径也是键的一部分：同一个源文件可以转换到不同的文件夹
+    return f'{CONVERT_KIND}:{os.path.abspath(csv_file_path)}'
+
+
+def lookup_conversion(file_path, csv_file_path):
+    # 返回 (共享缓存中的转换记录, 输出是否仍是那次转换写出的文件)；源文件内容变化后记录为 None
+    entry = shared_cache.peek(convert_kind(csv_file_path), file_path)
+    if entry is None or not os.path.exists(csv_file_path):
+        return entry, False
+    stat = os.stat(csv_file_path)
+    return entry, entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns
+
+
+def record_conversion(file_path, csv_file_path, result):
+    # 只有确实写入成功的文件才记入缓存
+    stat = os.stat(csv_file_path)
+    shared_cache.put(convert_kind(csv_file_path), file_path, {
+        'encoding': result['encoding'], 'delimiter': result['delimiter'], 'rows': result['rows'],
+        'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+    })
+
+
+def split_fields(line, delimiter):
+    if delimiter == '\t':
+        return line.split('\t')
+    elif delimiter == ' ':
+        return line.split()
+    return line.split(',')
+
+
+def read_rows(file_path, encoding, delimiter, chunk_rows=CHUNK_ROWS):
+    # 逐块返回加了方括号的字段，每块最多 chunk_rows 行；空格分隔的 NSDC 文件按定宽记录读取，空字段留在原来的列上
+    if delimiter == ' ':
+        width = ruler_width(os.path.splitext(file_path)[0] + '.html')
+        columns, fixed = read_fixed_width(file_path, encoding, width=width)
+        if not fixed:
+            for start in range(0, len(columns), chunk_rows):
+                yield [[f"[{field}]" for field in fields] for fields in columns[start:start + chunk_rows]]
+        elif columns:
+            for start in range(0, len(columns[0]), chunk_rows):
+                block = np.stack([column[start:start + chunk_rows] for column in columns], axis=1)
+                yield np.char.add(np.char.add('[', block), ']').tolist()
+        return
+    with MappedFile(file_path) as mapped:
+        rows = []
+        for line in mapped.lines(skip_blank=True):
+            rows.append([f"[{field}]" for field in split_fields(decode(line, encoding, 'ignore'), delimiter)])
+            if len(rows) >= chunk_rows:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def convert_file(file_path, csv_file_path, encoding=None, delimiter=None, chunk_rows=CHUNK_ROWS):
+    # 逐块解析，交给后台线程写出，解析不等待磁盘，内存中最多只有几块行；输出先写临时文件，成功后再替换
+    with track_file('b_convert_csv', file_path) as record:
+        with record.phase('detect'):
+            if encoding is None:
+                encoding = file_encoding(file_path)
+            if delimiter is None:
+                delimiter = detect_delimiter(read_sample(file_path).decode(encoding or 'utf-8', errors='ignore'))
+        result = {'encoding': encoding, 'delimiter': delimiter, 'rows': 0, 'error': None}
+        if delimiter is None:
+            result['error'] = '无法识别分隔符'
+        else:
+            try:
+                chunks = read_rows(file_path, encoding, delimiter, chunk_rows)
+                with RowWriter(csv_file_path) as writer:
+                    while True:
+                        # 解析时间按块累加；wait 为队列满时等待写入的时间
+                        with record.phase('parse'):
+                            rows = next(chunks, None)
+                        if rows is None:
+                            break
+                        with record.phase('wait'):
+                            if result['rows'] == 0:
+                                writer.write([[f"C{i+1}" for i in range(len(rows[0]))]])
+                            writer.write(rows)
+                        result['rows'] += len(rows)
+                record.phases['write'] = writer.seconds
+                if result['rows'] == 0:
+                    result['error'] = '文件中没有数据'
+            except Exception as e:
+                result['error'] = str(e)
+        record.rows = result['rows']
+        record.error = result['error']
+    result['seconds'] = record.seconds
+    return result
+
+
+def find_jobs(folder_path, csv_path, patterns=None, use_cache=True):
+    # 返回需要转换的文件和未变化而跳过的文件数
+    skipped = 0
+    jobs = {}
+    txt_files = match_files(sorted(f for f in os.listdir(folder_path) if f.endswith(".txt")), patterns)
+    for filename in txt_files:
+        file_path = os.path.join(folder_path, filename)
+        csv_file_path = os.path.join(csv_path, filename.replace('.txt', '.csv'))
+        entry, current = lookup_conversion(file_path, csv_file_path) if use_cache else (None, False)
+        if current:
+            # 源文件没有变化且输出仍是上次写出的文件，跳过
+            skipped += 1
+            continue
+        # 输出缺失或被改动但源文件未变化时，沿用缓存中的编码和分隔符
+        sniffed = (entry['encoding'], entry['delimiter']) if entry is not None else (None, None)
+        jobs[filename] = (file_path, csv_file_path, sniffed)
+    return jobs, skipped
+
+
+def b_convert_csv(folder_path, csv_path, max_workers=None, use_cache=True, executor_type='process', patterns=None):
     if not os.path.exists(csv_path):
         os.makedirs(csv_path)
 
-    def detect_encoding(file_path):
-        with open(file_path, 'rb') as file:
-            return chardet.detect(file.read())['encoding']
-
-    def detect_delimiter(file_content):
-        patterns = {',': re.compile(r'[^,]+'), '\t': re.compile(r'[^\t]+'), ' ': re.compile(r'[^\s]+')}
-        max_match_count = 0
-        detected_delimiter = None
-        for delimiter, pattern in patterns.items():
-            matches = len(pattern.findall(file_content))
-            if matches > max_match_count:
-                max_match_count = matches
-                detected_delimiter = delimiter
-        return detected_delimiter
-
     failed_files = []
+    jobs, skipped = find_jobs(folder_path, csv_path, patterns, use_cache)
 
-    txt_files = [f for f in os.listdir(folder_path) if f.endswith(".txt")]
-    for filename in tqdm(txt_files, desc='处理TXT文件'):
-        file_path = os.path.join(folder_path, filename)
-        encoding = detect_encoding(file_path)
-        with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
-            file_content = file.read()
-            delimiter = detect_delimiter(file_content)
-            if delimiter is None:
-                failed_files.append(filename)
-                continue
-            lines = file_content.split('\n')
-            csv_lines = []
-            for line in lines:
-                if line.strip():
-                    if delimiter == '\t':
-                        fields = line.split('\t')
-                    elif delimiter == ' ':
-                        fields = line.split()
-                    else:
-                        fields = line.split(',')
-                    fields_with_brackets = [f"[{field}]" for field in fields]
-                    csv_lines.append(fields_with_brackets)
-        csv_filename = filename.replace('.txt', '.csv')
-        csv_file_path = os.path.join(csv_path, csv_filename)
-        try:
-            with open(csv_file_path, 'w', encoding='utf-8', newline='') as csv_file:
-                csv_writer = csv.writer(csv_file)
-                headers = [f"C{i+1}" for i in range(len(csv_lines[0]))]
-                csv_writer.writerow(headers)
-                for row in csv_lines:
-                    csv_writer.writerow(row)
-        except Exception as e:
-            failed_files.append(filename)
-            print(f"写入{filename}失败: {e}")
+    slowest = (None, 0.0)
+    if jobs:
+        # 工作进程逐块解析，由各自的后台线程写出，每个输出先写临时文件再原子替换
+        with make_executor(executor_type, max_workers) as executor:
+            futures = {
+                executor.submit(convert_file, file_path, csv_file_path, *sniffed): filename
+                for filename, (file_path, csv_file_path, sniffed) in jobs.items()
+            }
+            progress = tqdm(as_completed(futures), total=len(futures), desc='处理TXT文件')
+            for future in progress:
+                filename = futures[future]
+                file_path, csv_file_path, _ = jobs[filename]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'error': str(e)}
+                if result['error']:
+                    failed_files.append(filename)
+                    print(f"写入{filename}失败: {result['error']}")
+                    continue
+                # 进度条上显示目前最慢的文件
+                if result['seconds'] > slowest[1]:
+                    slowest = (filename, result['seconds'])
+                    progress.set_postfix_str(f'最慢 {filename} {result["seconds"]:.2f}s')
+                record_conversion(file_path, csv_file_path, result)
 
+    if skipped:
+        print(f"{skipped} 个文件未变化，已跳过。")
     if failed_files:
         print("转换失败的文件:", failed_files)
     else:
-        print("所有文件转换成功。")
\ No newline at end of file
+        print("所有文件转换成功。")
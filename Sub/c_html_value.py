@@ -1,11 +1,120 @@
+import os
+import json
 import pandas as pd
+from Sub.j_csv_numeric import unwrap
+from Sub.o_file_cache import cached
+from Sub.t_csv_writer import atomic_open
+
+PROFILE_KIND = 'value_profile:1'
+EMPTY = '(空)'
+# 归并后表示“没有信息”的写法
+MISSING = 'no information'
+MISSING_VALUES = ['', 'nan', 'none', 'unknown', 'no information', 'not given', 'not specified', '?', '-']
+INFO_COLUMNS = ['Time Scale', 'Epoch of Equinox', 'Coordinates']
+INFO_CROSSTABS = [('Time Scale', 'Epoch of Equinox', 'Coordinates')]
+MERGED_COLUMNS = ['n-sat', 'n-obs']
+# 合并表的交叉表类别很多（卫星 × 台站有数千类），默认不统计，需要时传入例如 [('n-sat', 'n-obs')]
+MERGED_CROSSTABS = []
+TOP_ROWS = 20
+
+
+def normalize_values(values):
+    # 大小写、多余空白、末尾标点、J2000.0 这类多余的 .0 和整数的前导零不同的写法归为一类
+    keys = values.str.lower().str.replace(r'\s+', ' ', regex=True).str.strip(' ,.;:')
+    keys = keys.str.replace(r'(\d)\.0+\b', r'\1', regex=True).str.replace(r'^0+(?=\d)', '', regex=True)
+    return keys.mask(keys.isin(MISSING_VALUES) | (values == EMPTY), MISSING)
+
+
+def read_columns(csv_file, columns):
+    # 只读取需要的列，缺失值记为 EMPTY，合并表中的方括号去掉
+    header = pd.read_csv(csv_file, nrows=0).columns
+    usecols = [column for column in columns if column in header]
+    df = pd.read_csv(csv_file, usecols=usecols, dtype=str, keep_default_na=False)
+    return pd.DataFrame({column: unwrap(df[column]).fillna(EMPTY).astype(object) for column in usecols},
+                        index=df.index), [column for column in columns if column not in header]
+
+
+def profile_file(csv_file, columns, crosstabs=()):
+    df, missing = read_columns(csv_file, list(dict.fromkeys(columns + [c for tab in crosstabs for c in tab])))
+    # 所有列展开成一张长表，取值计数、归并都只需一次分组
+    long = df.melt(var_name='column', value_name='value')
+    long['key'] = normalize_values(long['value'].astype('string')).astype(object)
+    counts = long.groupby(['column', 'key', 'value'], sort=False).size()
+
+    profile = {'rows': len(df), 'missing': missing, 'columns': {}, 'crosstabs': {}}
+    counted = set(counts.index.get_level_values('column'))
+    for column in df.columns:
+        # 只有表头没有数据行时该列没有任何取值，记为空的统计
+        if column not in counted:
+            profile['columns'][column] = {'values': [], 'clusters': []}
+            continue
+        column_counts = counts.loc[column]
+        clusters = column_counts.groupby(level='key', sort=False).sum().sort_values(ascending=False, kind='stable')
+        profile['columns'][column] = {
+            'values': [[value, int(count)] for (_, value), count in
+                       column_counts.sort_values(ascending=False, kind='stable').items()],
+            'clusters': [[key, int(total), {value: int(count) for value, count in
+                                            column_counts.loc[key].sort_values(ascending=False).items()}]
+                         for key, total in clusters.items()],
+        }
+
+    # 交叉表按归并后的取值统计
+    keys = pd.DataFrame(long['key'].to_numpy().reshape(len(df.columns), len(df)).T, columns=df.columns)
+    for tab in crosstabs:
+        tab = [column for column in tab if column in keys.columns]
+        if len(tab) < 2:
+            continue
+        sizes = keys.groupby(tab, sort=False).size().sort_values(ascending=False, kind='stable')
+        profile['crosstabs'][' × '.join(tab)] = [list(index) + [int(count)] for index, count in sizes.items()]
+    return profile
+
+
+def cached_profile(csv_file, columns, crosstabs=()):
+    # 结果按文件内容和所选的列缓存，文件不变时直接读取
+    columns, crosstabs = list(columns), [list(tab) for tab in crosstabs]
+    kind = f'{PROFILE_KIND}:{json.dumps([columns, crosstabs], ensure_ascii=False)}'
+    return cached(kind, csv_file, lambda path: profile_file(path, columns, crosstabs))
+
+
+def print_profile(profile, top=TOP_ROWS):
+    for column in profile['missing']:
+        print(f"CSV文件中没有找到'{column}'列。")
+    for column, stats in profile['columns'].items():
+        print(f"'{column}'列共 {len(stats['values'])} 种取值，归并后 {len(stats['clusters'])} 类：")
+        for key, total, variants in stats['clusters'][:top]:
+            print(f"  {key} ({total})" + ('：' + '，'.join(f'{value} ({count})' for value, count in variants.items())
+                                          if len(variants) > 1 else ''))
+        if len(stats['clusters']) > top:
+            print(f"  ... 其余 {len(stats['clusters']) - top} 类")
+        print()
+    for name, rows in profile['crosstabs'].items():
+        print(f"{name}：")
+        for row in rows[:top]:
+            print('  ' + ' | '.join(row[:-1]) + f' ({row[-1]})')
+        if len(rows) > top:
+            print(f"  ... 其余 {len(rows) - top} 类")
+        print()
+
+
+def c_value_profile(info_path, columns=INFO_COLUMNS, crosstabs=INFO_CROSSTABS, merged_path=None,
+                    merged_columns=MERGED_COLUMNS, merged_crosstabs=MERGED_CROSSTABS, output_path=None):
+    # informations 表和合并后的观测表各读取一次，返回 {表名: 统计结果}，可以另存为 JSON
+    profiles = {'informations': cached_profile(info_path, columns, crosstabs)}
+    if merged_path and os.path.exists(merged_path) and merged_columns:
+        profiles['merged'] = cached_profile(merged_path, merged_columns, merged_crosstabs)
+    for name, profile in profiles.items():
+        print(f"{name}：{profile['rows']} 行")
+        print_profile(profile)
+    if output_path:
+        with atomic_open(output_path) as file:
+            json.dump(profiles, file, ensure_ascii=False, indent=1)
+    return profiles
+
 
 def c_info_value(csv_file, column_name):
-    df = pd.read_csv(csv_file)
-    if column_name in df.columns:
-        unique_values = df[column_name].unique()
-        values_as_string = '\n'.join(unique_values)
+    profile = cached_profile(csv_file, [column_name])
+    if column_name in profile['columns']:
         print(f"'{column_name}'列的所有值：")
-        print(values_as_string + '\n')
+        print('\n'.join(value for value, _ in profile['columns'][column_name]['values']) + '\n')
     else:
-        print(f"CSV文件中没有找到'{column_name}'列。")
\ No newline at end of file
+        print(f"CSV文件中没有找到'{column_name}'列。")
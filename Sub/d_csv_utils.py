@@ -1,48 +1,186 @@
 import os
 import csv
-from collections import defaultdict
-import chardet
-
-def d_csv_utils(folder_path, sort_by='count'):
-    column_count = defaultdict(int)
-    column_files = defaultdict(list)
-
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.csv'):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                # 自动检测文件编码
-                with open(file_path, 'rb') as file:
-                    result = chardet.detect(file.read())
-                    encoding = result['encoding']
-                
-                # 读取 CSV 文件
-                with open(file_path, mode='r', encoding=encoding, errors='ignore') as file:
-                    reader = csv.reader(file)
-                    headers = next(reader)
-                    for header in headers:
-                        if header:  # 确保列名非空
-                            column_count[header] += 1
-                            column_files[header].append(os.path.splitext(filename)[0])  # 去掉文件后缀
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-
-    # 创建输出目录
-    output_path = './result/column_info.csv'
+import json
+import numpy as np
+import pandas as pd
+from Sub.o_file_cache import cached, file_encoding, shared_cache
+from Sub.j_csv_numeric import swap_exponent, unwrap
+from Sub.q_profile import track_file
+from Sub.t_csv_writer import atomic_open
+from Sub.u_batch import make_executor, match_files
 
-    # 确定排序方式
-    if sort_by == 'name':
-        sorted_columns = sorted(column_count.items(), key=lambda item: item[0])
-    else:  # 默认按统计次数排序
-        sorted_columns = sorted(column_count.items(), key=lambda item: item[1], reverse=True)
+CENSUS_KIND = 'census:1'
+CHUNK_SIZE = 10000
+MAX_SAMPLES = 5
+TYPE_RATIO = 0.95
+
+def read_first_row(file_path, encoding=None):
+    # 只读取文件开头判断编码，表头只需要第一行
+    encoding = encoding or file_encoding(file_path)
+    with open(file_path, mode='r', encoding=encoding, errors='ignore', newline='') as file:
+        headers = next(csv.reader(file), [])
+    return headers, encoding
+
+def read_csv_header(file_path, encoding=None):
+    if encoding:
+        return read_first_row(file_path, encoding)
+    # 表头只在文件开头，按 size/mtime 缓存，不对整个文件求哈希
+    headers, encoding = cached('csv_header', file_path, read_first_row, by_content=False)
+    return headers, encoding
+
+def count_chunk(rows, width, stats):
+    # 整块展开成一列一次性解析，按列累计非空数、数字数、整数数
+    text = unwrap(np.array(rows, dtype=object).ravel())
+    codes = np.tile(np.arange(width), len(rows))
+    present = text.notna().to_numpy()
+    numbers = pd.to_numeric(swap_exponent(text), errors='coerce').to_numpy(dtype='float64')
+    parsed = ~np.isnan(numbers)
+    plain = ~text.str.contains(r'[.eEdD]', regex=True).fillna(True).to_numpy()
+    integer = parsed & plain & (numbers == np.floor(numbers))
+    stats['present'] += np.bincount(codes[present], minlength=width)
+    stats['numeric'] += np.bincount(codes[parsed], minlength=width)
+    stats['integer'] += np.bincount(codes[integer], minlength=width)
+    values = text.to_numpy(dtype=object)
+    for code in range(width):
+        if len(stats['samples'][code]) < MAX_SAMPLES:
+            for value in pd.unique(values[code::width][present[code::width]]):
+                if value not in stats['samples'][code]:
+                    stats['samples'][code].append(value)
+                if len(stats['samples'][code]) >= MAX_SAMPLES:
+                    break
+
+def file_census(file_path, encoding=None, chunk_size=CHUNK_SIZE):
+    # 读取一遍文件，返回表头和每列的统计
+    with track_file('d_csv_utils', file_path) as record:
+        with record.phase('detect'):
+            headers, encoding = read_csv_header(file_path, encoding)
+        with record.phase('parse'):
+            result = count_file(file_path, headers, encoding, chunk_size)
+        record.rows = result['rows']
+    return result
+
+def count_file(file_path, headers, encoding, chunk_size=CHUNK_SIZE):
+    width = len(headers)
+    stats = {'present': np.zeros(width, dtype='int64'), 'numeric': np.zeros(width, dtype='int64'),
+             'integer': np.zeros(width, dtype='int64'), 'samples': [[] for _ in range(width)]}
+    rows = 0
+    with open(file_path, mode='r', encoding=encoding, errors='ignore', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        chunk = []
+        for fields in reader:
+            if not fields:
+                continue
+            chunk.append(fields[:width] if len(fields) >= width else fields + [''] * (width - len(fields)))
+            if len(chunk) >= chunk_size:
+                count_chunk(chunk, width, stats)
+                rows += len(chunk)
+                chunk = []
+        if chunk:
+            count_chunk(chunk, width, stats)
+            rows += len(chunk)
+    columns = [{'name': header, 'present': int(stats['present'][i]), 'numeric': int(stats['numeric'][i]),
+                'integer': int(stats['integer'][i]), 'samples': stats['samples'][i]}
+               for i, header in enumerate(headers)]
+    return {'encoding': encoding, 'rows': rows, 'columns': columns}
+
+def infer_type(present, numeric, integer):
+    if present == 0:
+        return 'empty'
+    if numeric >= TYPE_RATIO * present:
+        return 'int' if integer >= TYPE_RATIO * present else 'float'
+    return 'string'
+
+def summarize(census):
+    # 按列名汇总所有文件的统计
+    columns = {}
+    for file_id, result in census.items():
+        for column in result['columns']:
+            name = column['name']
+            if not name:  # 确保列名非空
+                continue
+            summary = columns.setdefault(name, {'count': 0, 'files': [], 'rows': 0, 'present': 0,
+                                                'numeric': 0, 'integer': 0, 'samples': []})
+            summary['count'] += 1
+            summary['files'].append(file_id)
+            summary['rows'] += result['rows']
+            for key in ('present', 'numeric', 'integer'):
+                summary[key] += column[key]
+            for value in column['samples']:
+                if len(summary['samples']) < MAX_SAMPLES and value not in summary['samples']:
+                    summary['samples'].append(value)
+    for summary in columns.values():
+        summary['type'] = infer_type(summary['present'], summary['numeric'], summary['integer'])
+        summary['null_ratio'] = round(1 - summary['present'] / summary['rows'], 4) if summary['rows'] else 1.0
+    return columns
 
-    # 写入统计结果
-    with open(output_path, mode='w', encoding='utf-8', newline='') as file:
+def write_outputs(columns, sorted_columns, output_path):
+    # 写入统计结果，三个文件都先写临时文件再替换
+    with atomic_open(output_path) as file:
         writer = csv.writer(file)
-        writer.writerow(['Column Name', 'Count', 'Files'])
+        writer.writerow(['Column Name', 'Count', 'Files', 'Type', 'Null Ratio', 'Samples'])
         for column, count in sorted_columns:
+            summary = columns[column]
             # 对于出现次数少于10的列，记录文件名
-            files = "; ".join(column_files[column]) if count < 10 else ""
-            writer.writerow([column, count, files])
+            files = "; ".join(summary['files']) if count < 10 else ""
+            writer.writerow([column, count, files, summary['type'], summary['null_ratio'],
+                             "; ".join(summary['samples'])])
+
+    base_path = os.path.splitext(output_path)[0]
+    with atomic_open(base_path + '.json') as file:
+        json.dump({column: columns[column] for column, _ in sorted_columns}, file, ensure_ascii=False, indent=1)
+    try:
+        table = pd.DataFrame([{'column': column, **columns[column]} for column, _ in sorted_columns])
+        with atomic_open(base_path + '.parquet', 'wb') as file:
+            table.to_parquet(file, index=False)
+    except ImportError:
+        pass
+    except (TypeError, ValueError) as e:
+        # pyarrow 无法推断 samples 等列表列的类型时只跳过 parquet，CSV 和 JSON 已经写好
+        print(f"无法写入 {base_path}.parquet: {e}")
+
+def cached_census(file_path):
+    return cached(CENSUS_KIND, file_path, file_census)
+
+def find_jobs(folder_path, patterns=None):
+    # 缓存中已有统计的文件直接取用，其余的需要重新扫描
+    census = {}
+    jobs = {}
+    for filename in match_files(sorted(f for f in os.listdir(folder_path) if f.endswith('.csv')), patterns):
+        file_path = os.path.join(folder_path, filename)
+        result = shared_cache.peek(CENSUS_KIND, file_path)
+        if result is not None:
+            census[os.path.splitext(filename)[0]] = result
+        else:
+            jobs[filename] = file_path
+    return census, jobs
+
+def d_csv_utils(folder_path, sort_by='count', output_path='./result/column_info.csv', max_workers=None,
+                executor_type='process', patterns=None):
+    # 每个文件的统计按内容缓存，表头修改后只重新扫描改动过的文件
+    census, jobs = find_jobs(folder_path, patterns)
+    hits = len(census)
+    failed = 0
+
+    if jobs:
+        with make_executor(executor_type, max_workers) as executor:
+            futures = {filename: executor.submit(cached_census, file_path) for filename, file_path in jobs.items()}
+            for filename, future in futures.items():
+                try:
+                    census[os.path.splitext(filename)[0]] = future.result()
+                except Exception as e:
+                    print(f"Error reading {jobs[filename]}: {e}")
+                    failed += 1
+
+    columns = summarize(dict(sorted(census.items())))
+    # 确定排序方式
+    if sort_by == 'name':
+        sorted_columns = sorted(((name, s['count']) for name, s in columns.items()), key=lambda item: item[0])
+    else:  # 默认按统计次数排序
+        sorted_columns = sorted(((name, s['count']) for name, s in columns.items()), key=lambda item: item[1],
+                                reverse=True)
+    write_outputs(columns, sorted_columns, output_path)
 
-    print(f"列名信息输出到 {output_path}")
+    print(f"列名信息输出到 {output_path}，扫描 {len(jobs)} 个文件，{hits} 个文件使用缓存"
+          + (f"，{failed} 个文件读取失败" if failed else ''))
+    return columns
@@ -1,51 +1,228 @@
 import os
+import csv
+import numpy as np
 import pandas as pd
+from Sub.d_csv_utils import read_csv_header
+from Sub.g_csv_merge import normalize_headers
+from Sub.j_csv_numeric import swap_exponent, unwrap
+from Sub.q_profile import track_file
+from Sub.u_batch import make_executor, match_files
 
-def e_errror_info(folder_path):
-    output_file = './result/error_info.csv'
+CHUNK_SIZE = 10000
+EMPTY_THRESHOLD = 0.5
+NUMERIC_THRESHOLD = 0.95
+# 离群值：偏离中位数超过 OUTLIER_SCALE 倍的稳健标准差 (1.4826 * MAD)
+OUTLIER_SCALE = 10
+OUTLIER_MIN_COUNT = 20
+# 超过该比例的值都偏离时视为分布本身较宽（如跨零点的小时），不作为离群值
+OUTLIER_MAX_RATIO = 0.01
+# 每列用于估计中位数和 MAD 的样本数
+SAMPLE_SIZE = 10000
+MAX_EXAMPLES = 5
+REPORT_COLUMNS = ["文件名", "行号", "列名", "类型", "错误信息"]
 
+
+def issue(file_name, kind, message, lines=(), column=''):
+    return {"文件名": file_name, "行号": ';'.join(str(line) for line in lines), "列名": column,
+            "类型": kind, "错误信息": message}
+
+
+class ColumnStats:
+    # 逐块累计每列的非空数、数字数和无法解析的示例；离群值检测用的数字值每列只保留一个固定大小的水塘样本，
+    # 内存与块大小有关而与文件大小无关
+    def __init__(self, width, sample_size=SAMPLE_SIZE):
+        self.width = width
+        self.sample_size = sample_size
+        self.present = np.zeros(width, dtype='int64')
+        self.numeric = np.zeros(width, dtype='int64')
+        self.examples = [[] for _ in range(width)]
+        self.samples = [np.empty(0, dtype='float64') for _ in range(width)]
+        self.rng = np.random.default_rng(0)
+
+    def add(self, rows, lines):
+        # rows 已按表头补齐或截断为 width 列，整块展开成一列一次性解析
+        text, numbers = parse_chunk(rows)
+        codes = np.tile(np.arange(self.width), len(rows))
+        line_numbers = np.repeat(lines, self.width)
+        present = text.notna().to_numpy()
+        parsed = ~np.isnan(numbers)
+        self.present += np.bincount(codes[present], minlength=self.width)
+        columns = numbers.reshape(len(rows), self.width)
+        for code in range(self.width):
+            column = columns[:, code]
+            self.sample(code, column[~np.isnan(column)])
+        self.numeric += np.bincount(codes[parsed], minlength=self.width)
+
+        rejected = np.flatnonzero(present & ~parsed)
+        if len(rejected):
+            for code, line, value in zip(codes[rejected], line_numbers[rejected], text.to_numpy()[rejected]):
+                if len(self.examples[code]) < MAX_EXAMPLES:
+                    self.examples[code].append((line, value))
+
+    def sample(self, code, values):
+        # 水塘抽样（Algorithm R）：前 sample_size 个值直接保留，之后第 i 个值以 sample_size / i 的概率替换
+        reservoir = self.samples[code]
+        seen = self.numeric[code]
+        room = self.sample_size - len(reservoir)
+        if room > 0:
+            reservoir = np.concatenate([reservoir, values[:room]])
+            seen += len(values[:room])
+            values = values[room:]
+        if len(values):
+            positions = self.rng.integers(0, seen + np.arange(1, len(values) + 1))
+            keep = positions < self.sample_size
+            reservoir[positions[keep]] = values[keep]
+        self.samples[code] = reservoir
+
+    def estimates(self):
+        # 由样本估计中位数和稳健标准差 (1.4826 * MAD)，只返回需要检测离群值的列
+        result = {}
+        for code in range(self.width):
+            column = self.samples[code]
+            if self.numeric[code] < OUTLIER_MIN_COUNT or self.numeric[code] < NUMERIC_THRESHOLD * self.present[code]:
+                continue
+            median = np.median(column)
+            scale = 1.4826 * np.median(np.abs(column - median))
+            if scale > 0:
+                result[code] = (median, scale)
+        return result
+
+
+def parse_chunk(rows):
+    text = unwrap(np.array(rows, dtype=object).ravel())
+    return text, pd.to_numeric(swap_exponent(text), errors='coerce').to_numpy(dtype='float64')
+
+
+def read_chunks(file_path, encoding, width, chunk_size=CHUNK_SIZE):
+    # 逐行读取原始记录，返回 (行号数组, 每行字段数数组, 补齐到表头宽度的行)
+    with open(file_path, mode='r', encoding=encoding, errors='ignore', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        lines, rows = [], []
+        for fields in reader:
+            if not fields:
+                continue
+            lines.append(reader.line_num)
+            rows.append(fields)
+            if len(rows) >= chunk_size:
+                yield chunk_arrays(lines, rows, width)
+                lines, rows = [], []
+        if rows:
+            yield chunk_arrays(lines, rows, width)
+
+
+def chunk_arrays(lines, rows, width):
+    counts = np.fromiter(map(len, rows), dtype='int64', count=len(rows))
+    padded = [fields[:width] if len(fields) >= width else fields + [''] * (width - len(fields)) for fields in rows]
+    return np.array(lines, dtype='int64'), counts, padded
+
+
+def outlier_issues(file_path, encoding, headers, stats, chunk_size=CHUNK_SIZE):
+    # 第二遍逐块读取，按样本估计的中位数和尺度统计每列的离群值，只保留前几个示例
+    estimates = stats.estimates()
+    if not estimates:
+        return []
+    file_name = os.path.basename(file_path)
+    codes = list(estimates)
+    medians = np.array([estimates[code][0] for code in codes])
+    limits = OUTLIER_SCALE * np.array([estimates[code][1] for code in codes])
+    counts = np.zeros(len(codes), dtype='int64')
+    examples = [[] for _ in codes]
+    for lines, _, padded in read_chunks(file_path, encoding, stats.width, chunk_size):
+        _, numbers = parse_chunk(np.array(padded, dtype=object)[:, codes])
+        outliers = np.abs(numbers.reshape(len(lines), len(codes)) - medians) > limits
+        counts += outliers.sum(axis=0)
+        for i in np.flatnonzero(outliers.any(axis=0)):
+            if len(examples[i]) < MAX_EXAMPLES:
+                rows = np.flatnonzero(outliers[:, i])[:MAX_EXAMPLES - len(examples[i])]
+                examples[i] += [(lines[row], numbers[row * len(codes) + i]) for row in rows]
+
+    issues = []
+    for i, code in enumerate(codes):
+        if 0 < counts[i] <= OUTLIER_MAX_RATIO * stats.numeric[code]:
+            values = ', '.join(f'{value:g}' for _, value in examples[i])
+            issues.append(issue(
+                file_name, '离群值',
+                f"列 '{headers[code]}' 有{counts[i]}个离群值 (中位数 {medians[i]:g}): {values}",
+                [line for line, _ in examples[i]], headers[code]))
+    return issues
+
+
+def validate_file(file_path, chunk_size=CHUNK_SIZE):
+    # 记录的行数是发现的问题数
+    with track_file('e_errror_info', file_path) as record:
+        issues = check_file(file_path, chunk_size)
+        record.rows = len(issues)
+    return issues
+
+
+def check_file(file_path, chunk_size=CHUNK_SIZE):
+    file_name = os.path.basename(file_path)
+    try:
+        headers, encoding = read_csv_header(file_path)
+    except Exception as e:
+        return [issue(file_name, '读取', f"文件读取错误 - {e}")]
+    if not headers:
+        return [issue(file_name, '读取', "文件为空或没有表头")]
+
+    issues = []
+    width = len(headers)
+    if any(h.strip() == "" for h in headers):
+        issues.append(issue(file_name, '表头', "表头中存在空列名", [1]))
+    headers = normalize_headers(headers)
+
+    stats = ColumnStats(width)
+    rows = 0
+    try:
+        for lines, counts, padded in read_chunks(file_path, encoding, width, chunk_size):
+            # 字段数与表头不一致的行（真实的不齐行，而不是读取后被补齐的结果）
+            for line, count in zip(lines[counts != width], counts[counts != width]):
+                issues.append(issue(file_name, '列数', f"第{line}行的列数({count})与表头列数({width})不一致", [line]))
+            stats.add(padded, lines)
+            rows += len(lines)
+    except Exception as e:
+        return issues + [issue(file_name, '读取', f"文件读取错误 - {e}")]
+    if not rows:
+        return issues
+
+    for code, header in enumerate(headers):
+        empty_ratio = 1 - stats.present[code] / rows
+        if empty_ratio > EMPTY_THRESHOLD:
+            issues.append(issue(file_name, '空值', f"列 '{header}' 空值比例过高 ({empty_ratio:.1%})", column=header))
+        # 绝大多数值是数字的列中，找出无法解析为数字的个别值
+        if stats.present[code] and NUMERIC_THRESHOLD <= stats.numeric[code] / stats.present[code] < 1:
+            bad = stats.present[code] - stats.numeric[code]
+            examples = stats.examples[code]
+            issues.append(issue(
+                file_name, '类型',
+                f"列 '{header}' 有{bad}个值无法解析为数字: {', '.join(value for _, value in examples)}",
+                [line for line, _ in examples], header))
+    try:
+        return issues + outlier_issues(file_path, encoding, headers, stats, chunk_size)
+    except Exception as e:
+        return issues + [issue(file_name, '读取', f"文件读取错误 - {e}")]
+
+
+def e_errror_info(folder_path, output_file='./result/error_info.csv', max_workers=None, chunk_size=CHUNK_SIZE,
+                  executor_type='process', patterns=None):
     if not os.path.exists(folder_path):
         print("指定的文件夹不存在！")
         return
 
-    csv_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".csv")]
+    csv_files = match_files(sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".csv")),
+                            patterns)
     if not csv_files:
         print("指定文件夹中没有CSV文件！")
         return
 
     errors = []
-
-    for file_path in csv_files:
-        file_name = os.path.basename(file_path)
-        try:
-            data = pd.read_csv(file_path)
-        except Exception as e:
-            errors.append({"文件名": file_name, "错误信息": f"文件读取错误 - {e}"})
-            continue
-
-        headers = list(data.columns)
-        if any(h.strip() == "" for h in headers):
-            errors.append({"文件名": file_name, "错误信息": "表头中存在空列名"})
-
-        for i, row in enumerate(data.itertuples(index=False, name=None)):
-            if len(row)!= len(headers):
-                errors.append({
-                    "文件名": file_name,
-                    "错误信息": f"第{i + 1}行的列数({len(row)})与表头列数({len(headers)})不一致"
-                })
-
-        empty_threshold = 0.5
-        empty_columns = data.isnull().mean()
-        for col_name, empty_ratio in empty_columns.items():
-            if empty_ratio > empty_threshold:
-                errors.append({
-                    "文件名": file_name,
-                    "错误信息": f"列 '{col_name}' 空值比例过高 ({empty_ratio:.1%})"
-                })
+    with make_executor(executor_type, max_workers) as executor:
+        for issues in executor.map(validate_file, csv_files, [chunk_size] * len(csv_files)):
+            errors.extend(issues)
 
     if errors:
-        error_df = pd.DataFrame(errors)
+        error_df = pd.DataFrame(errors, columns=REPORT_COLUMNS)
         error_df.to_csv(output_file, index=False, encoding="utf-8-sig")
-        print(f"检测完成！错误报告已保存到 '{output_file}'")
+        print(f"检测完成！共 {len(errors)} 条问题，错误报告已保存到 '{output_file}'")
     else:
-        print("检测完成！未发现错误。")
\ No newline at end of file
+        print("检测完成！未发现错误。")
@@ -1,7 +1,8 @@
 import sys
 import os
-import pandas as pd
-import chardet
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QTableWidget, QTableWidgetItem, QPushButton, QFileDialog, QLineEdit, QMessageBox, QTextEdit, QShortcut
@@ -9,6 +10,65 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont, QKeySequence
 
+# 直接运行 python Sub/f_csv_header.py 时，把仓库根目录加入搜索路径才能导入 Sub 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Sub.o_file_cache import decode_file, file_encoding
+from Sub.s_mmap_reader import MappedFile, is_wide
+from Sub.d_csv_utils import read_csv_header
+from Sub.n_csv_schema import REVIEW_NAME, rewrite_header
+from Sub.t_csv_writer import BackgroundWriter
+
+PREFETCH_SIZE = 8
+WRITE_POLL_MS = 200
+
+
+def read_format_text(file_path):
+    # 映射文件后只解码 "Format." 之后的内容
+    encoding = file_encoding(file_path)
+    if is_wide(encoding):
+        file_content = decode_file(file_path)
+        format_start = file_content.find('Format.')
+        file_content = file_content[format_start + len('Format.'):] if format_start != -1 else None
+    else:
+        with MappedFile(file_path) as mapped:
+            format_start = mapped.find(b'Format.')
+            file_content = mapped.decode(format_start + len(b'Format.'), encoding=encoding) \
+                if format_start != -1 else None
+    if file_content is None:
+        return "No 'Format.' field found in file."
+    lines = file_content.strip().split('\n')
+    # 只在第一行添加两个空格
+    first_line = '  ' + lines[0] if lines else ''
+    remaining_lines = '\n'.join(lines[1:])
+    return first_line + '\n' + remaining_lines
+
+
+class Prefetcher:
+    # 在后台线程中读取文件，保留最近用到的结果，翻页时直接取用
+    def __init__(self, loader, size=PREFETCH_SIZE):
+        self.loader = loader
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = OrderedDict()
+
+    def submit(self, key):
+        if key not in self.futures:
+            self.futures[key] = self.executor.submit(self.loader, key)
+        self.futures.move_to_end(key)
+        while len(self.futures) > self.size:
+            self.futures.popitem(last=False)
+        return self.futures[key]
+
+    def get(self, key):
+        return self.submit(key).result()
+
+    def prefetch(self, keys):
+        for key in keys:
+            self.submit(key)
+
+    def invalidate(self, key):
+        self.futures.pop(key, None)
+
 
 class CsvHeaderEditor(QMainWindow):
     def __init__(self):
@@ -19,10 +79,49 @@ class CsvHeaderEditor(QMainWindow):
         self.setGeometry(100, 100, int(screen_width * 0.35), int(screen_height * 0.8))
         self.csv_files = []
         self.file_names = []
+        self.file_index = {}
         self.current_index = -1
-        self.current_data = None
+        self.current_headers = None
+        self.current_encoding = None
+        # 替换表头在后台线程中写入，界面不等待磁盘
+        self.writer = BackgroundWriter()
+        # 已提交、还没有确认结果的写入；定时检查，失败时立即提示
+        self.submitted = set()
+        self.write_timer = QTimer(self)
+        self.write_timer.setInterval(WRITE_POLL_MS)
+        self.write_timer.timeout.connect(self.check_writes)
+        self.csv_loader = Prefetcher(self.read_header)
         self.html_viewer = None
         self.init_ui()
+
+    def read_header(self, file_path):
+        # 预读之前先等这个文件的写入完成，避免读到替换前的表头
+        self.writer.wait(file_path)
+        return read_csv_header(file_path)
+
+    def check_writes(self):
+        for file_path in [path for path in self.submitted if self.writer.finished(path)]:
+            self.submitted.discard(file_path)
+            error = self.writer.errors.get(file_path)
+            if error:
+                # 回到写入失败的文件，重新读取磁盘上的表头，提示框不自动关闭
+                self.csv_loader.invalidate(file_path)
+                if file_path in self.csv_files:
+                    self.current_index = self.csv_files.index(file_path)
+                    self.navigate_file(0)
+                QMessageBox.critical(self, "错误", f"{os.path.basename(file_path)} 的表头没有写入成功：{error}")
+        if not self.submitted:
+            self.write_timer.stop()
+
+    def closeEvent(self, event):
+        self.write_timer.stop()
+        # 只提示定时检查还没有报告过的失败
+        errors = {path: error for path, error in self.writer.close().items() if path in self.submitted}
+        if errors:
+            self.show_critical("错误", "以下文件的表头没有写入成功：\n" +
+                               "\n".join(f"{os.path.basename(path)}: {error}" for path, error in errors.items()))
+        super().closeEvent(event)
+
     def init_ui(self):
         self.main_layout = QVBoxLayout()
         
@@ -110,7 +209,14 @@ class CsvHeaderEditor(QMainWindow):
         csv_folder_path = QFileDialog.getExistingDirectory(self, "选择CSV文件夹")
         if csv_folder_path:
             self.csv_files = [os.path.join(csv_folder_path, f) for f in os.listdir(csv_folder_path) if f.endswith(".csv")]
+            # map_schema 输出的文件夹中只需要人工检查置信度低的文件
+            review_path = os.path.join(csv_folder_path, REVIEW_NAME)
+            if os.path.exists(review_path):
+                with open(review_path, 'r', encoding='utf-8') as file:
+                    review = json.load(file)
+                self.csv_files = [f for f in self.csv_files if os.path.splitext(os.path.basename(f))[0] in review]
             self.file_names = [os.path.splitext(os.path.basename(f))[0] for f in self.csv_files]
+            self.file_index = {name: i for i, name in enumerate(self.file_names)}
             self.current_index = -1
             self.navigate_file(1)
 
@@ -134,6 +240,9 @@ class CsvHeaderEditor(QMainWindow):
             self.file_label.setText(f"{file_name_without_extension}")
             self.load_csv(file_path)
             self.sync_file_index(self.current_index)
+            # 预读前后两个文件
+            self.csv_loader.prefetch(self.csv_files[i] for i in (self.current_index + 1, self.current_index - 1)
+                                     if 0 <= i < len(self.csv_files))
         else:
             self.current_index -= direction
 
@@ -142,8 +251,8 @@ class CsvHeaderEditor(QMainWindow):
             self.show_warning("警告", "请先加载CSV文件夹！")
             return
         input_name = self.index_input.text().strip()
-        if input_name in self.file_names:
-            self.current_index = self.file_names.index(input_name)
+        if input_name in self.file_index:
+            self.current_index = self.file_index[input_name]
             self.navigate_file(0)
             # 同步HTML文件索引
             if self.html_viewer:
@@ -153,14 +262,15 @@ class CsvHeaderEditor(QMainWindow):
 
     def load_csv(self, file_path):
         try:
-            self.current_data = pd.read_csv(file_path)
+            # 只读取表头
+            self.current_headers, self.current_encoding = self.csv_loader.get(file_path)
             self.display_headers()
         except Exception as e:
             self.show_critical("错误", f"无法加载文件: {e}")
 
     def display_headers(self):
-        if self.current_data is not None:
-            headers = list(self.current_data.columns)
+        if self.current_headers is not None:
+            headers = self.current_headers
             self.header_table.setRowCount(len(headers))
             self.header_table.setColumnCount(1)
             self.header_table.setHorizontalHeaderLabels(["表头"])
@@ -174,7 +284,7 @@ class CsvHeaderEditor(QMainWindow):
 
 
     def replace_header(self):
-        if self.current_data is not None:
+        if self.current_headers is not None:
             try:
                 new_headers = [
                     self.header_table.item(row, 0).text() if self.header_table.item(row, 0) else ""
@@ -183,10 +293,20 @@ class CsvHeaderEditor(QMainWindow):
                 if any(not header.strip() for header in new_headers):
                     self.show_warning("警告", "新表头不能为空！")
                     return
-                self.current_data.columns = new_headers
+                if len(new_headers) != len(self.current_headers):
+                    self.show_warning("警告", "新表头的列数与原表头不一致！")
+                    return
                 file_path = self.csv_files[self.current_index]
-                self.current_data.to_csv(file_path, index=False)
-                self.show_information("成功", "表头已成功替换！")
+                error = self.writer.errors.get(file_path)
+                if error:
+                    self.show_warning("警告", f"上一次写入该文件失败: {error}")
+                # 只改写第一行，数据部分按字节复制，在后台写入临时文件后原子替换
+                self.writer.submit(file_path, rewrite_header, file_path, new_headers, self.current_encoding)
+                self.submitted.add(file_path)
+                self.write_timer.start()
+                self.csv_loader.invalidate(file_path)
+                self.current_headers = new_headers
+                self.show_information("成功", "表头已提交替换！")
                 self.display_headers()
                 
                 if self.html_viewer:
@@ -203,8 +323,8 @@ class CsvHeaderEditor(QMainWindow):
 
     def sync_file_index(self, csv_index):
         if self.html_viewer and 0 <= csv_index < len(self.csv_files):
-            html_file_name = os.path.splitext(os.path.basename(self.csv_files[csv_index]))[0] + '.html'
-            html_index = next((i for i, f in enumerate(self.html_viewer.html_files) if os.path.splitext(os.path.basename(f))[0] == html_file_name), None)
+            html_file_name = os.path.splitext(os.path.basename(self.csv_files[csv_index]))[0]
+            html_index = self.html_viewer.file_index.get(html_file_name)
             if html_index is not None:
                 self.html_viewer.current_index = html_index
                 self.html_viewer.loadFile(self.html_viewer.current_index)
@@ -240,11 +360,16 @@ class HtmlViewer(QWidget):
         super().__init__()
         self.setWindowTitle("HTML Viewer")
         self.csv_editor = csv_editor
-        self.folder_path = folder_path
-        self.html_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".html")]
+        self.html_loader = Prefetcher(read_format_text)
+        self.set_files(folder_path)
         self.current_index = 0
         self.initUI()
 
+    def set_files(self, folder_path):
+        self.folder_path = folder_path
+        self.html_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".html")]
+        self.file_index = {os.path.splitext(os.path.basename(f))[0]: i for i, f in enumerate(self.html_files)}
+
     def initUI(self):
         available_geometry = QApplication.desktop().screenGeometry(self)
         screen_width = available_geometry.width()
@@ -281,8 +406,7 @@ class HtmlViewer(QWidget):
 
     # 以下是其他方法的实现，包括加载文件夹、加载文件、前后翻页等。
     def load_folder(self, folder_path):
-        self.folder_path = folder_path
-        self.html_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".html")]
+        self.set_files(folder_path)
         self.current_index = 0  # 重置当前索引
         self.loadFile(self.current_index)
 
@@ -292,22 +416,9 @@ class HtmlViewer(QWidget):
             filename = self.html_files[index]
             filepath = filename  # 直接使用filename，因为它已经是完整的路径
             try:
-                with open(filepath, 'rb') as file:
-                    raw_data = file.read()
-                    encoding = chardet.detect(raw_data)['encoding']
-                    file_content = raw_data.decode(encoding or 'utf-8', errors='replace')
-                    # 查找"Format."的位置并截取之后的内容
-                    format_start = file_content.find('Format.')
-                    if format_start != -1:
-                        format_start += len('Format.')
-                        lines = file_content[format_start:].strip().split('\n')
-                        # 只在第一行添加两个空格
-                        first_line = '  ' + lines[0] if lines else ''
-                        remaining_lines = '\n'.join(lines[1:])
-                        updated_content = first_line + '\n' + remaining_lines
-                        self.text_edit.setText(updated_content)
-                    else:
-                        self.text_edit.setText("No 'Format.' field found in file.")
+                self.text_edit.setText(self.html_loader.get(filepath))
+                self.html_loader.prefetch(self.html_files[i] for i in (index + 1, index - 1)
+                                          if 0 <= i < len(self.html_files))
                 self.file_label.setText(os.path.splitext(os.path.basename(filename))[0])
             except Exception as e:
                 self.text_edit.setText(f"An error occurred: {e}")
@@ -316,7 +427,7 @@ class HtmlViewer(QWidget):
         # 移除文件扩展名，因为我们保存的是不带扩展名的文件名
         base_name = os.path.splitext(file_name)[0]
         # 找到同名的HTML文件的索引
-        html_index = next((i for i, f in enumerate(self.html_files) if os.path.splitext(os.path.basename(f))[0] == base_name), None)
+        html_index = self.file_index.get(base_name)
         if html_index is not None:
             self.current_index = html_index
             self.loadFile(self.current_index)
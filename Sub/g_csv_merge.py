@@ -1,47 +1,163 @@
 import os
+import sys
+import csv
+import shutil
+import tempfile
 import pandas as pd
 
-def merge_csv_files(folder_path, output_file):
+# 直接运行 python Sub/g_csv_merge.py 时，把仓库根目录加入搜索路径才能导入 Sub 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Sub.d_csv_utils import read_csv_header
+from Sub.j_csv_numeric import plain_frame
+from Sub.q_profile import track_file
+from Sub.t_csv_writer import atomic_open
+from Sub.u_batch import make_executor, match_files
+
+ID_COLUMN = '文件名_行号'
+CHUNK_SIZE = 10000
+
+
+def normalize_headers(headers):
+    # 与 pandas.read_csv 的列名处理保持一致：空列名记为 Unnamed，重复列名加后缀
+    names = []
+    seen = {}
+    for i, header in enumerate(headers):
+        name = header if header.strip() else f'Unnamed: {i}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def collect_schema(file_paths):
+    # 第一阶段：只读取表头，得到所有文件列名的并集（按首次出现的顺序）
+    schema = {}
+    headers = {}
+    for file_path in file_paths:
+        names, encoding = read_csv_header(file_path)
+        names = normalize_headers(names)
+        headers[file_path] = (names, encoding)
+        for name in names:
+            schema.setdefault(name, len(schema))
+    schema.setdefault(ID_COLUMN, len(schema))
+    return list(schema), headers
+
+
+def read_rows(file_path, names, encoding):
+    # 逐行读取数据，返回 (行号, 字段列表)
+    with open(file_path, mode='r', encoding=encoding, errors='ignore', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        implicit_index = None
+        rows = 0
+        for fields in reader:
+            if not fields:
+                continue
+            if implicit_index is None:
+                # 与 pandas 一致：数据行比表头多一列时，第一列作为行索引
+                implicit_index = len(fields) == len(names) + 1
+                if implicit_index:
+                    print(f"{os.path.basename(file_path)} 的数据比表头多一列，第一列将作为行号")
+            if implicit_index:
+                yield fields[0], fields[1:]
+            else:
+                yield str(rows), fields
+            rows += 1
+
+
+def write_chunk(writer, chunk, names, targets, template, id_position, prefix, plain):
+    # 字段数多于表头的行无法对齐到列上，与 pandas.read_csv 一样报错，不丢弃多出的字段
+    for label, fields in chunk:
+        if len(fields) > len(names):
+            raise ValueError(f"{prefix}{label}：该行有 {len(fields)} 个字段，多于表头的 {len(names)} 列")
+    if plain:
+        # 整块去掉方括号并转换 D 指数，只处理本文件自己的列
+        width = len(names)
+        df = pd.DataFrame([fields[:width] + [''] * (width - len(fields)) for _, fields in chunk],
+                          columns=range(width), dtype='object')
+        values = plain_frame(df).astype('object').fillna('').values.tolist()
+        chunk = [(label, fields) for (label, _), fields in zip(chunk, values)]
+    rows = []
+    for label, fields in chunk:
+        row = template.copy()
+        for target, value in zip(targets, fields):
+            row[target] = value
+        row[id_position] = prefix + label
+        rows.append(row)
+    writer.writerows(rows)
+
+
+def write_aligned(file_path, names, encoding, schema, output, chunk_size=CHUNK_SIZE, plain=False):
+    # 第二阶段：逐块读取数据行，按统一的列顺序写出
+    position = {name: i for i, name in enumerate(schema)}
+    targets = [position[name] for name in names]
+    id_position = position[ID_COLUMN]
+    template = [''] * len(schema)
+    prefix = os.path.basename(file_path) + '_'
+
+    writer = csv.writer(output)
+    rows = 0
+    chunk = []
+    with track_file('merge_csv_files', file_path) as record:
+        for label, fields in read_rows(file_path, names, encoding):
+            chunk.append((label, fields))
+            rows += 1
+            if len(chunk) >= chunk_size:
+                with record.phase('write'):
+                    write_chunk(writer, chunk, names, targets, template, id_position, prefix, plain)
+                chunk = []
+        with record.phase('write'):
+            write_chunk(writer, chunk, names, targets, template, id_position, prefix, plain)
+        record.rows = rows
+    return rows
+
+
+def merge_part(file_path, names, encoding, schema, part_path, chunk_size=CHUNK_SIZE, plain=False):
+    with open(part_path, 'w', encoding='utf-8', newline='') as output:
+        return write_aligned(file_path, names, encoding, schema, output, chunk_size, plain)
+
+
+def merge_csv_files(folder_path, output_file, max_workers=1, chunk_size=CHUNK_SIZE, plain=False, executor_type='process',
+                    patterns=None):
     # 获取文件夹中的所有CSV文件
-    csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
-    
+    csv_files = match_files(sorted(f for f in os.listdir(folder_path) if f.endswith('.csv')), patterns)
+
     if not csv_files:
         print("No CSV files found in the directory.")
         return
 
-    # 初始化一个空的DataFrame来存储合并后的数据
-    merged_df = pd.DataFrame()
-
-    # 遍历每个CSV文件
-    for csv_file in csv_files:
-        file_path = os.path.join(folder_path, csv_file)
-        df = pd.read_csv(file_path)
-
-        # 确保所有DataFrame都有相同的列，缺失的列用NaN填充
-        if not merged_df.empty:
-            all_columns = set(merged_df.columns).union(set(df.columns))
-            for col in all_columns:
-                if col not in df.columns:
-                    df[col] = pd.NA
-                if col not in merged_df.columns:
-                    merged_df[col] = pd.NA
-        else:
-            all_columns = set(df.columns)
+    file_paths = [os.path.join(folder_path, f) for f in csv_files]
+    schema, headers = collect_schema(file_paths)
 
-        # 添加文件名和行号列
-        df['文件名_行号'] = csv_file + '_' + df.index.astype(str)
+    # 先写临时文件，中断时原来的合并结果不受影响
+    with atomic_open(output_file) as output:
+        csv.writer(output).writerow(schema)
+        if max_workers == 1:
+            for file_path in file_paths:
+                names, encoding = headers[file_path]
+                write_aligned(file_path, names, encoding, schema, output, chunk_size, plain)
+            return
 
-        # 如果merged_df为空，则直接赋值
-        if merged_df.empty:
-            merged_df = df
-        else:
-            # 合并DataFrame，使用outer join以保证所有列都被保留
-            merged_df = pd.concat([merged_df, df], axis=0, ignore_index=True, sort=False)
+        # 多进程时每个文件先写入临时分片，再按文件顺序拼接
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as part_dir:
+            part_paths = [os.path.join(part_dir, f) for f in csv_files]
+            with make_executor(executor_type, max_workers) as executor:
+                futures = [
+                    executor.submit(merge_part, file_path, *headers[file_path], schema, part_path, chunk_size, plain)
+                    for file_path, part_path in zip(file_paths, part_paths)
+                ]
+                for future, part_path in zip(futures, part_paths):
+                    future.result()
+                    output.flush()
+                    with open(part_path, 'r', encoding='utf-8', newline='') as part:
+                        shutil.copyfileobj(part, output)
 
-    # 将合并后的数据写入到输出文件中
-    merged_df.to_csv(output_file, index=False)
 
-folder_path = './Result/final'
-output_file = './Result/merged.csv'
+if __name__ == '__main__':
+    folder_path = './Result/final'
+    output_file = './Result/merged.csv'
 
-merge_csv_files(folder_path, output_file)
+    merge_csv_files(folder_path, output_file)
@@ -0,0 +1,223 @@
+import os
+import json
+import logging
+from concurrent.futures import as_completed
+from Sub.a_html_info import a_html_info
+from Sub.b_csv_convert import convert_file, lookup_conversion, record_conversion
+from Sub.c_html_value import c_value_profile
+from Sub.d_csv_utils import d_csv_utils
+from Sub.e_csv_errror import e_errror_info
+from Sub.g_csv_merge import merge_csv_files
+from Sub.k_time_scale import normalize_times
+from Sub.l_coord_frame import convert_frames
+from Sub.m_csv_index import INDEX_NAME, build_index
+from Sub.o_file_cache import shared_cache
+from Sub.w_csv_dedup import w_csv_dedup
+from Sub.t_csv_writer import atomic_open
+from Sub.u_batch import STAGES, make_executor, match_files, option, stage_options
+
+MANIFEST_NAME = '.pipeline_manifest.json'
+
+
+class Node:
+    def __init__(self, name, stage, inputs, outputs, func, *args, **kwargs):
+        self.name = name
+        self.stage = stage
+        self.inputs = inputs
+        self.outputs = outputs
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+def convert_node(txt_path, csv_file_path):
+    result = convert_file(txt_path, csv_file_path)
+    if result['error']:
+        raise RuntimeError(result['error'])
+    record_conversion(txt_path, csv_file_path, result)
+
+
+def list_files(folder_path, suffix, patterns=None):
+    if not os.path.exists(folder_path):
+        return []
+    return match_files(sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(suffix)),
+                       patterns)
+
+
+def build_graph(folder_path, result_path, patterns=None, workers=None, executors=None):
+    # workers、executors 为 stage_options 的结果，汇总类的阶段在节点内部再按文件并行
+    workers = workers or stage_options([])
+    executors = executors or stage_options([], default='process')
+
+    def pool(stage):
+        return {'max_workers': option(workers, stage), 'executor_type': option(executors, stage), 'patterns': patterns}
+
+    csv_path = os.path.join(result_path, 'csv')
+    final_path = os.path.join(result_path, 'final')
+    info_path = os.path.join(result_path, 'informations.csv')
+    satellites_path = os.path.join(result_path, 'satellites.csv')
+    merged_path = os.path.join(result_path, 'merged.csv')
+    index_path = os.path.join(result_path, INDEX_NAME)
+    formats_path = os.path.join(result_path, 'formats.csv')
+    epochs_path = os.path.join(result_path, 'epochs.csv')
+    frames_path = os.path.join(result_path, 'frames.csv')
+
+    nodes = []
+    csv_files = []
+    for txt_path in list_files(folder_path, '.txt', patterns):
+        file_id = os.path.splitext(os.path.basename(txt_path))[0]
+        csv_file_path = os.path.join(csv_path, file_id + '.csv')
+        csv_files.append(csv_file_path)
+        nodes.append(Node('b:' + file_id, 'b', [txt_path], [csv_file_path], convert_node, txt_path, csv_file_path))
+
+    # Result/final 中的表头由 f_csv_header 手动编辑，作为源文件处理
+    final_files = list_files(final_path, '.csv', patterns)
+    nodes.append(Node('a', 'a', list_files(folder_path, '.html', patterns),
+                      [info_path, satellites_path, formats_path],
+                      a_html_info, folder_path, info_path, **pool('a')))
+    profile_path = os.path.join(result_path, 'value_profile.json')
+    nodes.append(Node('c', 'c', [info_path, merged_path], [profile_path], c_value_profile, info_path,
+                      merged_path=merged_path, output_path=profile_path))
+    nodes.append(Node('d', 'd', final_files, [os.path.join(result_path, 'column_info.csv')],
+                      d_csv_utils, final_path, ' ', os.path.join(result_path, 'column_info.csv'), **pool('d')))
+    nodes.append(Node('e', 'e', csv_files, [os.path.join(result_path, 'error_info.csv')],
+                      e_errror_info, csv_path, os.path.join(result_path, 'error_info.csv'), **pool('e')))
+    nodes.append(Node('g', 'g', final_files, [merged_path], merge_csv_files, final_path, merged_path, **pool('g')))
+    nodes.append(Node('g:index', 'g', [merged_path, info_path, satellites_path], [index_path],
+                      build_index, merged_path, info_path, satellites_path, index_path))
+    nodes.append(Node('k', 'k', [merged_path, info_path, formats_path], [epochs_path],
+                      normalize_times, merged_path, info_path, epochs_path, formats_path))
+    nodes.append(Node('l', 'l', [merged_path, info_path, epochs_path], [frames_path],
+                      convert_frames, merged_path, info_path, frames_path, epochs_path))
+    nodes.append(Node('w', 'w', [merged_path, info_path, satellites_path],
+                      [os.path.join(result_path, name) for name in ('merged_dedup.csv', 'duplicates.csv', 'overlaps.csv')],
+                      w_csv_dedup, merged_path, info_path, satellites_path))
+    return nodes
+
+
+def sort_levels(nodes):
+    # 按依赖关系分层，同一层的节点互不依赖，可以并行执行
+    producers = {output: node.name for node in nodes for output in node.outputs}
+    depends = {node.name: {producers[p] for p in node.inputs if p in producers} - {node.name} for node in nodes}
+    by_name = {node.name: node for node in nodes}
+    levels = []
+    done = set()
+    while len(done) < len(nodes):
+        level = [name for name in depends if name not in done and depends[name] <= done]
+        if not level:
+            raise ValueError(f"依赖关系存在环: {sorted(set(depends) - done)}")
+        levels.append([by_name[name] for name in level])
+        done.update(level)
+    return levels, depends
+
+
+class Manifest:
+    # 记录汇总类节点的输入输出哈希；转换节点与 b_convert_csv 共用共享缓存中的转换记录
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.nodes = {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as file:
+                    self.nodes = json.load(file).get('nodes', {})
+            except (OSError, ValueError):
+                logging.warning(f'无法读取 {manifest_path}，将重新构建所有节点')
+
+    def hash(self, path):
+        # 内容哈希由共享缓存按 size 和 mtime 记录，未变化的文件不会重新读取
+        if not os.path.exists(path):
+            return None
+        return shared_cache.file_digest(path)
+
+    def is_stale(self, node):
+        if node.func is convert_node:
+            return not lookup_conversion(*node.args)[1]
+        record = self.nodes.get(node.name)
+        if record is None:
+            return True
+        if set(record['inputs']) != set(node.inputs):
+            return True
+        if any(self.hash(path) != digest for path, digest in record['inputs'].items()):
+            return True
+        # 输出缺失或被修改过，同样需要重建
+        return any(digest is not None and self.hash(path) != digest for path, digest in record['outputs'].items())
+
+    def record(self, node):
+        if node.func is convert_node:
+            return
+        self.nodes[node.name] = {
+            'inputs': {path: self.hash(path) for path in node.inputs},
+            'outputs': {path: self.hash(path) for path in node.outputs},
+        }
+
+    def save(self):
+        with atomic_open(self.manifest_path, encoding='utf-8', newline=None) as file:
+            json.dump({'nodes': self.nodes}, file, ensure_ascii=False, indent=1)
+
+
+def log_nodes(message, nodes):
+    logging.info(f"{message} {len(nodes)} 个节点: {', '.join(node.name for node in nodes[:10])}"
+                 + (' ...' if len(nodes) > 10 else ''))
+
+
+def run_pipeline(folder_path, result_path, stages=STAGES, workers=None, executors=None, patterns=None,
+                 dry_run=False):
+    workers = workers or stage_options([])
+    executors = executors or stage_options([], default='process')
+    if not dry_run:
+        for sub_path in (result_path, os.path.join(result_path, 'csv')):
+            if not os.path.exists(sub_path):
+                os.makedirs(sub_path)
+
+    manifest = Manifest(os.path.join(result_path, MANIFEST_NAME))
+    nodes = build_graph(folder_path, result_path, patterns, workers, executors)
+    levels, depends = sort_levels(nodes)
+
+    failed = set()
+    # 试运行时不执行节点，上游需要重建的节点同样视为需要重建
+    planned = set()
+    executed = 0
+    for level in levels:
+        stale = []
+        for node in level:
+            if node.stage not in stages:
+                continue
+            if depends[node.name] & failed:
+                failed.add(node.name)
+                logging.warning(f'{node.name} 的上游节点失败，已跳过')
+            elif depends[node.name] & planned or manifest.is_stale(node):
+                stale.append(node)
+        if not stale:
+            continue
+        if dry_run:
+            planned.update(node.name for node in stale)
+            log_nodes('将重新执行', stale)
+            continue
+
+        log_nodes('重新执行', stale)
+        # 同一层中不同阶段的节点分别使用该阶段配置的执行方式和进程数
+        groups = {}
+        for node in stale:
+            groups.setdefault(node.stage, []).append(node)
+        for stage, group in groups.items():
+            with make_executor(option(executors, stage), option(workers, stage)) as executor:
+                futures = {executor.submit(node.func, *node.args, **node.kwargs): node for node in group}
+                for future in as_completed(futures):
+                    node = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed.add(node.name)
+                        manifest.nodes.pop(node.name, None)
+                        logging.error(f'{node.name} 执行失败: {e}')
+                        continue
+                    manifest.record(node)
+                    executed += 1
+        manifest.save()
+
+    if dry_run:
+        logging.info(f'试运行：共 {len(planned)} 个节点需要重新执行')
+        return planned
+    manifest.save()
+    logging.info(f'增量构建完成：执行 {executed} 个节点，失败 {len(failed)} 个')
+    return failed
@@ -0,0 +1,199 @@
+import os
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from Sub.d_csv_utils import read_csv_header
+from Sub.g_csv_merge import ID_COLUMN, normalize_headers, read_rows
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+SOURCE_COLUMN = 'source'
+MARKER_NAME = '_columns.json'
+INT_PATTERN = r'^[+-]?\d{1,18}$'
+FLOAT_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([DdEe][+-]?\d+)?$'
+# 有效数字不超过 15 位的十进制数可以在 float64 中无损往返
+MAX_FLOAT_DIGITS = 15
+TYPE_RATIO = 0.95
+RAW_SUFFIX = '__raw'
+FORMATS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("导出 Parquet/Arrow 需要安装 pyarrow：pip install pyarrow")
+
+
+def read_table(file_path):
+    # 读取为字符串列，并去掉为保留精度而加的方括号
+    headers, encoding = read_csv_header(file_path)
+    names = normalize_headers(headers)
+    columns = [[] for _ in names]
+    labels = []
+    for label, fields in read_rows(file_path, names, encoding):
+        labels.append(label)
+        for i, column in enumerate(columns):
+            column.append(fields[i] if i < len(fields) else '')
+
+    arrays = {}
+    for name, column in zip(names, columns):
+        values = pc.utf8_trim(pa.array(column, type=pa.string()), characters='[] ')
+        arrays[name] = pc.if_else(pc.equal(values, ''), pa.scalar(None, pa.string()), values)
+    file_name = os.path.basename(file_path)
+    arrays[ID_COLUMN] = pa.array([f'{file_name}_{label}' for label in labels], type=pa.string())
+    arrays[SOURCE_COLUMN] = pa.array([os.path.splitext(file_name)[0]] * len(labels), type=pa.string())
+    return pa.table(arrays)
+
+
+def conforms(values, type_name):
+    if type_name == 'int64':
+        return pc.match_substring_regex(values, INT_PATTERN)
+    mantissa = pc.replace_substring_regex(values, r'[DdEe].*$', '')
+    digits = pc.replace_substring_regex(pc.replace_substring_regex(mantissa, r'[^0-9]', ''), r'^0+', '')
+    return pc.and_(pc.match_substring_regex(values, FLOAT_PATTERN),
+                   pc.less_equal(pc.utf8_length(digits), MAX_FLOAT_DIGITS))
+
+
+def infer_type(values):
+    # 绝大多数值是数字时按数字列处理，个别无法解析的值另存到 RAW_SUFFIX 列中
+    values = values.drop_null()
+    if len(values) == 0:
+        return 'string', False
+    for type_name in ('int64', 'float64'):
+        matched = pc.sum(conforms(values, type_name)).as_py() or 0
+        if matched >= TYPE_RATIO * len(values):
+            return type_name, matched < len(values)
+    return 'string', False
+
+
+def promote(left, right):
+    if left is None or left == right:
+        return right
+    if {left, right} == {'int64', 'float64'}:
+        return 'float64'
+    return 'string'
+
+
+def file_types(file_path):
+    table = read_table(file_path)
+    return {name: infer_type(table[name]) for name in table.column_names if name not in (ID_COLUMN, SOURCE_COLUMN)}
+
+
+def convert_column(values, type_name, length):
+    if values is None:
+        values = pa.nulls(length, type=pa.string())
+    if type_name == 'string':
+        return pc.dictionary_encode(values), None
+    mask = pc.fill_null(conforms(values, type_name), False)
+    numbers = pc.if_else(mask, values, pa.scalar(None, pa.string()))
+    if type_name == 'float64':
+        numbers = pc.replace_substring_regex(numbers, '[Dd]', 'E')
+    rejects = pc.if_else(mask, pa.scalar(None, pa.string()), values)
+    return pc.cast(numbers, pa.from_numpy_dtype(type_name)), rejects
+
+
+def write_file(file_path, column_types, raw_columns, output_dir, partition_by, file_format):
+    table = read_table(file_path)
+    arrays = {}
+    for name in table.column_names:
+        if name not in column_types:
+            continue
+        arrays[name], rejects = convert_column(table[name], column_types[name], table.num_rows)
+        if name in raw_columns:
+            arrays[name + RAW_SUFFIX] = pc.dictionary_encode(rejects)
+    if partition_by not in arrays and partition_by != SOURCE_COLUMN:
+        # 缺少分区列的文件写入空值分区
+        arrays[partition_by], _ = convert_column(None, column_types[partition_by], table.num_rows)
+    arrays[ID_COLUMN] = table[ID_COLUMN]
+    arrays[SOURCE_COLUMN] = pc.dictionary_encode(table[SOURCE_COLUMN])
+    typed = pa.table(arrays)
+
+    file_id = os.path.splitext(os.path.basename(file_path))[0]
+    ds.write_dataset(
+        typed, output_dir, format=FORMATS[file_format],
+        partitioning=[partition_by], partitioning_flavor='hive',
+        basename_template=file_id + '-{i}.' + file_format,
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    return typed.num_rows
+
+
+def catalogue_schema(column_types, raw_columns):
+    # 每个文件只写出自己的列，读取时用统一的 schema 补齐
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    fields = []
+    for name, type_name in column_types.items():
+        fields.append(pa.field(name, dictionary if type_name == 'string' else pa.from_numpy_dtype(type_name)))
+        if name in raw_columns:
+            fields.append(pa.field(name + RAW_SUFFIX, dictionary))
+    fields.append(pa.field(ID_COLUMN, pa.string()))
+    fields.append(pa.field(SOURCE_COLUMN, dictionary))
+    return pa.schema(fields)
+
+
+def export_parquet(folder_path, output_dir, partition_by=SOURCE_COLUMN, file_format='parquet', max_workers=None):
+    require_pyarrow()
+    if file_format not in FORMATS:
+        print(f"不支持的格式: {file_format}，可选 {', '.join(FORMATS)}")
+        return
+    if os.path.exists(output_dir) and os.listdir(output_dir):
+        if not os.path.exists(os.path.join(output_dir, MARKER_NAME)):
+            print(f"{output_dir} 不是之前导出的目录，请指定一个空目录。")
+            return
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    csv_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.csv'))
+    file_paths = [os.path.join(folder_path, f) for f in csv_files]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # 第一遍：推断每个文件各列的类型，再合并为统一的列类型
+        column_types = {}
+        raw_columns = set()
+        for types in executor.map(file_types, file_paths):
+            for name, (type_name, has_rejects) in types.items():
+                column_types[name] = promote(column_types.get(name), type_name)
+                if has_rejects:
+                    raw_columns.add(name)
+        raw_columns = {name for name in raw_columns if column_types[name] != 'string'}
+        if partition_by not in column_types and partition_by != SOURCE_COLUMN:
+            print(f"没有找到分区列 '{partition_by}'")
+            return
+
+        # 第二遍：按统一的列类型写出
+        rows = sum(executor.map(
+            write_file, file_paths,
+            [column_types] * len(file_paths), [raw_columns] * len(file_paths), [output_dir] * len(file_paths),
+            [partition_by] * len(file_paths), [file_format] * len(file_paths),
+        ))
+
+    with open(os.path.join(output_dir, MARKER_NAME), 'w', encoding='utf-8') as file:
+        json.dump({'format': file_format, 'partition_by': partition_by, 'columns': column_types,
+                   'raw_columns': sorted(raw_columns)},
+                  file, ensure_ascii=False, indent=1)
+    print(f"共导出 {len(file_paths)} 个文件 {rows} 行到 {output_dir}")
+
+
+def read_catalogue(output_dir, columns=None, filter=None):
+    # 只读取需要的列，filter 可以是 pyarrow.dataset 表达式，例如 ds.field('year') >= 1960
+    require_pyarrow()
+    with open(os.path.join(output_dir, MARKER_NAME), 'r', encoding='utf-8') as file:
+        marker = json.load(file)
+    schema = catalogue_schema(marker['columns'], set(marker['raw_columns']))
+    # 分区列的值保存在目录名中，按普通字符串读取
+    partition_by = marker['partition_by']
+    index = schema.get_field_index(partition_by)
+    if pa.types.is_dictionary(schema.field(index).type):
+        schema = schema.set(index, pa.field(partition_by, pa.string()))
+    partitioning = ds.partitioning(pa.schema([schema.field(index)]), flavor='hive')
+    dataset = ds.dataset(output_dir, schema=schema, format=FORMATS[marker['format']],
+                         partitioning=partitioning)
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+if __name__ == '__main__':
+    export_parquet('./Result/final', './Result/parquet')
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+def unwrap(values):
+    # 去掉 b_convert_csv 为保留精度加上的方括号，空字符串视为缺失
+    values = pd.Series(values)
+    if values.dtype != 'string':
+        values = values.astype('string')
+    values = values.str.strip('[] ')
+    return values.mask(values == '')
+
+
+def swap_exponent(text):
+    # Fortran 的 D/d 指数写法统一替换为 E，非数字的值由 to_numeric 排除
+    return text.str.replace('D', 'E', regex=False).str.replace('d', 'E', regex=False)
+
+
+def to_numbers(values):
+    # 整列转换为 float64，无法解析的值为 NaN
+    return pd.to_numeric(swap_exponent(unwrap(values)), errors='coerce').astype('float64')
+
+
+def parse_numeric(values, sentinels=None, zero_missing=False):
+    # 返回 numpy 掩码数组，缺失、无法解析、哨兵值(如 9999)和表示未观测的 0 都被掩盖
+    numbers = to_numbers(values).to_numpy()
+    mask = np.isnan(numbers)
+    if sentinels:
+        mask |= np.isin(numbers, list(sentinels))
+    if zero_missing:
+        mask |= numbers == 0
+    return np.ma.MaskedArray(numbers, mask=mask)
+
+
+def parse_frame(df, columns=None, sentinels=None, zero_missing=False):
+    # 按列批量转换，sentinels 和 zero_missing 可以是 {列名: 设置} 的字典
+    columns = df.columns if columns is None else columns
+    result = {}
+    for column in columns:
+        column_sentinels = sentinels.get(column) if isinstance(sentinels, dict) else sentinels
+        column_zero = zero_missing.get(column, False) if isinstance(zero_missing, dict) else zero_missing
+        result[column] = parse_numeric(df[column], column_sentinels, column_zero).filled(np.nan)
+    return pd.DataFrame(result, index=df.index)
+
+
+def plain_frame(df):
+    # 去掉方括号并把数字中的 D 指数改为 E，只改写文本，因此不会损失精度
+    text = unwrap(df.to_numpy(dtype=object).ravel())
+    swapped = swap_exponent(text)
+    text = text.where(pd.to_numeric(swapped, errors='coerce').isna(), swapped)
+    return pd.DataFrame(text.to_numpy(dtype=object).reshape(df.shape), index=df.index, columns=df.columns)
+
+
+def read_numeric_csv(file_path, usecols=None, sentinels=None, zero_missing=False, **kwargs):
+    df = pd.read_csv(file_path, dtype=str, usecols=usecols, keep_default_na=False, **kwargs)
+    return parse_frame(df, sentinels=sentinels, zero_missing=zero_missing)
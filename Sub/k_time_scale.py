@@ -0,0 +1,193 @@
+import os
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from Sub.g_csv_merge import ID_COLUMN
+from Sub.j_csv_numeric import to_numbers
+
+SECONDS_PER_DAY = 86400.0
+MJD_OFFSET = 2400000.5
+JD_1972 = 2441317.5
+TT_TAI = 32.184
+# TCB -> TDB 的换算常数 (IAU 2006 B3)
+L_B = 1.550519768e-8
+T0 = 2443144.5003725
+TDB0 = -6.55e-5
+
+# 闰秒表：UTC 日期起 TAI-UTC 的秒数
+LEAP_SECONDS = [
+    (1972, 1, 10), (1972, 7, 11), (1973, 1, 12), (1974, 1, 13), (1975, 1, 14), (1976, 1, 15),
+    (1977, 1, 16), (1978, 1, 17), (1979, 1, 18), (1980, 1, 19), (1981, 7, 20), (1982, 7, 21),
+    (1983, 7, 22), (1985, 7, 23), (1988, 1, 24), (1990, 1, 25), (1991, 1, 26), (1992, 7, 27),
+    (1993, 7, 28), (1994, 7, 29), (1996, 1, 30), (1997, 7, 31), (1999, 1, 32), (2006, 1, 33),
+    (2009, 1, 34), (2012, 7, 35), (2015, 7, 36), (2017, 1, 37),
+]
+# 1972 年以前用 ΔT = TT - UT（秒，Espenak & Meeus），按年份线性插值
+DELTA_T = [
+    (1800, 13.7), (1810, 12.5), (1820, 11.9), (1830, 7.1), (1840, 5.4), (1850, 6.8),
+    (1860, 7.7), (1870, 1.4), (1880, -5.5), (1890, -6.0), (1900, -2.8), (1910, 10.4),
+    (1920, 21.2), (1930, 24.0), (1940, 24.3), (1950, 29.1), (1960, 33.2), (1972, 42.2),
+]
+
+# 各种时间列的写法，按优先级排列（含表头中的笔误 say/date/dau/sce）
+JD_COLUMNS = ['jd', 'JD', 'tdb']
+MJD_COLUMNS = ['mjd']
+TCB_EPOCH_COLUMNS = ['Epoch_TCB']
+MONTH_COLUMNS = ['mon', 'month']
+DAY_COLUMNS = ['day', 'Day of the moment of observation with decimals', 'say', 'date', 'dau']
+SECOND_COLUMNS = ['sec', 'sce']
+TIME_COLUMNS = JD_COLUMNS + MJD_COLUMNS + TCB_EPOCH_COLUMNS + ['year'] + MONTH_COLUMNS + DAY_COLUMNS \
+    + ['hour', 'min'] + SECOND_COLUMNS
+TCB_EPOCH_OFFSET = 2455197.5
+
+JD_OFFSET_RE = re.compile(r'(?:JD|relative to)\s*(24\d{5}(?:\.\d+)?)')
+UTC_SHIFT_RE = re.compile(r'UTC\s*([+-])\s*(\d+(?:\.\d+)?)\s*h', re.IGNORECASE)
+GMT_SHIFT_RE = re.compile(r'=\s*GMT\s*([+-])\s*(\d+(?:\.\d+)?)\s*h', re.IGNORECASE)
+
+
+def calendar_to_jd(year, month, day, hour=0.0, minute=0.0, second=0.0):
+    # 公历日期转儒略日，day 可以带小数，所有参数都可以是数组
+    year, month, day = (np.asarray(v, dtype='float64') for v in (year, month, day))
+    whole_day = np.floor(day)
+    a = np.floor_divide(14 - month, 12)
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    jdn = whole_day + np.floor_divide(153 * m + 2, 5) + 365 * y + np.floor_divide(y, 4) \
+        - np.floor_divide(y, 100) + np.floor_divide(y, 400) - 32045
+    fraction = (day - whole_day) + (np.asarray(hour) + np.asarray(minute) / 60 + np.asarray(second) / 3600) / 24
+    return jdn - 0.5 + fraction
+
+
+@lru_cache(maxsize=None)
+def leap_second_table():
+    starts = calendar_to_jd([y for y, _, _ in LEAP_SECONDS], [m for _, m, _ in LEAP_SECONDS], 1)
+    return starts, np.array([s for _, _, s in LEAP_SECONDS], dtype='float64')
+
+
+@lru_cache(maxsize=None)
+def delta_t_table():
+    years = np.array([y for y, _ in DELTA_T], dtype='float64')
+    return calendar_to_jd(years, 1, 1), np.array([d for _, d in DELTA_T], dtype='float64')
+
+
+def tt_minus_utc(jd_utc):
+    # 1972 年以后为 32.184s + 闰秒，之前把 UTC 视为 UT 使用 ΔT
+    jd_utc = np.asarray(jd_utc, dtype='float64')
+    starts, leaps = leap_second_table()
+    index = np.searchsorted(starts, jd_utc, side='right') - 1
+    modern = TT_TAI + leaps[np.clip(index, 0, len(leaps) - 1)]
+    nodes, values = delta_t_table()
+    historic = np.interp(jd_utc, nodes, values)
+    return np.where(jd_utc >= JD_1972, modern, historic)
+
+
+def tdb_minus_tt(jd):
+    g = np.radians(357.53 + 0.98560028 * (np.asarray(jd, dtype='float64') - 2451545.0))
+    return 0.001657 * np.sin(g) + 0.00001385 * np.sin(2 * g)
+
+
+def parse_time_scale(text):
+    # 返回 (时间尺度, 换算为该尺度需要加上的小时数)
+    if not isinstance(text, str):
+        return None, 0.0
+    upper = text.upper()
+    match = UTC_SHIFT_RE.search(upper)
+    if match:
+        return 'UTC', (-1 if match.group(1) == '+' else 1) * float(match.group(2))
+    match = GMT_SHIFT_RE.search(upper)
+    if match:
+        return 'UTC', (1 if match.group(1) == '+' else -1) * float(match.group(2))
+    for scale in ('TCB', 'TDB', 'UT1', 'UTC', 'TT', 'ET'):
+        if re.search(rf'\b{scale}\b', upper):
+            return ('TT' if scale == 'ET' else 'UTC' if scale == 'UT1' else scale), 0.0
+    if 'GMT' in upper or 'GREENWICH MEAN TIME' in upper:
+        return 'UTC', 0.0
+    return None, 0.0
+
+
+def load_time_scales(info_path):
+    info = pd.read_csv(info_path, dtype=str)
+    parsed = info['Time Scale'].map(parse_time_scale)
+    return pd.DataFrame({
+        'time_scale': [scale for scale, _ in parsed],
+        'shift_hours': [hours for _, hours in parsed],
+    }, index=info['id'])
+
+
+def load_jd_offsets(formats_path):
+    # 从 Format. 的列说明中找到 "with respect to JD 2440000.0" 这类约化儒略日的起点
+    formats = pd.read_csv(formats_path, dtype=str)
+    offsets = formats['Description'].str.extract(JD_OFFSET_RE, expand=False).dropna()
+    offsets = pd.to_numeric(offsets)
+    return offsets.groupby(formats.loc[offsets.index, 'id']).first()
+
+
+def first_available(df, columns):
+    result = pd.Series(np.nan, index=df.index)
+    for column in columns:
+        if column in df.columns:
+            result = result.fillna(to_numbers(df[column]))
+    return result
+
+
+def to_tt(jd, scales, shift_hours):
+    jd = np.asarray(jd, dtype='float64') + np.asarray(shift_hours, dtype='float64') / 24
+    scales = np.asarray(scales, dtype=object)
+    tdb_from_tcb = jd - (L_B * (jd - T0) * SECONDS_PER_DAY - TDB0) / SECONDS_PER_DAY
+    return np.select(
+        [scales == 'UTC', scales == 'TT', scales == 'TDB', scales == 'TCB'],
+        [jd + tt_minus_utc(jd) / SECONDS_PER_DAY,
+         jd,
+         jd - tdb_minus_tt(jd) / SECONDS_PER_DAY,
+         tdb_from_tcb - tdb_minus_tt(tdb_from_tcb) / SECONDS_PER_DAY],
+        default=np.nan,
+    )
+
+
+def epoch_columns(df, scales, jd_offsets=None):
+    file_ids = df[ID_COLUMN].str.rsplit('.csv_', n=1).str[0]
+
+    jd = first_available(df, JD_COLUMNS)
+    if jd_offsets is not None:
+        # 约化儒略日加上说明中给出的起点
+        offsets = file_ids.map(jd_offsets).astype('float64')
+        jd = jd.where(~(jd < 1e6) | offsets.isna(), jd + offsets)
+    jd = jd.fillna(first_available(df, MJD_COLUMNS) + MJD_OFFSET)
+    jd = jd.fillna(first_available(df, TCB_EPOCH_COLUMNS) + TCB_EPOCH_OFFSET)
+
+    hour, minute, second = (first_available(df, columns).fillna(0.0)
+                            for columns in (['hour'], ['min'], SECOND_COLUMNS))
+    calendar = calendar_to_jd(first_available(df, ['year']), first_available(df, MONTH_COLUMNS),
+                              first_available(df, DAY_COLUMNS), hour, minute, second)
+    jd = jd.fillna(pd.Series(calendar, index=df.index))
+
+    row_scales = file_ids.map(scales['time_scale'])
+    shift_hours = file_ids.map(scales['shift_hours']).fillna(0.0)
+    return pd.DataFrame({
+        ID_COLUMN: df[ID_COLUMN],
+        'time_scale': row_scales,
+        'jd': jd,
+        'jd_tt': to_tt(jd, row_scales, shift_hours),
+    })
+
+
+def normalize_times(merged_path, info_path, output_path, formats_path=None):
+    # 每行一条：id、时间尺度、儒略日和 TT 儒略日；formats.csv 不存在时不处理约化儒略日的起点
+    df = pd.read_csv(merged_path, dtype=str, keep_default_na=False,
+                     usecols=lambda column: column in TIME_COLUMNS or column == ID_COLUMN)
+    scales = load_time_scales(info_path)
+    jd_offsets = load_jd_offsets(formats_path) if formats_path and os.path.exists(formats_path) else None
+    epochs = epoch_columns(df, scales, jd_offsets)
+    epochs.to_csv(output_path, index=False)
+
+    missing = epochs['jd'].isna()
+    unknown = epochs['time_scale'].isna() & ~missing
+    print(f"时间统一完成，共 {len(epochs)} 行，输出到 {output_path}")
+    if missing.any():
+        files = epochs.loc[missing, ID_COLUMN].str.rsplit('.csv_', n=1).str[0].unique()
+        print(f"{missing.sum()} 行没有可用的时间列：{', '.join(files)}")
+    if unknown.any():
+        files = epochs.loc[unknown, ID_COLUMN].str.rsplit('.csv_', n=1).str[0].unique()
+        print(f"{unknown.sum()} 行的时间尺度无法识别：{', '.join(files)}")
+    return epochs
@@ -0,0 +1,185 @@
+import re
+import numpy as np
+import pandas as pd
+from Sub.g_csv_merge import ID_COLUMN
+from Sub.j_csv_numeric import to_numbers, unwrap
+from Sub.k_time_scale import TIME_COLUMNS, calendar_to_jd, epoch_columns, first_available, load_time_scales
+
+ARCSEC = np.pi / (180 * 3600)
+J2000 = 2451545.0
+# FK4 B1950 -> FK5 J2000 的旋转矩阵（Standish 1982，不含 E 项和自行）
+B1950_TO_J2000 = np.array([
+    [0.9999256782, -0.0111820611, -0.0048579477],
+    [0.0111820610, 0.9999374784, -0.0000271765],
+    [0.0048579479, -0.0000271474, 0.9999881997],
+])
+
+# 赤经赤纬的几种写法
+RA_HMS_COLUMNS = ['x-h', 'x-m', 'x-s']
+DEC_DMS_COLUMNS = ['y-d', "y-'", "y-''"]
+RA_HOURS_COLUMNS = ['alpha.hours']
+DEC_DEGREES_COLUMNS = ['delta.Degrees']
+RA_DEGREES_COLUMNS = ['ra']
+DEC_DEGREES_ONLY_COLUMNS = ['dec']
+COORD_COLUMNS = RA_HMS_COLUMNS + DEC_DMS_COLUMNS + RA_HOURS_COLUMNS + DEC_DEGREES_COLUMNS \
+    + RA_DEGREES_COLUMNS + DEC_DEGREES_ONLY_COLUMNS
+
+BESSEL_EPOCH_RE = re.compile(r'^B?(1\d{3}(?:\.\d+)?)$')
+
+
+def parse_equinox(text):
+    # 返回 ('J2000' | 'B1950' | 'date' | 'year' | 'epoch', 分点的儒略日)，无法确定时返回 (None, None)
+    if not isinstance(text, str):
+        return None, None
+    value = text.strip().rstrip(',').strip()
+    upper = value.upper()
+    if upper in ('J2000', 'J2000.0', '2000.0', 'ICRF', 'ICRS', 'ICRS/J2000.0'):
+        return 'J2000', J2000
+    if upper in ('B1950', 'B1950.0', '1950.0', '1950') or upper.startswith('1 - MEAN TERRESTRIAL EQUATORIAL FRAME, 1950'):
+        return 'B1950', None
+    if upper in ('DATE', 'OF DATE', 'TRUE OF DATE'):
+        return 'date', None
+    if upper == '1 JAN OF YEAR OF OBSERVATION':
+        return 'year', None
+    match = BESSEL_EPOCH_RE.match(upper)
+    if match:
+        return 'epoch', 2415020.31352 + (float(match.group(1)) - 1900) * 365.242198781
+    return None, None
+
+
+def precession_matrices(jd_from, jd_to=J2000):
+    # IAU 1976 岁差，返回每一行从 jd_from 的平赤道到 jd_to 的 3x3 矩阵 (N, 3, 3)
+    jd_from = np.atleast_1d(np.asarray(jd_from, dtype='float64'))
+    big_t = (jd_from - J2000) / 36525
+    t = (jd_to - jd_from) / 36525
+    zeta = ((2306.2181 + 1.39656 * big_t - 0.000139 * big_t ** 2) * t
+            + (0.30188 - 0.000344 * big_t) * t ** 2 + 0.017998 * t ** 3) * ARCSEC
+    z = ((2306.2181 + 1.39656 * big_t - 0.000139 * big_t ** 2) * t
+         + (1.09468 + 0.000066 * big_t) * t ** 2 + 0.018203 * t ** 3) * ARCSEC
+    theta = ((2004.3109 - 0.85330 * big_t - 0.000217 * big_t ** 2) * t
+             - (0.42665 + 0.000217 * big_t) * t ** 2 - 0.041833 * t ** 3) * ARCSEC
+
+    cz, sz = np.cos(zeta), np.sin(zeta)
+    cZ, sZ = np.cos(z), np.sin(z)
+    ct, st = np.cos(theta), np.sin(theta)
+    matrices = np.empty((len(jd_from), 3, 3))
+    matrices[:, 0, 0] = cZ * ct * cz - sZ * sz
+    matrices[:, 0, 1] = -cZ * ct * sz - sZ * cz
+    matrices[:, 0, 2] = -cZ * st
+    matrices[:, 1, 0] = sZ * ct * cz + cZ * sz
+    matrices[:, 1, 1] = -sZ * ct * sz + cZ * cz
+    matrices[:, 1, 2] = -sZ * st
+    matrices[:, 2, 0] = st * cz
+    matrices[:, 2, 1] = -st * sz
+    matrices[:, 2, 2] = ct
+    return matrices
+
+
+def to_vectors(ra, dec):
+    ra, dec = np.asarray(ra, dtype='float64'), np.asarray(dec, dtype='float64')
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def from_vectors(vectors):
+    ra = np.mod(np.arctan2(vectors[..., 1], vectors[..., 0]), 2 * np.pi)
+    dec = np.arctan2(vectors[..., 2], np.hypot(vectors[..., 0], vectors[..., 1]))
+    return ra, dec
+
+
+def read_sexagesimal(df, columns):
+    # 度(时)分秒合成为小数，符号取自第一列的原文，以正确处理 "-00"
+    if not all(column in df.columns for column in columns):
+        return pd.Series(np.nan, index=df.index)
+    whole, minutes, seconds = (to_numbers(df[column]) for column in columns)
+    negative = unwrap(df[columns[0]]).str.startswith('-').fillna(False).astype(bool)
+    value = whole.abs() + minutes.fillna(0) / 60 + seconds.fillna(0) / 3600
+    return value.where(~negative, -value)
+
+
+def read_spherical(df, spherical_files, file_ids):
+    # 返回以弧度表示的赤经赤纬，ra/dec 两列只在 Coordinates 为赤经赤纬的文件中按度处理
+    ra_hours = read_sexagesimal(df, RA_HMS_COLUMNS).fillna(first_available(df, RA_HOURS_COLUMNS))
+    dec_degrees = read_sexagesimal(df, DEC_DMS_COLUMNS).fillna(first_available(df, DEC_DEGREES_COLUMNS))
+    ra_degrees = ra_hours * 15
+    in_degrees = file_ids.isin(spherical_files)
+    ra_degrees = ra_degrees.fillna(first_available(df, RA_DEGREES_COLUMNS).where(in_degrees))
+    dec_degrees = dec_degrees.fillna(first_available(df, DEC_DEGREES_ONLY_COLUMNS).where(in_degrees))
+    return np.radians(ra_degrees.to_numpy()), np.radians(dec_degrees.to_numpy())
+
+
+def to_j2000(ra, dec, kinds, equinox_jd):
+    # 按分点类型分组，每组对整块单位向量做一次矩阵乘法
+    vectors = to_vectors(ra, dec)
+    result = np.full_like(vectors, np.nan)
+    kinds = np.asarray(kinds, dtype=object)
+
+    group = kinds == 'J2000'
+    result[group] = vectors[group]
+    group = kinds == 'B1950'
+    result[group] = vectors[group] @ B1950_TO_J2000.T
+    group = np.isin(kinds, ['date', 'year', 'epoch']) & ~np.isnan(equinox_jd)
+    if group.any():
+        matrices = precession_matrices(equinox_jd[group])
+        result[group] = np.einsum('nij,nj->ni', matrices, vectors[group])
+    return from_vectors(result)
+
+
+def j2000_positions(df, info_path, epochs=None):
+    # 每行一条：文件 id、分点类型、参考架、J2000 赤经赤纬（弧度）以及是否有赤经赤纬；
+    # df 需要包含坐标列、时间列和 id 列
+    info = pd.read_csv(info_path, dtype=str).set_index('id')
+    file_ids = df[ID_COLUMN].str.rsplit('.csv_', n=1).str[0]
+
+    spherical_files = info.index[info['Coordinates'].str.contains('right ascension', case=False, na=False)]
+    ra, dec = read_spherical(df, spherical_files, file_ids)
+
+    equinoxes = info['Epoch of Equinox'].map(parse_equinox)
+    kinds = file_ids.map(equinoxes.str[0])
+    equinox_jd = file_ids.map(equinoxes.str[1]).astype('float64')
+    # 历元分点：用观测时刻（TT）或观测当年 1 月 1 日作为分点
+    epochs = epochs if epochs is not None else epoch_columns(df, load_time_scales(info_path))
+    jd_tt = epochs['jd_tt'].fillna(epochs['jd'])
+    equinox_jd = equinox_jd.where(kinds != 'date', jd_tt)
+    jan_first = pd.Series(calendar_to_jd(first_available(df, ['year']), 1, 1), index=df.index)
+    equinox_jd = equinox_jd.where(kinds != 'year', jan_first)
+
+    ra_j2000, dec_j2000 = to_j2000(ra, dec, kinds.to_numpy(dtype=object), equinox_jd.to_numpy(dtype='float64'))
+    return pd.DataFrame({
+        'file': file_ids,
+        'equinox': kinds,
+        'frame': file_ids.map(info['Reference Frame']),
+        'ra': ra_j2000,
+        'dec': dec_j2000,
+        'measured': ~np.isnan(ra),
+    }, index=df.index)
+
+
+def read_epochs(epochs_path, df):
+    # 读取阶段 k 输出的 epochs.csv，行必须与 merged.csv 一一对应
+    epochs = pd.read_csv(epochs_path, dtype={ID_COLUMN: str}, usecols=[ID_COLUMN, 'jd', 'jd_tt'])
+    if len(epochs) != len(df) or not (epochs[ID_COLUMN].to_numpy() == df[ID_COLUMN].to_numpy()).all():
+        raise ValueError(f"{epochs_path} 与合并表的行不一致，请先重新执行阶段 k")
+    return epochs.set_index(df.index)
+
+
+def convert_frames(merged_path, info_path, output_path, epochs_path=None):
+    # 历元分点需要观测时刻，给出 epochs_path 时使用阶段 k 的结果，否则在这里重新计算
+    df = pd.read_csv(merged_path, dtype=str, keep_default_na=False,
+                     usecols=lambda column: column in COORD_COLUMNS or column in TIME_COLUMNS or column == ID_COLUMN)
+    epochs = read_epochs(epochs_path, df) if epochs_path else None
+    positions = j2000_positions(df, info_path, epochs)
+    result = pd.DataFrame({
+        ID_COLUMN: df[ID_COLUMN],
+        'equinox': positions['equinox'],
+        'frame': positions['frame'],
+        'ra_j2000': np.degrees(positions['ra']),
+        'dec_j2000': np.degrees(positions['dec']),
+    })
+    result.to_csv(output_path, index=False)
+
+    measured = positions['measured']
+    unknown = measured & positions['equinox'].isna()
+    print(f"坐标转换完成，{measured.sum()} 行有赤经赤纬，输出到 {output_path}")
+    if unknown.any():
+        print(f"{unknown.sum()} 行的分点无法识别：{', '.join(positions['file'][unknown].unique())}")
+    return result
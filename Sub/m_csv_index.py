@@ -0,0 +1,237 @@
+import io
+import os
+import mmap
+import re
+import sqlite3
+import numpy as np
+from contextlib import contextmanager
+import pandas as pd
+from Sub.g_csv_merge import ID_COLUMN
+from Sub.j_csv_numeric import to_numbers
+from Sub.k_time_scale import TIME_COLUMNS, calendar_to_jd, epoch_columns, load_time_scales
+
+INDEX_NAME = 'merged.index'
+# 木星卫星的编号，表格中也用 NAIF 编号 (501-516) 或法文名
+SATELLITE_NUMBERS = {
+    'io': 1, 'europa': 2, 'europe': 2, 'ganymede': 3, 'callisto': 4, 'amalthea': 5, 'amalthee': 5,
+    'himalia': 6, 'elara': 7, 'pasiphae': 8, 'sinope': 9, 'lysithea': 10, 'carme': 11, 'ananke': 12,
+    'leda': 13, 'thebe': 14, 'adrastea': 15, 'metis': 16,
+}
+# 主卫星列按优先级排列，第二颗卫星列用于互掩等成对事件
+SATELLITE_COLUMNS = ['n-sat', 'sat', 'sat1', 'na']
+SECOND_SATELLITE_COLUMNS = ['sat2', 'np']
+# 一行记录多颗卫星的宽表，例如 x-j1 ... x-j4
+WIDE_SATELLITE_RE = re.compile(r'^[xy]-j(\d+)$', re.IGNORECASE)
+
+
+def satellite_number(value):
+    # 'J2'、2、'502'、'Europa' 都返回 2，无法识别时返回 None
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if text.startswith('j') and text[1:].isdigit():
+        text = text[1:]
+    if text.isdigit():
+        number = int(text)
+        return number - 500 if 500 < number < 600 else number
+    return SATELLITE_NUMBERS.get(text)
+
+
+def record_offsets(merged_path):
+    # 逐行扫描字节，引号内的换行不算记录的结束，返回每条数据记录的 (起点, 长度)
+    offsets = []
+    lengths = []
+    with open(merged_path, 'rb') as file:
+        position = len(file.readline())
+        start = position
+        quoted = False
+        for line in file:
+            position += len(line)
+            if line.count(b'"') % 2:
+                quoted = not quoted
+            if not quoted:
+                offsets.append(start)
+                lengths.append(position - start)
+                start = position
+    return np.array(offsets, dtype='int64'), np.array(lengths, dtype='int64')
+
+
+def row_satellites(df, file_ids, satellites_path):
+    # 每行的卫星编号：优先用行内的卫星列，否则取该文件唯一的一颗卫星；互掩事件两颗卫星都记录
+    single = pd.Series(dtype='float64')
+    if satellites_path and os.path.exists(satellites_path):
+        satellites = pd.read_csv(satellites_path, dtype=str)
+        counts = satellites.groupby('id')['Satellite'].transform('size')
+        single = satellites[counts == 1].set_index('id')['Satellite'].map(satellite_number).astype('float64')
+
+    def numbers(column):
+        # NAIF 编号 5xx 和卫星影子 10xx 换算为卫星序号，其余超出范围的编号不是卫星
+        values = to_numbers(df[column])
+        values = values.where(~values.between(501, 599), values - 500)
+        values = values.where(~values.between(1001, 1099), values - 1000)
+        return values.where(values.between(1, 99))
+
+    primary = pd.Series(np.nan, index=df.index)
+    for column in SATELLITE_COLUMNS:
+        if column in df.columns:
+            primary = primary.fillna(numbers(column))
+    entries = [primary.fillna(file_ids.map(single))]
+    entries += [numbers(column) for column in SECOND_SATELLITE_COLUMNS if column in df.columns]
+
+    wide = {}
+    for column in df.columns:
+        match = WIDE_SATELLITE_RE.match(column)
+        if match:
+            present = df[column].str.strip('[] ') != ''
+            wide[match.group(1)] = wide.get(match.group(1), False) | present
+    for number, present in wide.items():
+        entries.append(pd.Series(float(number), index=df.index).where(present))
+    return entries
+
+
+def build_index(merged_path, info_path, satellites_path=None, index_path=None):
+    index_path = index_path or os.path.join(os.path.dirname(merged_path), INDEX_NAME)
+    offsets, lengths = record_offsets(merged_path)
+    df = pd.read_csv(merged_path, dtype=str, keep_default_na=False,
+                     usecols=lambda column: column in TIME_COLUMNS or column == ID_COLUMN
+                     or column in SATELLITE_COLUMNS + SECOND_SATELLITE_COLUMNS or WIDE_SATELLITE_RE.match(column))
+    if len(df) != len(offsets):
+        raise ValueError(f"{merged_path} 的记录数 {len(offsets)} 与解析出的行数 {len(df)} 不一致")
+
+    file_ids = df[ID_COLUMN].str.rsplit('.csv_', n=1).str[0]
+    epochs = epoch_columns(df, load_time_scales(info_path))
+    jd = epochs['jd_tt'].fillna(epochs['jd']).to_numpy()
+    info = pd.read_csv(info_path, dtype=str)
+
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    with connection:
+        connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute('CREATE TABLE files (file TEXT PRIMARY KEY, observatory TEXT)')
+        connection.execute('CREATE TABLE rows (row INTEGER PRIMARY KEY, file TEXT, jd REAL, '
+                           'offset INTEGER, length INTEGER)')
+        connection.execute('CREATE TABLE satellites (satellite INTEGER, jd REAL, row INTEGER)')
+        stat = os.stat(merged_path)
+        connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('merged_path', os.path.abspath(merged_path)), ('size', str(stat.st_size)),
+            ('mtime', str(stat.st_mtime_ns)),
+        ])
+        connection.executemany('INSERT INTO files VALUES (?, ?)',
+                               zip(info['id'], info['Observatory'].fillna('')))
+        rows = np.arange(len(df))
+        jd_values = [None if np.isnan(value) else float(value) for value in jd]
+        connection.executemany('INSERT INTO rows VALUES (?, ?, ?, ?, ?)',
+                               zip(rows.tolist(), file_ids, jd_values, offsets.tolist(), lengths.tolist()))
+        for numbers in row_satellites(df, file_ids, satellites_path):
+            present = numbers.notna().to_numpy()
+            connection.executemany('INSERT INTO satellites VALUES (?, ?, ?)', zip(
+                numbers[present].astype('int64').tolist(),
+                [jd_values[i] for i in rows[present]], rows[present].tolist()))
+        connection.execute('CREATE INDEX satellite_time ON satellites (satellite, jd)')
+        connection.execute('CREATE INDEX file_time ON rows (file, jd)')
+        connection.execute('CREATE INDEX row_time ON rows (jd)')
+    connection.close()
+    os.replace(tmp_path, index_path)
+    print(f"索引完成，共 {len(df)} 行，{np.isnan(jd).sum()} 行没有时间，输出到 {index_path}")
+    return index_path
+
+
+def year_range(start_year, end_year):
+    # 含首尾两年的儒略日区间 [start, end)
+    return float(calendar_to_jd(start_year, 1, 1)), float(calendar_to_jd(end_year + 1, 1, 1))
+
+
+class ObservationIndex:
+    # 打开一次后可以反复查询，只按字节区间读取命中的行
+    def __init__(self, merged_path, index_path=None):
+        self.merged_path = merged_path
+        self.index_path = index_path or os.path.join(os.path.dirname(merged_path), INDEX_NAME)
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        meta = self.read_meta(self.connection)
+        stat = os.stat(merged_path)
+        if int(meta['size']) != stat.st_size or int(meta['mtime']) != stat.st_mtime_ns:
+            # 旧索引中的字节区间对新文件没有意义，读出的会是错误的行
+            self.connection.close()
+            raise RuntimeError(f"{self.index_path} 与 {merged_path} 不一致，请先用 build_index 重新建立索引")
+        self.file = open(merged_path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = self.map[:self.map.find(b'\n') + 1]
+
+    @staticmethod
+    def read_meta(connection):
+        return dict(connection.execute('SELECT key, value FROM meta'))
+
+    @staticmethod
+    @contextmanager
+    def meta(index_path):
+        # 只读取索引对应的合并表路径、大小和修改时间
+        connection = sqlite3.connect(index_path)
+        try:
+            yield ObservationIndex.read_meta(connection)
+        finally:
+            connection.close()
+
+    def rows(self):
+        return self.connection.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ranges(self, satellite=None, file=None, observatory=None, start=None, end=None, years=None):
+        # 返回命中行的 (起点, 长度)，按文件中的顺序排列；时间区间为 [start, end) 的儒略日
+        if years is not None:
+            start, end = year_range(*years)
+        conditions = []
+        params = []
+        source = 'rows'
+        if satellite is not None:
+            number = satellite_number(satellite)
+            if number is None:
+                raise ValueError(f"无法识别的卫星: {satellite}")
+            source = 'satellites JOIN rows USING (row)'
+            conditions.append('satellites.satellite = ?')
+            params.append(number)
+        time_column = 'satellites.jd' if satellite is not None else 'rows.jd'
+        if start is not None:
+            conditions.append(f'{time_column} >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append(f'{time_column} < ?')
+            params.append(end)
+        if file is not None:
+            conditions.append('rows.file = ?')
+            params.append(os.path.splitext(os.path.basename(file))[0])
+        if observatory is not None:
+            conditions.append('rows.file IN (SELECT file FROM files WHERE observatory LIKE ?)')
+            params.append(f'%{observatory}%')
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        query = f'SELECT DISTINCT rows.row, rows.offset, rows.length FROM {source}{where} ORDER BY rows.row'
+        return [(offset, length) for _, offset, length in self.connection.execute(query, params)]
+
+    def read(self, columns=None, **query):
+        return self.parse(self.ranges(**query), columns)
+
+    def parse(self, ranges, columns=None):
+        # 只拼接命中的字节区间再解析，与直接读取 merged.csv 得到的列相同；columns 只解析指定的列（总是包含 id 列）
+        data = b''.join(self.map[offset:offset + length] for offset, length in ranges)
+        usecols = None if columns is None else lambda column: column in columns or column == ID_COLUMN
+        return pd.read_csv(io.BytesIO(self.header + data), dtype=str, keep_default_na=False, usecols=usecols)
+
+
+def query_observations(merged_path, index_path=None, **query):
+    with ObservationIndex(merged_path, index_path) as index:
+        return index.read(**query)
+
+
+if __name__ == '__main__':
+    build_index('./Result/merged.csv', './Result/informations.csv', './Result/satellites.csv')
@@ -0,0 +1,197 @@
+import io
+import os
+import re
+import csv
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from Sub.d_csv_utils import read_csv_header
+from Sub.t_csv_writer import atomic_open
+
+REVIEW_NAME = '.schema_review.json'
+CONFIDENCE_THRESHOLD = 0.8
+# 规则命中的列直接给出规范列名，按顺序匹配，先匹配更具体的写法
+RULES = [
+    ('x-h', r'^hours? of right ascension'),
+    ('x-m', r'^minutes? of right ascension'),
+    ('x-s', r'^seconde?s? of right ascension'),
+    ('y-d', r'^degrees? of declination'),
+    ("y-'", r'^(arc)?minutes? of declination'),
+    ("y-''", r'^(arc)?seconde?s? of declination'),
+    ('alpha.hours', r'^hours? with decimals of right ascension'),
+    ('delta.Degrees', r'^degrees? with decimals of declination'),
+    ('year', r'^year\b.*\bobservation'),
+    ('mon', r'^month\b.*\bobservation'),
+    ('day', r'^day\b.*\bobservation'),
+    ('hour', r'^hours?\b.*\b(observation|astrometric data)'),
+    ('min', r'^minutes?\b.*\b(observation|astrometric data)'),
+    ('sec', r'^seconde?s?\b.*\b(observation|astrometric data)'),
+    ('n-ref', r'^number of (the )?reference satellite'),
+    ('n-sat', r'^number of (the )?satellite\b'),
+    ('n-obs', r'^(the )?code of (the )?observatory|^observatory code'),
+    ('n-ober', r'^number of (the )?observers?\b'),
+    ('n-tel', r'^number of (the )?telescope'),
+    ('jd', r'^(jd|julian date)\b.*\bobservation'),
+    ('mag', r'^(the observed )?magnitude\b'),
+    ('band', r'^band for magnitude'),
+    ('n-mpc', r'^reference to the (issue|number) of mpc'),
+    ('O-C(X)', r'^"?o-c"? for x\b'),
+    ('O-C(Y)', r'^"?o-c"? for y\b'),
+]
+COMPILED_RULES = [(name, re.compile(pattern)) for name, pattern in RULES]
+# 列说明中的同义词，统一后再做模糊匹配
+WORD_SYNONYMS = {
+    'seconde': 'second', 'secondes': 'second', 'seconds': 'second', 'sec': 'second',
+    'minutes': 'minute', 'min': 'minute', 'hours': 'hour', 'h': 'hour',
+    'degres': 'degree', 'degrees': 'degree', 'deg': 'degree', 'arcseconds': 'arcsec', 'arcsecond': 'arcsec',
+    'ra': 'alpha', 'dec': 'delta', 'decl': 'delta', 'declination': 'delta',
+    'satellites': 'satellite', 'sat': 'satellite', 'observers': 'observer',
+    'julian': 'jd', 'grinwich': 'greenwich', 'catalog': 'catalogue',
+}
+# 手工表头中的笔误和写法差异，统一到规范列名
+HEADER_SYNONYMS = {'sce': 'sec', 'say': 'day', 'dau': 'day', 'month': 'mon', 'JD': 'jd'}
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def normalize_description(text):
+    return ' '.join(str(text).lower().split())
+
+
+def tokenize(text):
+    return [WORD_SYNONYMS.get(token, token) for token in TOKEN_RE.findall(normalize_description(text))]
+
+
+def match_rule(description):
+    text = normalize_description(description)
+    for name, pattern in COMPILED_RULES:
+        if pattern.search(text):
+            return name
+    return None
+
+
+class SynonymTable:
+    # 已人工标注的列说明 -> 列名，按 TF-IDF 余弦相似度查找最接近的说明
+    def __init__(self, descriptions, names, files):
+        self.names = np.array([HEADER_SYNONYMS.get(name, name) for name in names], dtype=object)
+        self.files = np.array(files, dtype=object)
+        self.vocabulary = {}
+        for tokens in map(tokenize, descriptions):
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+        counts = self.count(descriptions)
+        frequency = (counts > 0).sum(axis=0)
+        self.idf = np.log((1 + len(descriptions)) / (1 + frequency)) + 1
+        self.matrix = self.weigh(counts)
+
+    def count(self, descriptions):
+        counts = np.zeros((len(descriptions), len(self.vocabulary)), dtype='float32')
+        for row, tokens in enumerate(map(tokenize, descriptions)):
+            for token in tokens:
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    counts[row, column] += 1
+        return counts
+
+    def weigh(self, counts):
+        weights = counts * self.idf
+        norms = np.linalg.norm(weights, axis=1, keepdims=True)
+        return weights / np.where(norms == 0, 1, norms)
+
+    def lookup(self, descriptions, exclude=None):
+        # 返回每条说明最相似的已标注列名及相似度，exclude 的文件不参与（用于留一检验）
+        if len(self.names) == 0:
+            return [None] * len(descriptions), np.zeros(len(descriptions))
+        scores = self.weigh(self.count(descriptions)) @ self.matrix.T
+        if exclude is not None:
+            scores[:, self.files == exclude] = -1
+        best = scores.argmax(axis=1)
+        return list(self.names[best]), scores[np.arange(len(descriptions)), best]
+
+
+def load_descriptions(formats_path):
+    formats = pd.read_csv(formats_path, dtype=str)
+    formats['Column'] = pd.to_numeric(formats['Column'])
+    return {file_id: group.sort_values('Column')['Description'].fillna('').tolist()
+            for file_id, group in formats.groupby('id')}
+
+
+def load_examples(descriptions, labeled_folder):
+    # 表头已人工编辑过、且列数与 Format. 一致的文件作为同义词表
+    rows = []
+    for file_id, items in descriptions.items():
+        file_path = os.path.join(labeled_folder, file_id + '.csv')
+        if not os.path.exists(file_path):
+            continue
+        headers, _ = read_csv_header(file_path)
+        if len(headers) == len(items):
+            rows += [(description, header, file_id) for description, header in zip(items, headers) if header.strip()]
+    return SynonymTable(*zip(*rows)) if rows else SynonymTable([], [], [])
+
+
+def map_columns(items, table, exclude=None):
+    # 规则优先，其余列用同义词表模糊匹配；同一文件中重复的列名降低置信度
+    names, scores = table.lookup(items, exclude)
+    names = list(names)
+    scores = np.asarray(scores, dtype='float64').copy()
+    for i, description in enumerate(items):
+        rule = match_rule(description)
+        if rule:
+            names[i], scores[i] = rule, 1.0
+    counts = pd.Series(names).value_counts()
+    for i, name in enumerate(names):
+        if name is None or counts[name] > 1:
+            scores[i] = min(scores[i], 0.5)
+            names[i] = names[i] or f'C{i + 1}'
+    return names, scores
+
+
+def rewrite_header(file_path, output_path, headers, encoding=None):
+    # 只替换第一行，其余内容按字节复制；output_path 可以与 file_path 相同
+    encoding = encoding or read_csv_header(file_path)[1]
+    # chardet 对只含 ASCII 的文件给出 ascii，新表头可能有中文等字符，改用与之兼容的 UTF-8
+    if not encoding or encoding.lower() == 'ascii':
+        encoding = 'utf-8'
+    line = io.StringIO()
+    csv.writer(line).writerow(headers)
+    with open(file_path, 'rb') as source, atomic_open(output_path, 'wb') as target:
+        source.readline()
+        target.write(line.getvalue().encode(encoding))
+        shutil.copyfileobj(source, target)
+
+
+def map_schema(formats_path, csv_folder, output_folder, labeled_folder=None, threshold=CONFIDENCE_THRESHOLD):
+    # 批量为 csv_folder 中的文件写出规范表头，置信度低的文件记录到 REVIEW_NAME 交给 f_csv_header 人工处理
+    descriptions = load_descriptions(formats_path)
+    table = load_examples(descriptions, labeled_folder) if labeled_folder else SynonymTable([], [], [])
+    os.makedirs(output_folder, exist_ok=True)
+
+    review = {}
+    written = 0
+    for filename in sorted(f for f in os.listdir(csv_folder) if f.endswith('.csv')):
+        file_id = os.path.splitext(filename)[0]
+        file_path = os.path.join(csv_folder, filename)
+        headers, _ = read_csv_header(file_path)
+        items = descriptions.get(file_id, [])
+        if len(items) != len(headers):
+            review[file_id] = {'confidence': 0.0, 'headers': headers,
+                               'reason': f'Format. 有 {len(items)} 列，文件有 {len(headers)} 列'}
+            shutil.copyfile(file_path, os.path.join(output_folder, filename))
+            continue
+        # 不使用文件自身已有的人工表头，置信度只来自其他文件
+        names, scores = map_columns(items, table, exclude=file_id)
+        confidence = float(scores.min()) if len(scores) else 0.0
+        rewrite_header(file_path, os.path.join(output_folder, filename), names)
+        written += 1
+        if confidence < threshold:
+            review[file_id] = {'confidence': round(confidence, 3), 'headers': names,
+                               'uncertain': [names[i] for i in np.flatnonzero(scores < threshold)]}
+
+    with open(os.path.join(output_folder, REVIEW_NAME), 'w', encoding='utf-8') as file:
+        json.dump(review, file, ensure_ascii=False, indent=1)
+    print(f"表头映射完成，{written} 个文件写出规范表头，{len(review)} 个文件需要人工检查，列表保存在 {REVIEW_NAME}")
+    return review
+
+
+if __name__ == '__main__':
+    map_schema('./Result/formats.csv', './Result/csv', './Result/mapped', labeled_folder='./Result/final')
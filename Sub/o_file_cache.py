@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import chardet
+from collections import OrderedDict
+from Sub.s_mmap_reader import MappedFile
+
+# 所有阶段共用的缓存：文件路径 + size/mtime 找到内容哈希，再按 (类型, 哈希) 保存结果；
+# 默认放在仓库根目录下，从其他目录运行时仍使用同一个缓存
+CACHE_DIR = os.environ.get('ANCOJ_CACHE_DIR',
+                           os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.file_cache'))
+CACHE_FILE = 'cache.sqlite'
+MAX_BYTES = 256 * 1024 * 1024
+MEMORY_ITEMS = 512
+# 编码只需要文件开头的一段内容即可判断
+SAMPLE_SIZE = 64 * 1024
+
+
+def read_sample(file_path, sample_size=SAMPLE_SIZE):
+    with open(file_path, 'rb') as file:
+        return file.read(sample_size)
+
+
+def detect_encoding(sample):
+    return chardet.detect(sample)['encoding']
+
+
+def file_hash(file_path):
+    # 直接对映射的内容求哈希，不复制到 Python 对象
+    with MappedFile(file_path) as mapped:
+        return hashlib.md5(mapped.buffer).hexdigest()
+
+
+class FileCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, memory_items=MEMORY_ITEMS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.connection = None
+        self.pid = None
+        # 已用字节数的估计，连接后第一次写入时求和一次
+        self.total = None
+        # 图形界面的预读线程也会使用同一个缓存
+        self.lock = threading.RLock()
+
+    def connect(self):
+        # 每个进程使用自己的连接，多进程同时写入时由 SQLite 加锁
+        if self.connection is None or self.pid != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.connection = sqlite3.connect(os.path.join(self.cache_dir, CACHE_FILE), timeout=60,
+                                              check_same_thread=False)
+            self.pid = os.getpid()
+            self.total = None
+            with self.connection:
+                self.connection.execute('CREATE TABLE IF NOT EXISTS paths '
+                                        '(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT)')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS items (kind TEXT, hash TEXT, value TEXT, '
+                                        'bytes INTEGER, used REAL, PRIMARY KEY (kind, hash))')
+        return self.connection
+
+    def content_hash(self, path, size, mtime):
+        connection = self.connect()
+        row = connection.execute('SELECT size, mtime, hash FROM paths WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == size and row[1] == mtime:
+            return row[2]
+        digest = file_hash(path)
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO paths VALUES (?, ?, ?, ?)', (path, size, mtime, digest))
+        return digest
+
+    def remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def item_hash(self, path, stat, by_content=True):
+        # by_content 为 False 时只按路径和 size/mtime 区分，适合只读取文件开头的结果（如表头），不必对整个文件求哈希
+        if by_content:
+            return self.content_hash(path, stat.st_size, stat.st_mtime_ns)
+        return f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    def get(self, kind, file_path, compute, by_content=True):
+        # compute(file_path) 的结果必须可以 JSON 序列化
+        with self.lock:
+            return self.lookup(kind, file_path, compute, by_content)
+
+    def peek(self, kind, file_path, by_content=True):
+        # 只查缓存，未命中时返回 None，用于先在主进程中筛掉不需要重新计算的文件
+        with self.lock:
+            return self.lookup(kind, file_path, None, by_content)
+
+    def put(self, kind, file_path, value, by_content=True):
+        # 直接记录结果，例如文件转换成功之后
+        with self.lock:
+            path = os.path.abspath(file_path)
+            stat = os.stat(path)
+            value = self.store(kind, self.item_hash(path, stat, by_content), value)
+            self.remember((kind, path, stat.st_size, stat.st_mtime_ns), value)
+            return value
+
+    def file_digest(self, file_path):
+        with self.lock:
+            path = os.path.abspath(file_path)
+            stat = os.stat(path)
+            return self.content_hash(path, stat.st_size, stat.st_mtime_ns)
+
+    def lookup(self, kind, file_path, compute, by_content=True):
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        key = (kind, path, stat.st_size, stat.st_mtime_ns)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        digest = self.item_hash(path, stat, by_content)
+        connection = self.connect()
+        row = connection.execute('SELECT value FROM items WHERE kind = ? AND hash = ?', (kind, digest)).fetchone()
+        if row is not None:
+            with connection:
+                connection.execute('UPDATE items SET used = ? WHERE kind = ? AND hash = ?', (time.time(), kind, digest))
+            value = json.loads(row[0])
+        elif compute is None:
+            return None
+        else:
+            value = self.store(kind, digest, compute(file_path))
+        self.remember(key, value)
+        return value
+
+    def store(self, kind, digest, value):
+        text = json.dumps(value, ensure_ascii=False)
+        size = len(text.encode('utf-8'))
+        connection = self.connect()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)',
+                               (kind, digest, text, size, time.time()))
+        self.evict(size)
+        return json.loads(text)
+
+    def used_bytes(self):
+        return self.connect().execute('SELECT COALESCE(SUM(bytes), 0) FROM items').fetchone()[0]
+
+    def evict(self, added):
+        # 每次写入只累加估计值；估计超出容量时重新求和（其他进程也会写入），
+        # 确实超出时按最近使用时间淘汰，直到降到容量的 90%
+        if self.total is None:
+            self.total = self.used_bytes()
+        else:
+            self.total += added
+        if self.total <= self.max_bytes:
+            return
+        self.total = self.used_bytes()
+        if self.total <= self.max_bytes:
+            return
+        connection = self.connect()
+        with connection:
+            for kind, digest, size in connection.execute(
+                    'SELECT kind, hash, bytes FROM items ORDER BY used').fetchall():
+                if self.total <= self.max_bytes * 0.9:
+                    break
+                connection.execute('DELETE FROM items WHERE kind = ? AND hash = ?', (kind, digest))
+                self.total -= size
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            with self.connect() as connection:
+                connection.execute('DELETE FROM items')
+                connection.execute('DELETE FROM paths')
+            self.total = 0
+
+
+shared_cache = FileCache()
+
+
+def cached(kind, file_path, compute, by_content=True):
+    return shared_cache.get(kind, file_path, compute, by_content)
+
+
+def file_encoding(file_path):
+    # 编码只取决于文件开头，同样按 size/mtime 缓存
+    return cached('encoding', file_path, lambda path: detect_encoding(read_sample(path)), by_content=False)
+
+
+def decode_file(file_path):
+    with open(file_path, 'rb') as file:
+        return file.read().decode(file_encoding(file_path) or 'utf-8', errors='replace')
+
+
+def file_text(file_path):
+    return cached('text', file_path, decode_file)
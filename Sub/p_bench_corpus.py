@@ -0,0 +1,146 @@
+import os
+import numpy as np
+
+BASE_FILES = 229
+BASE_ROWS = 250
+SATELLITES = [('J1', 'Io'), ('J2', 'Europe'), ('J3', 'Ganymede'), ('J4', 'Callisto')]
+
+# 几种常见的文件格式：(Format. 中的列说明, 列宽, 生成一列数值的方式)
+TEMPLATES = {
+    'relative': [
+        ('Year   of the moment of observation', 4, 'year'),
+        ('Month  of the moment of observation', 2, 'month'),
+        ('Day    of the moment of observation with decimals', 9, 'day'),
+        ('Number of satellite (N sat)', 2, 'satellite'),
+        ('Number of reference satellite (N ref)', 2, 'satellite'),
+        ('X, arcsec', 9, 'arcsec'),
+        ('Y, arcsec', 9, 'arcsec'),
+        ('O-C(X)e for alpha, arcsec', 7, 'residual'),
+        ('O-C(Y)e for delta, arcsec', 7, 'residual'),
+    ],
+    'absolute': [
+        ('Year   of the moment of observation', 4, 'year'),
+        ('Month  of the moment of observation', 2, 'month'),
+        ('Day    of the moment of observation with decimals', 9, 'day'),
+        ('Number of satellite (N sat)', 2, 'satellite'),
+        ('Hour   of right ascension (alpha, h)', 2, 'hour'),
+        ('Minute of right ascension (alpha, m)', 2, 'minute'),
+        ('Second of right ascension (alpha, s)', 6, 'second'),
+        ('Degree of declination (delta, deg)', 3, 'degree'),
+        ("Minute of declination (delta, '  )", 2, 'minute'),
+        ("Second of declination (delta, '' )", 5, 'second'),
+        ('Code of observatory, N obs', 3, 'observatory'),
+    ],
+    'plate': [
+        ('The chronological number (N)', 5, 'counter'),
+        ('Year   of the moment of observation', 4, 'year'),
+        ('Month  of the moment of observation', 2, 'month'),
+        ('Day    of the moment of observation', 2, 'integer_day'),
+        ('X coordinate of J1-Io       in micrometer (zero if not observed).', 16, 'fortran'),
+        ('X coordinate of J2-Europe   in micrometer (zero if not observed).', 16, 'fortran'),
+        ('Y coordinate of J1-Io       in micrometer (zero if not observed).', 16, 'fortran'),
+        ('Y coordinate of J2-Europe   in micrometer (zero if not observed).', 16, 'fortran'),
+        ('The factor of the plate scale in arseconds per millimeter (Factor).', 16, 'fortran'),
+    ],
+}
+
+
+def column_values(kind, rows, rng):
+    if kind == 'year':
+        return rng.integers(1900, 2020, rows).astype(str)
+    if kind == 'month':
+        return rng.integers(1, 13, rows).astype(str)
+    if kind == 'day':
+        return np.char.mod('%.6f', rng.uniform(1, 29, rows))
+    if kind == 'integer_day':
+        return rng.integers(1, 29, rows).astype(str)
+    if kind == 'satellite':
+        return rng.integers(1, 5, rows).astype(str)
+    if kind == 'arcsec':
+        return np.char.mod('%+.2f', rng.normal(0, 100, rows))
+    if kind == 'residual':
+        return np.char.mod('%.2f', rng.normal(0, 0.2, rows))
+    if kind == 'hour':
+        return rng.integers(0, 24, rows).astype(str)
+    if kind == 'minute':
+        return np.char.mod('%02d', rng.integers(0, 60, rows))
+    if kind == 'second':
+        return np.char.mod('%05.2f', rng.uniform(0, 60, rows))
+    if kind == 'degree':
+        return np.char.mod('%+03d', rng.integers(-23, 24, rows))
+    if kind == 'observatory':
+        return rng.integers(1, 999, rows).astype(str)
+    if kind == 'counter':
+        return np.arange(1, rows + 1).astype(str)
+    # Fortran 的 D 指数写法
+    mantissa = rng.uniform(0.1, 1, rows) * np.sign(rng.normal(size=rows))
+    exponent = rng.integers(0, 5, rows)
+    return np.char.mod('%.9f', mantissa).astype(object) + 'D+' + np.char.mod('%02d', exponent).astype(object)
+
+
+def write_html(file_path, file_id, template, rows, counts):
+    satellites = ',\n              '.join(f'{number}-{name}: {count}' for (number, name), count in counts)
+    items = '\n'.join(f'  {i}. {description}' for i, (description, _, _) in enumerate(template, 1))
+    with open(file_path, 'w', encoding='ascii') as file:
+        file.write(f"""<HTML><HEAD><TITLE>{file_id}</TITLE></HEAD><PRE>
+Contents.
+      planet: 5 -Jupiter
+  satellites: {satellites}
+total number: {rows}
+        type: {'relative' if 'X, arcsec' in items else 'absolute'}
+       dates: 1900-2020
+ observatory: 084 - Pulkovo
+
+Reference.
+   Synthetic benchmark data.
+
+Informations.
+     reference frame: astrometric
+     centre of frame: topocentre
+    epoch of equinox: J2000
+          time scale: UTC
+           reduction: no information
+         coordinates: right ascension, declination
+    diff. refraction: removed
+            receptor: CCD
+           telescope: Refractor, F = 10.4 m, D = 62 cm
+           observers: Synthetic
+
+Comments.
+          evaluation: none
+
+Format.
+{items}
+
+</PRE></BODY></HTML>""")
+
+
+def write_txt(file_path, template, rows, rng):
+    # 定宽右对齐的行，列之间至少一个空格
+    columns = [np.char.rjust(column_values(kind, rows, rng).astype(str), width)
+               for _, width, kind in template]
+    lines = columns[0].astype(object)
+    for column in columns[1:]:
+        lines = lines + ' ' + column.astype(object)
+    with open(file_path, 'w', encoding='ascii', newline='\n') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def generate_corpus(output_dir, file_scale=1, row_scale=1, seed=0, base_files=BASE_FILES, base_rows=BASE_ROWS):
+    # 生成 NSDC 格式的 HTML+TXT 文件对，文件数和每个文件的行数分别按倍数放大
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    names = list(TEMPLATES)
+    files = int(base_files * file_scale)
+    total_rows = 0
+    for i in range(files):
+        file_id = f'jb{i + 1:05d}'
+        template = TEMPLATES[names[i % len(names)]]
+        # 行数在基准值附近随机变化
+        rows = max(1, int(rng.uniform(0.2, 1.8) * base_rows * row_scale))
+        shares = rng.multinomial(rows, [0.25] * 4)
+        counts = [(satellite, int(count)) for satellite, count in zip(SATELLITES, shares) if count]
+        write_html(os.path.join(output_dir, file_id + '.html'), file_id, template, rows, counts)
+        write_txt(os.path.join(output_dir, file_id + '.txt'), template, rows, rng)
+        total_rows += rows
+    return {'files': files, 'rows': total_rows}
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager
+
+# 开启性能记录时设置该环境变量，进程池中的工作进程继承后把逐个文件的记录追加到这个目录
+PROFILE_ENV = 'ANCOJ_PROFILE_DIR'
+FILES_PREFIX = 'files-'
+TOP_FUNCTIONS = 15
+SLOWEST_FILES = 10
+
+
+def peak_rss_mb():
+    # resource 只在 Unix 上有，Linux 上 ru_maxrss 的单位是 KB，子进程取其中最大的一个；
+    # Windows 上改用 psutil 读取本进程的峰值，没有 psutil 时不记录内存
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, 'peak_wset', memory.rss) / 1024 / 1024, 1)
+    return round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                     resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024, 1)
+
+
+class FileRecord:
+    def __init__(self, stage, file_path):
+        self.stage = stage
+        self.file_path = file_path
+        self.start = time.time()
+        self.seconds = 0.0
+        self.rows = None
+        self.error = None
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        # 同名的阶段累加，例如逐块的写入时间
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def save(self, profile_dir):
+        record = {
+            'stage': self.stage, 'file': os.path.basename(self.file_path), 'pid': os.getpid(),
+            'start': self.start, 'seconds': round(self.seconds, 6),
+            'bytes': os.path.getsize(self.file_path) if os.path.exists(self.file_path) else None,
+            'rows': self.rows, 'error': self.error,
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        # 每个进程写自己的文件，不需要加锁
+        with open(os.path.join(profile_dir, f'{FILES_PREFIX}{os.getpid()}.jsonl'), 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+@contextmanager
+def track_file(stage, file_path):
+    # 处理单个文件的耗时；未开启性能记录时只多两次计时，不写任何东西
+    record = FileRecord(stage, file_path)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error = str(e)
+        raise
+    finally:
+        record.seconds = time.perf_counter() - start
+        profile_dir = os.environ.get(PROFILE_ENV)
+        if profile_dir:
+            record.save(profile_dir)
+
+
+class Profiler:
+    def __init__(self, output_dir, cprofile=False, trace_malloc=False):
+        self.output_dir = os.path.abspath(output_dir)
+        self.cprofile = cprofile
+        self.trace_malloc = trace_malloc
+        self.stages = []
+        os.makedirs(self.output_dir, exist_ok=True)
+        for filename in os.listdir(self.output_dir):
+            if filename.startswith(FILES_PREFIX):
+                os.remove(os.path.join(self.output_dir, filename))
+        os.environ[PROFILE_ENV] = self.output_dir
+
+    @contextmanager
+    def stage(self, name):
+        # cProfile 和 tracemalloc 只覆盖主进程；进程池中的开销见逐个文件的记录
+        record = {'stage': name, 'pid': os.getpid(), 'start': time.time()}
+        profile = cProfile.Profile() if self.cprofile else None
+        if self.trace_malloc:
+            tracemalloc.start()
+        if profile:
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            if profile:
+                profile.disable()
+                record['cprofile'] = os.path.join(self.output_dir, f'{name}.prof')
+                profile.dump_stats(record['cprofile'])
+            if self.trace_malloc:
+                record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+                tracemalloc.stop()
+            record['peak_rss_mb'] = peak_rss_mb()
+            self.stages.append(record)
+            memory = f"，峰值内存 {record['peak_rss_mb']} MB" if record['peak_rss_mb'] is not None else ''
+            logging.info(f"{name} 用时 {record['seconds']:.2f}s{memory}")
+            if profile:
+                self.log_functions(record['cprofile'])
+
+    def log_functions(self, stats_path):
+        stats = pstats.Stats(stats_path)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        for (file_name, line, function), (_, calls, _, cumulative, _) in rows:
+            logging.info(f"    {cumulative:8.3f}s {calls:>9} 次  {function} ({os.path.basename(file_name)}:{line})")
+
+    def load_files(self):
+        records = []
+        for filename in sorted(os.listdir(self.output_dir)):
+            if filename.startswith(FILES_PREFIX):
+                with open(os.path.join(self.output_dir, filename), 'r', encoding='utf-8') as file:
+                    records += [json.loads(line) for line in file if line.strip()]
+        return sorted(records, key=lambda record: record['start'])
+
+    def summarize(self, files):
+        # 按阶段汇总逐个文件的记录，列出最慢的文件和出错的文件
+        summary = {}
+        for record in files:
+            stage = summary.setdefault(record['stage'], {'files': 0, 'seconds': 0.0, 'bytes': 0, 'rows': 0,
+                                                         'phases': {}, 'errors': [], 'slowest': []})
+            stage['files'] += 1
+            stage['seconds'] += record['seconds']
+            stage['bytes'] += record['bytes'] or 0
+            stage['rows'] += record['rows'] or 0
+            for name, seconds in record['phases'].items():
+                stage['phases'][name] = stage['phases'].get(name, 0.0) + seconds
+            if record['error']:
+                stage['errors'].append({'file': record['file'], 'error': record['error']})
+        for name, stage in summary.items():
+            slowest = sorted((r for r in files if r['stage'] == name), key=lambda r: r['seconds'], reverse=True)
+            stage['slowest'] = [{key: r[key] for key in ('file', 'seconds', 'bytes', 'rows', 'phases')}
+                                for r in slowest[:SLOWEST_FILES]]
+        return summary
+
+    def log_summary(self, summary):
+        for name, stage in summary.items():
+            phases = '，'.join(f'{phase} {seconds:.2f}s' for phase, seconds in stage['phases'].items())
+            logging.info(f"{name}: {stage['files']} 个文件，累计 {stage['seconds']:.2f}s，"
+                         f"{stage['bytes'] / 1e6:.1f} MB，{stage['rows']} 行" + (f"（{phases}）" if phases else ''))
+            for record in stage['slowest'][:3]:
+                logging.info(f"    最慢 {record['file']} {record['seconds']:.3f}s，{record['bytes']} 字节")
+            for record in stage['errors']:
+                logging.warning(f"    {record['file']} 出错：{record['error']}")
+
+    def trace_events(self, files):
+        # Chrome trace 格式（chrome://tracing 或 Perfetto 打开），时间单位为微秒
+        origin = min([record['start'] for record in self.stages + files], default=0)
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': 'main'}}]
+        for record in self.stages:
+            events.append({'name': record['stage'], 'cat': 'stage', 'ph': 'X', 'pid': record['pid'],
+                           'tid': record['pid'], 'ts': (record['start'] - origin) * 1e6,
+                           'dur': record['seconds'] * 1e6, 'args': {'peak_rss_mb': record['peak_rss_mb']}})
+        for record in files:
+            events.append({'name': record['file'], 'cat': record['stage'], 'ph': 'X', 'pid': record['pid'],
+                           'tid': record['pid'], 'ts': (record['start'] - origin) * 1e6,
+                           'dur': record['seconds'] * 1e6,
+                           'args': {key: record[key] for key in ('bytes', 'rows', 'phases', 'error', 'peak_rss_mb')}})
+        return events
+
+    def finish(self):
+        os.environ.pop(PROFILE_ENV, None)
+        files = self.load_files()
+        summary = self.summarize(files)
+        self.log_summary(summary)
+        with open(os.path.join(self.output_dir, 'profile.json'), 'w', encoding='utf-8') as file:
+            json.dump({'stages': self.stages, 'summary': summary, 'files': files}, file, ensure_ascii=False, indent=1)
+        with open(os.path.join(self.output_dir, 'trace.json'), 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': self.trace_events(files), 'displayTimeUnit': 'ms'}, file)
+        logging.info(f'性能记录保存到 {self.output_dir}/profile.json 和 trace.json')
+        return summary
@@ -0,0 +1,117 @@
+import os
+import re
+import numpy as np
+from Sub.s_mmap_reader import MappedFile
+
+SPACE = ord(' ')
+BLOCK_ROWS = 10000
+# HTML 的 Format. 中长记录按 "Columns 1-80"、"Columns 81-151" 分段画出
+RULER_RE = re.compile(r'Columns\s+(\d+)\s*-\s*(\d+)')
+TOKEN_RE = re.compile(rb'\S+')
+NUMBER_RE = re.compile(rb'^[+-]?(\d+\.?\d*|\.\d+)([eEdD][+-]?\d+)?$')
+
+
+def ruler_width(html_path):
+    # 列标尺给出的记录长度，没有标尺时返回 None
+    if not html_path or not os.path.exists(html_path):
+        return None
+    with open(html_path, 'r', encoding='utf-8', errors='ignore') as file:
+        ends = [int(end) for _, end in RULER_RE.findall(file.read())]
+    return max(ends) if ends else None
+
+
+def read_records(file_path, width=None):
+    # 把文件映射到内存，按换行切开后拼成 (行数, 记录长度) 的字节矩阵，短行用空格补齐，空行去掉
+    with MappedFile(file_path) as mapped:
+        if len(mapped) == 0:
+            return np.zeros((0, 0), dtype='uint8')
+        data = mapped.array()
+        ends = np.flatnonzero(data == ord('\n'))
+        if len(ends) == 0 or ends[-1] != len(data) - 1:
+            ends = np.append(ends, len(data))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        # 去掉行尾的 \r
+        trimmed = ends - ((ends > starts) & (data[np.maximum(ends - 1, 0)] == ord('\r')))
+        # 每行（包括行尾的换行符，它们都不算非空白）是否有非空白字符，不需要整个文件长度的 int64 累加数组
+        keep = np.logical_or.reduceat(data > SPACE, starts)
+        starts, lengths = starts[keep], (trimmed - starts)[keep]
+        width = max(width or 0, int(lengths.max()) if len(lengths) else 0)
+        offsets = np.arange(width)
+        # 按行分块取出，下标矩阵（int64）只占一块的大小
+        matrix = np.empty((len(starts), width), dtype='uint8')
+        for first in range(0, len(starts), BLOCK_ROWS):
+            block = slice(first, first + BLOCK_ROWS)
+            index = np.minimum(starts[block, None] + offsets, len(data) - 1)
+            matrix[block] = np.where(offsets < lengths[block, None], data[index], SPACE)
+        # 关闭映射前释放对它的引用
+        del data
+    matrix[matrix == ord('\t')] = SPACE
+    return matrix
+
+
+def infer_spans(matrix):
+    # 所有行在某个位置都是空格，则该位置是列的分隔；连续的非空位置组成一列
+    occupied = (matrix != SPACE).any(axis=0)
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], occupied, [False])).astype('int8')))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def slice_spans(matrix, spans):
+    # 每一列取出对应的字节切片，作为定长字节串去掉两端空白
+    columns = []
+    for start, end in spans:
+        block = np.ascontiguousarray(matrix[:, start:end])
+        columns.append(np.char.strip(block.view(f'S{end - start}').ravel()))
+    return columns
+
+
+def split_span(block):
+    # 相邻的列宽度不固定、粘连在一起的列位置，按每行的字段重新分开；只含文字的列（如台站名）保持一列。
+    # 字段数少于最多的行，按字段右端与完整行右端的距离归到最近的列；无法归位时返回 None
+    rows = [[(match.end(), match.group()) for match in TOKEN_RE.finditer(cell)] for cell in block]
+    if not any(NUMBER_RE.match(text) for row in rows for _, text in row):
+        return [np.char.strip(block)]
+    count = max(map(len, rows))
+    full = [[end for end, _ in row] for row in rows if len(row) == count]
+    template = np.median(full, axis=0)
+    columns = [[b''] * len(rows) for _ in range(count)]
+    for i, row in enumerate(rows):
+        targets = range(count) if len(row) == count else [int(np.abs(template - end).argmin()) for end, _ in row]
+        if any(b <= a for a, b in zip(targets, targets[1:])):
+            return None
+        for target, (_, text) in zip(targets, row):
+            columns[target][i] = text
+    return [np.array(column, dtype=block.dtype) for column in columns]
+
+
+def split_columns(matrix, spans):
+    columns = []
+    for column, (start, end) in zip(slice_spans(matrix, spans), spans):
+        if not (np.char.find(column, b' ') >= 0).any():
+            columns.append(column)
+            continue
+        parts = split_span(np.ascontiguousarray(matrix[:, start:end]).view(f'S{end - start}').ravel())
+        if parts is None:
+            return None
+        columns += parts
+    return columns
+
+
+def whitespace_rows(matrix, encoding):
+    # 退回按空白分割，每行的字段数可能不同
+    return [line.decode(encoding, errors='ignore').split() for line in matrix.view(f'S{matrix.shape[1]}').ravel()]
+
+
+def read_fixed_width(file_path, encoding=None, spans=None, width=None):
+    # 返回 (各列的字符串数组, True)；无法按列位置切分时返回 (按空白分割的行, False)
+    encoding = encoding or 'utf-8'
+    matrix = read_records(file_path, width)
+    if matrix.size == 0:
+        return [], True
+    columns = slice_spans(matrix, spans) if spans else split_columns(matrix, infer_spans(matrix))
+    if columns is None:
+        return whitespace_rows(matrix, encoding), False
+    # 纯 ASCII 的文件直接转换类型，不必逐个值解码
+    if matrix.max() < 128:
+        return [column.astype(f'U{max(column.itemsize, 1)}') for column in columns], True
+    return [np.char.decode(column, encoding, errors='ignore') for column in columns], True
@@ -0,0 +1,72 @@
+import os
+import re
+import mmap
+import numpy as np
+
+NONBLANK_RE = re.compile(rb'\S')
+# UTF-16/32 的文件不能直接在字节上按 ASCII 匹配，需要先整体解码
+WIDE_ENCODINGS = ('utf16', 'utf32')
+
+
+class MappedFile:
+    # 只读映射整个文件，行和字段都是 memoryview 切片，不复制内容；切片只在 with 块内有效
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = None
+        self.mapped = None
+        self.buffer = memoryview(b'')
+
+    def __enter__(self):
+        self.file = open(self.file_path, 'rb')
+        if os.fstat(self.file.fileno()).st_size:
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer = memoryview(self.mapped)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.buffer.release()
+            if self.mapped is not None:
+                self.mapped.close()
+        except BufferError:
+            # 调用方仍持有切片时，映射交给垃圾回收关闭
+            pass
+        self.file.close()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def lines(self, skip_blank=False):
+        # 逐行返回不含换行符（包括 \r）的切片，换行的位置用 numpy 一次找出
+        data = self.array()
+        ends = np.flatnonzero(data == ord('\n')).tolist()
+        del data
+        buffer, start = self.buffer, 0
+        if len(buffer) and (not ends or ends[-1] != len(buffer) - 1):
+            ends.append(len(buffer))
+        for end in ends:
+            stop = end - 1 if end > start and buffer[end - 1] == 13 else end
+            line = buffer[start:stop]
+            start = end + 1
+            if skip_blank and not NONBLANK_RE.search(line):
+                continue
+            yield line
+
+    def array(self):
+        # 整个文件作为 uint8 数组（不复制），用完后需要 del，否则映射无法关闭
+        return np.frombuffer(self.buffer, dtype='uint8')
+
+    def find(self, marker, start=0):
+        return self.mapped.find(marker, start) if self.mapped is not None else -1
+
+    def decode(self, start=0, end=None, encoding=None):
+        return decode(self.buffer[start:end], encoding)
+
+
+def decode(view, encoding=None, errors='replace'):
+    # 只解码实际用到的字段
+    return str(view, encoding or 'utf-8', errors=errors)
+
+
+def is_wide(encoding):
+    return bool(encoding) and encoding.lower().replace('-', '').replace('_', '').startswith(WIDE_ENCODINGS)
@@ -0,0 +1,140 @@
+import os
+import csv
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+PENDING_LIMIT = 64
+BLOCK_LIMIT = 4
+ABORT = object()
+
+
+def temp_path(path):
+    # 临时文件与目标在同一目录，os.replace 才是原子操作；后缀不是 .csv，不会被其他阶段当作输出读取
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding='utf-8', newline=''):
+    # 写入临时文件，正常结束后替换目标文件；中途出错或被中断时删除临时文件，原来的输出保持不变
+    tmp_path = temp_path(path)
+    kwargs = {} if 'b' in mode else {'encoding': encoding, 'newline': newline}
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RowWriter:
+    # 后台线程把逐块提交的行写入 path（经 atomic_open）；队列最多 max_blocks 块，
+    # 解析方只在队列满时等待磁盘；出错退出时传 abort，原来的输出保持不变
+    def __init__(self, path, max_blocks=BLOCK_LIMIT):
+        self.path = path
+        self.queue = queue.Queue(max_blocks)
+        self.error = None
+        self.seconds = 0.0
+        self.thread = threading.Thread(target=self.run, name='csv-row-writer', daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.close(abort=exc_type is not None)
+
+    def run(self):
+        rows = []
+        try:
+            with atomic_open(self.path) as file:
+                writer = csv.writer(file)
+                while True:
+                    rows = self.queue.get()
+                    if rows is None:
+                        break
+                    if rows is ABORT:
+                        raise InterruptedError('写入已取消')
+                    start = time.perf_counter()
+                    writer.writerows(rows)
+                    self.seconds += time.perf_counter() - start
+        except Exception as e:
+            self.error = e
+            # 还没有收到结束标记时继续取出剩余的块，提交方不会因为队列满而一直等待
+            while rows is not None and rows is not ABORT:
+                rows = self.queue.get()
+
+    def write(self, rows):
+        if self.error:
+            raise self.error
+        self.queue.put(rows)
+
+    def close(self, abort=False):
+        if self.thread.is_alive():
+            self.queue.put(ABORT if abort else None)
+            self.thread.join()
+        if self.error and not abort:
+            raise self.error
+
+
+class BackgroundWriter:
+    # 后台线程按提交顺序写文件，调用方不等待磁盘；队列满时 submit 才会阻塞
+    def __init__(self, max_pending=PENDING_LIMIT):
+        self.queue = queue.Queue(max_pending)
+        self.pending = {}
+        self.errors = {}
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='csv-writer', daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, path, func, *args, callback=None):
+        # 在后台线程中执行 func(path, *args)，成功后调用 callback(path)
+        with self.condition:
+            self.pending[path] = self.pending.get(path, 0) + 1
+            self.errors.pop(path, None)
+        self.queue.put((path, func, args, callback))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            path, func, args, callback = job
+            try:
+                func(path, *args)
+                if callback:
+                    callback(path)
+            except Exception as e:
+                self.errors[path] = str(e)
+            finally:
+                with self.condition:
+                    self.pending[path] -= 1
+                    if not self.pending[path]:
+                        del self.pending[path]
+                    self.condition.notify_all()
+
+    def finished(self, path):
+        # 不等待，返回该文件提交的写入是否都已结束（成功或失败）
+        with self.condition:
+            return path not in self.pending
+
+    def wait(self, path=None):
+        # 等待某个文件（或全部文件）写完，返回写入时的错误
+        with self.condition:
+            self.condition.wait_for(lambda: (path not in self.pending) if path else not self.pending)
+        return self.errors.get(path) if path else dict(self.errors)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        return dict(self.errors)
@@ -0,0 +1,37 @@
+import os
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+STAGES = 'abcdegklw'
+EXECUTOR_TYPES = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+
+
+def match_files(filenames, patterns=None):
+    # 按文件 id（不含扩展名）匹配通配符，例如 jo00*；没有给出时保留全部文件
+    if not patterns:
+        return list(filenames)
+    return [f for f in filenames if any(fnmatch.fnmatch(os.path.splitext(os.path.basename(f))[0], pattern)
+                                        for pattern in patterns)]
+
+
+def make_executor(executor_type='process', max_workers=None):
+    # 解析类的阶段用进程；以读写文件为主或在 Windows 上启动进程开销大时可以改用线程
+    if executor_type not in EXECUTOR_TYPES:
+        raise ValueError(f"未知的执行方式 {executor_type}，可选 {', '.join(EXECUTOR_TYPES)}")
+    return EXECUTOR_TYPES[executor_type](max_workers=max_workers)
+
+
+def stage_options(values, cast=str, default=None):
+    # "8" 作为所有阶段的默认值，"b=16" 只用于阶段 b；返回 {阶段: 值}，None 键为默认值
+    options = {None: default}
+    for value in values or []:
+        stage, _, setting = value.rpartition('=')
+        for name in stage or [None]:
+            if name is not None and name not in STAGES:
+                raise ValueError(f"未知的阶段 {name}")
+            options[name] = cast(setting)
+    return options
+
+
+def option(options, stage):
+    return options.get(stage, options[None])
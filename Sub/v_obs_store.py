@@ -0,0 +1,353 @@
+import os
+import re
+import csv
+import math
+import numpy as np
+import pandas as pd
+from collections import Counter
+from Sub.d_csv_utils import read_csv_header
+from Sub.g_csv_merge import ID_COLUMN, normalize_headers
+from Sub.t_csv_writer import atomic_open
+from Sub.u_batch import make_executor, match_files
+
+# 只在少数文件中出现的列（如 ji0017 的 O-C(ra)、twist、line）放在稀疏的附表中，不进入宽表
+RARE_FILES = 3
+# 不同值较少的文字列按编码保存
+CATEGORY_LIMIT = 255
+CATEGORY_RATIO = 0.5
+# int64 和 float64 能精确保存的数字位数
+INT_DIGITS = 18
+FLOAT_DIGITS = 15
+DECIMAL_RE = re.compile(r'([+-]?)(\d+)(?:\.(\d*))?')
+
+
+class Column:
+    # 一列数据：int 为 int64，float 为 float64 加小数位数，category 为编码，text 为 UTF-8 定长字节串。
+    # 缺失值只记录在 present 中，sign 和 width 记录正号和整数部分补零的位数；decode 还原出与原 CSV 相同的文本
+    __slots__ = ('kind', 'values', 'present', 'wrapped', 'sign', 'width', 'decimals', 'categories')
+
+    def __init__(self, kind, values, present=None, wrapped=False, sign='', width=0, decimals=0, categories=None):
+        self.kind = kind
+        self.values = values
+        self.present = present
+        self.wrapped = wrapped
+        self.sign = sign
+        self.width = width
+        self.decimals = decimals
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.present) if self.present is not None else len(self.values)
+
+    def nbytes(self):
+        size = self.values.nbytes + (self.present.nbytes if self.present is not None else 0)
+        if isinstance(self.decimals, np.ndarray):
+            size += self.decimals.nbytes
+        if self.categories is not None:
+            size += sum(len(value) for value in self.categories)
+        return size
+
+    def number_text(self, value, decimals):
+        negative = value < 0 or (value == 0 and math.copysign(1, value) < 0)
+        if self.kind == 'int':
+            digits = format(abs(value), f'0{self.width}d')
+        elif decimals is None:
+            # 原文为 "12." 的写法，只有小数点没有小数位
+            digits = format(abs(value), f'0{self.width}.0f') + '.'
+        else:
+            digits = format(abs(value), f'0{self.width + (decimals + 1 if decimals else 0)}.{decimals}f')
+        return ('-' if negative else self.sign) + digits
+
+    def texts(self):
+        # 非空值去掉方括号后的文本
+        if self.kind == 'int':
+            if not self.sign and self.width <= 1:
+                return self.values.astype(str).tolist()
+            return [self.number_text(value, 0) for value in self.values.tolist()]
+        if self.kind == 'float':
+            decimals = self.decimals.tolist() if isinstance(self.decimals, np.ndarray) else [self.decimals] * len(self.values)
+            # -1 表示只有小数点
+            return [self.number_text(value, None if d < 0 else d) for value, d in zip(self.values.tolist(), decimals)]
+        if self.kind == 'category':
+            return [self.categories[code] for code in self.values.tolist()]
+        return [value.decode('utf-8') for value in self.values.tolist()]
+
+    def decode(self):
+        texts = self.texts()
+        if self.wrapped:
+            texts = ['[' + text + ']' for text in texts]
+        if self.present is None:
+            return texts
+        result = [''] * len(self.present)
+        for i, text in zip(np.flatnonzero(self.present).tolist(), texts):
+            result[i] = text
+        return result
+
+    def array(self):
+        # 带类型的 pandas 数组，缺失为 NA
+        target = self.present if self.present is not None else slice(None)
+        if self.kind == 'int':
+            values = np.zeros(len(self), dtype='int64')
+            mask = np.ones(len(self), dtype=bool)
+            values[target] = self.values
+            mask[target] = False
+            return pd.arrays.IntegerArray(values, mask)
+        if self.kind == 'float':
+            values = np.full(len(self), np.nan)
+            values[target] = self.values
+            return values
+        result = pd.array([pd.NA] * len(self), dtype='string')
+        result[target] = pd.array(self.texts(), dtype='string')
+        return result
+
+
+def encode_numbers(texts):
+    # 全部是十进制数字（可带正负号和小数）时转为 int64 或 float64，否则返回 None
+    matches = [DECIMAL_RE.fullmatch(text) for text in texts]
+    if not texts or not all(matches):
+        return None
+    signs = {match.group(1) for match in matches if match.group(1) != '-'}
+    digits = [match.group(2) + (match.group(3) or '') for match in matches]
+    if len(signs) > 1 or max(map(len, digits)) > FLOAT_DIGITS:
+        return None
+    sign = signs.pop() if signs else ''
+    # 整数部分有前导零时按最短的长度补零，例如日期中的 02
+    padded = [match.group(2) for match in matches if len(match.group(2)) > 1 and match.group(2)[0] == '0']
+    width = min(map(len, padded)) if padded else 0
+    if all(match.group(3) is None for match in matches):
+        if max(map(len, digits)) > INT_DIGITS:
+            return None
+        return Column('int', np.array([int(text) for text in texts], dtype='int64'), sign=sign, width=width)
+    decimals = np.array([-1 if match.group(3) == '' else len(match.group(3) or '') for match in matches], dtype='int8')
+    if (decimals == decimals[0]).all():
+        decimals = int(decimals[0])
+    values = np.array([float(text) for text in texts], dtype='float64')
+    return Column('float', values, sign=sign, width=width, decimals=decimals)
+
+
+def encode_strings(texts):
+    categories = sorted(set(texts))
+    if len(categories) <= CATEGORY_LIMIT and len(categories) <= len(texts) * CATEGORY_RATIO:
+        codes = {value: code for code, value in enumerate(categories)}
+        return Column('category', np.array([codes[text] for text in texts], dtype='uint8'), categories=categories)
+    return Column('text', np.array([text.encode('utf-8') for text in texts], dtype='S'))
+
+
+def encode_column(texts):
+    # texts 为原 CSV 中的字段，空字符串为缺失；编码后立即解码核对，不一致时整列按原文保存，保证无损
+    present = np.array([text != '' for text in texts], dtype=bool)
+    values = [text for text in texts if text]
+    wrapped = bool(values) and all(len(text) >= 2 and text[0] == '[' and text[-1] == ']' for text in values)
+    inner = [text[1:-1] for text in values] if wrapped else values
+    column = encode_numbers(inner) or encode_strings(inner)
+    column.present = None if present.all() else present
+    column.wrapped = wrapped
+    if column.decode() != texts:
+        column = encode_strings(values)
+        column.present = None if present.all() else present
+    return column
+
+
+class FileBlock:
+    # 一个 CSV 文件的观测：表头和按位置保存的各列，lengths 只在各行字段数不同时保存
+    __slots__ = ('filename', 'header', 'encoding', 'newline', 'lengths', 'columns')
+
+    def __init__(self, filename, header, encoding, newline, lengths, columns):
+        self.filename = filename
+        self.header = header
+        self.encoding = encoding
+        self.newline = newline
+        self.lengths = lengths
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @property
+    def file_id(self):
+        return os.path.splitext(self.filename)[0]
+
+    @property
+    def names(self):
+        return normalize_headers(self.header)
+
+    @property
+    def implicit_index(self):
+        # 与 read_rows 一致：第一行数据比表头多一列时，第一列是行号
+        first = int(self.lengths[0]) if self.lengths is not None else len(self.columns)
+        return len(self) > 0 and first == len(self.header) + 1
+
+    def nbytes(self):
+        size = sum(column.nbytes() for column in self.columns)
+        return size + (self.lengths.nbytes if self.lengths is not None else 0)
+
+    def raw_rows(self):
+        # 与原 CSV 文件中的数据行完全相同
+        columns = [column.decode() for column in self.columns]
+        rows = [list(fields) for fields in zip(*columns)]
+        if self.lengths is not None:
+            rows = [fields[:length] for fields, length in zip(rows, self.lengths.tolist())]
+        return rows
+
+    def labels(self):
+        if self.implicit_index:
+            return self.columns[0].decode()
+        return [str(i) for i in range(len(self))]
+
+    def rows(self):
+        # 与 read_rows 相同的 (行号, 字段列表)
+        if self.implicit_index:
+            return [(fields[0], fields[1:]) for fields in self.raw_rows()]
+        return [(str(i), fields) for i, fields in enumerate(self.raw_rows())]
+
+    def column(self, name):
+        # 按列名取出带类型的数组
+        offset = 1 if self.implicit_index else 0
+        return self.columns[self.names.index(name) + offset].array()
+
+    def named_columns(self):
+        offset = 1 if self.implicit_index else 0
+        return list(zip(self.names, self.columns[offset:]))
+
+    def write(self, file_path):
+        with atomic_open(file_path, encoding=self.encoding or 'utf-8') as file:
+            writer = csv.writer(file, lineterminator=self.newline)
+            writer.writerow(self.header)
+            writer.writerows(self.raw_rows())
+
+
+def read_block(file_path):
+    header, encoding = read_csv_header(file_path)
+    with open(file_path, mode='r', encoding=encoding, errors='ignore', newline='') as file:
+        # 保留原文件的换行符
+        newline = '\r\n' if file.readline().endswith('\r\n') else '\n'
+        file.seek(0)
+        reader = csv.reader(file)
+        next(reader, None)
+        rows = [fields for fields in reader if fields]
+    lengths = [len(fields) for fields in rows]
+    width = max(lengths, default=0)
+    padded = [fields + [''] * (width - len(fields)) for fields in rows]
+    columns = [encode_column(list(values)) for values in zip(*padded)]
+    return FileBlock(os.path.basename(file_path), header, encoding, newline,
+                     np.array(lengths, dtype='uint32') if len(set(lengths)) > 1 else None, columns)
+
+
+class ObservationStore:
+    # 所有文件的观测按文件分块保存，合并后的宽表只在需要时生成，缺失值不占空间
+    def __init__(self, blocks=()):
+        self.blocks = {}
+        for block in blocks:
+            self.add(block)
+
+    def add(self, block):
+        self.blocks[block.filename] = block
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks.values())
+
+    @classmethod
+    def from_folder(cls, folder_path, patterns=None, max_workers=None, executor_type='process'):
+        csv_files = match_files(sorted(f for f in os.listdir(folder_path) if f.endswith('.csv')), patterns)
+        file_paths = [os.path.join(folder_path, f) for f in csv_files]
+        with make_executor(executor_type, max_workers) as executor:
+            return cls(executor.map(read_block, file_paths, chunksize=8))
+
+    def nbytes(self):
+        return sum(block.nbytes() for block in self.blocks.values())
+
+    def schema(self):
+        # 与 merge_csv_files 相同的列顺序
+        schema = {}
+        for block in self.blocks.values():
+            for name in block.names:
+                schema.setdefault(name, len(schema))
+        schema.setdefault(ID_COLUMN, len(schema))
+        return list(schema)
+
+    def file_counts(self):
+        return Counter(name for block in self.blocks.values() for name in block.names)
+
+    def rare_columns(self, min_files=RARE_FILES):
+        return [name for name, count in self.file_counts().items() if count < min_files]
+
+    def frame(self, columns=None, min_files=RARE_FILES):
+        # 合并后的宽表，列为带类型的数组；默认只包含至少在 min_files 个文件中出现的列
+        rare = set(self.rare_columns(min_files))
+        columns = columns or [name for name in self.schema() if name != ID_COLUMN and name not in rare]
+        pieces = {name: [] for name in columns}
+        ids = []
+        for block in self.blocks.values():
+            named = dict(block.named_columns())
+            ids += [block.filename + '_' + label for label in block.labels()]
+            for name in columns:
+                pieces[name].append(named[name].array() if name in named else None)
+        result = {ID_COLUMN: pd.array(ids, dtype='string')}
+        for name, arrays in pieces.items():
+            result[name] = concat_arrays(arrays, [len(block) for block in self.blocks.values()])
+        return pd.DataFrame(result)
+
+    def side_table(self, min_files=RARE_FILES):
+        # 稀疏附表：少见列的每个非空值一行 (id, 列名, 值)
+        rare = set(self.rare_columns(min_files))
+        records = {ID_COLUMN: [], 'column': [], 'value': []}
+        for block in self.blocks.values():
+            labels = block.labels()
+            for name, column in block.named_columns():
+                if name not in rare:
+                    continue
+                for label, text in zip(labels, column.decode()):
+                    if text:
+                        records[ID_COLUMN].append(block.filename + '_' + label)
+                        records['column'].append(name)
+                        records['value'].append(text)
+        return pd.DataFrame(records)
+
+    def write_merged(self, output_file):
+        # 与 merge_csv_files 输出相同的宽表 CSV
+        schema = self.schema()
+        position = {name: i for i, name in enumerate(schema)}
+        template = [''] * len(schema)
+        with atomic_open(output_file) as output:
+            writer = csv.writer(output)
+            writer.writerow(schema)
+            for block in self.blocks.values():
+                targets = [position[name] for name in block.names]
+                prefix = block.filename + '_'
+                rows = []
+                for label, fields in block.rows():
+                    row = template.copy()
+                    for target, value in zip(targets, fields):
+                        row[target] = value
+                    row[position[ID_COLUMN]] = prefix + label
+                    rows.append(row)
+                writer.writerows(rows)
+
+    def write_folder(self, folder_path):
+        os.makedirs(folder_path, exist_ok=True)
+        for block in self.blocks.values():
+            block.write(os.path.join(folder_path, block.filename))
+
+
+def concat_arrays(arrays, lengths):
+    # 各文件的同名列拼接成一列；没有该列的文件为 NA，数字列保持数字类型
+    kinds = {type(array) for array in arrays if array is not None}
+    if kinds <= {pd.arrays.IntegerArray}:
+        values = np.concatenate([array.to_numpy('int64', na_value=0) if array is not None else np.zeros(n, 'int64')
+                                 for array, n in zip(arrays, lengths)])
+        mask = np.concatenate([array.isna() if array is not None else np.ones(n, bool)
+                               for array, n in zip(arrays, lengths)])
+        return pd.arrays.IntegerArray(values, mask)
+    if kinds <= {pd.arrays.IntegerArray, np.ndarray}:
+        return np.concatenate([np.asarray(array.to_numpy('float64', na_value=np.nan)) if isinstance(
+            array, pd.arrays.IntegerArray) else array if array is not None else np.full(n, np.nan)
+                               for array, n in zip(arrays, lengths)])
+    return pd.array(np.concatenate([np.asarray(array, dtype=object) if array is not None
+                                    else np.full(n, pd.NA, dtype=object) for array, n in zip(arrays, lengths)]),
+                    dtype='string')
+
+
+if __name__ == '__main__':
+    store = ObservationStore.from_folder('./Result/final')
+    print(f"{len(store.blocks)} 个文件，{len(store)} 行，占用 {store.nbytes() / 1e6:.1f} MB，"
+          f"少见的列 {len(store.rare_columns())} 个")
@@ -0,0 +1,204 @@
+import os
+import csv
+import numpy as np
+import pandas as pd
+from Sub.g_csv_merge import ID_COLUMN
+from Sub.j_csv_numeric import unwrap
+from Sub.k_time_scale import SECONDS_PER_DAY, TIME_COLUMNS, epoch_columns, first_available, load_time_scales
+from Sub.l_coord_frame import ARCSEC, COORD_COLUMNS, j2000_positions, to_vectors
+from Sub.m_csv_index import SATELLITE_COLUMNS, SECOND_SATELLITE_COLUMNS, WIDE_SATELLITE_RE, row_satellites
+from Sub.t_csv_writer import atomic_open
+
+# 同一卫星、观测时刻相差不超过 TIME_TOLERANCE 秒、位置相差不超过容差的观测视为重复
+TIME_TOLERANCE = 1.0
+POSITION_TOLERANCE = 0.5
+XY_TOLERANCE = 0.01
+# 按时间排序后每行最多向后比较的行数，只有大量观测的时刻完全相同（如只给出日期）时才会用到
+MAX_WINDOW = 10000
+OBSERVATORY_COLUMNS = ['n-obs']
+X_COLUMNS = ['x', 'X']
+Y_COLUMNS = ['y', 'Y']
+FLAG_COLUMNS = ['dup_group', 'dup_of']
+SOURCES_COLUMN = 'dup_sources'
+
+
+def observation_keys(merged_path, info_path, satellites_path=None):
+    # 每行一条：卫星、TT 儒略日、台站代码，以及 J2000 赤经赤纬的单位向量或 x/y 相对坐标
+    columns = set(TIME_COLUMNS + COORD_COLUMNS + SATELLITE_COLUMNS + SECOND_SATELLITE_COLUMNS
+                  + OBSERVATORY_COLUMNS + X_COLUMNS + Y_COLUMNS + [ID_COLUMN])
+    df = pd.read_csv(merged_path, dtype=str, keep_default_na=False,
+                     usecols=lambda column: column in columns or WIDE_SATELLITE_RE.match(column))
+    epochs = epoch_columns(df, load_time_scales(info_path))
+    positions = j2000_positions(df, info_path, epochs)
+    file_ids = positions['file']
+    vectors = to_vectors(positions['ra'], positions['dec'])
+
+    observatory = pd.Series('', index=df.index)
+    for column in OBSERVATORY_COLUMNS:
+        if column in df.columns:
+            codes = unwrap(df[column]).str.upper().str.lstrip('0').fillna('')
+            observatory = observatory.where(observatory != '', codes)
+
+    return pd.DataFrame({
+        ID_COLUMN: df[ID_COLUMN],
+        'file': file_ids,
+        'satellite': row_satellites(df, file_ids, satellites_path)[0].to_numpy(),
+        'jd': epochs['jd_tt'].fillna(epochs['jd']).to_numpy(),
+        'observatory': observatory.to_numpy(dtype=object),
+        'spherical': ~np.isnan(vectors).any(axis=1),
+        'vx': vectors[:, 0], 'vy': vectors[:, 1], 'vz': vectors[:, 2],
+        'x': first_available(df, X_COLUMNS).to_numpy(),
+        'y': first_available(df, Y_COLUMNS).to_numpy(),
+    })
+
+
+def exact_groups(keys, time_tolerance):
+    # 时间按容差取整、坐标按容差取整后求哈希，哈希相同的行为完全重复
+    rounded = pd.DataFrame({
+        'satellite': keys['satellite'],
+        'time': np.floor(keys['jd'] * SECONDS_PER_DAY / time_tolerance),
+        'observatory': keys['observatory'],
+        'spherical': keys['spherical'],
+    })
+    for column in ('vx', 'vy', 'vz', 'x', 'y'):
+        rounded[column] = keys[column].round(9 if column.startswith('v') else 4)
+    return pd.util.hash_pandas_object(rounded, index=False).to_numpy()
+
+
+def near_pairs(keys, time_tolerance, position_tolerance, xy_tolerance, max_window=MAX_WINDOW):
+    # 按 (坐标类型, 卫星, 时间) 排序后逐个滞后比较：滞后 k 时若没有一对仍在时间窗口内，更大的滞后也不会有
+    order = np.lexsort((keys['jd'].to_numpy(), keys['satellite'].to_numpy(), keys['spherical'].to_numpy()))
+    satellite = keys['satellite'].to_numpy()[order]
+    spherical = keys['spherical'].to_numpy()[order]
+    jd = keys['jd'].to_numpy()[order]
+    observatory = keys['observatory'].to_numpy(dtype=object)[order]
+    vectors = keys[['vx', 'vy', 'vz']].to_numpy()[order]
+    xy = keys[['x', 'y']].to_numpy()[order]
+    window = time_tolerance / SECONDS_PER_DAY
+    # 两个单位向量的弦长与角距在小角度下相等
+    chord = position_tolerance * ARCSEC
+
+    pairs = []
+    for lag in range(1, min(max_window, len(order)) + 1):
+        same = (satellite[lag:] == satellite[:-lag]) & (spherical[lag:] == spherical[:-lag]) \
+            & (jd[lag:] - jd[:-lag] <= window)
+        if not same.any():
+            break
+        close = np.where(spherical[lag:],
+                         np.linalg.norm(vectors[lag:] - vectors[:-lag], axis=1) <= chord,
+                         (np.abs(xy[lag:] - xy[:-lag]) <= xy_tolerance).all(axis=1))
+        # 台站代码只在两行都有时比较
+        left, right = observatory[:-lag], observatory[lag:]
+        compatible = (left == '') | (right == '') | (left == right)
+        matched = np.flatnonzero(same & close & compatible)
+        pairs.append(np.column_stack((order[matched], order[matched + lag])))
+    else:
+        if len(order) > max_window:
+            print(f"时间相同的观测超过 {max_window} 行，只比较了前 {max_window} 行")
+    return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype='int64')
+
+
+def find_groups(count, pairs):
+    # 并查集：返回每行所在组的最小行号
+    parent = np.arange(count)
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs.tolist():
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([root(i) for i in range(count)])
+
+
+def find_duplicates(keys, time_tolerance=TIME_TOLERANCE, position_tolerance=POSITION_TOLERANCE,
+                    xy_tolerance=XY_TOLERANCE):
+    # 返回每条重复观测一行：id、组号、代表行的 id、重复类型和组内的文件
+    valid = keys['satellite'].notna() & keys['jd'].notna() & (keys['spherical'] | keys[['x', 'y']].notna().all(axis=1))
+    candidates = keys[valid].reset_index()
+    hashes = exact_groups(candidates, time_tolerance)
+
+    # 哈希相同的行直接相连，再加上时间窗口内位置相近的行
+    first = pd.Series(np.arange(len(candidates))).groupby(hashes).transform('min').to_numpy()
+    exact = np.flatnonzero(first != np.arange(len(candidates)))
+    pairs = np.concatenate((np.column_stack((first[exact], exact)),
+                            near_pairs(candidates, time_tolerance, position_tolerance, xy_tolerance)))
+    groups = find_groups(len(candidates), pairs)
+
+    grouped = pd.DataFrame({'row': candidates['index'], ID_COLUMN: candidates[ID_COLUMN], 'file': candidates['file'],
+                            'group': groups, 'hash': hashes})
+    grouped = grouped[grouped.groupby('group')['row'].transform('size') > 1]
+    by_group = grouped.groupby('group')
+    representative = grouped['group'].map(grouped.groupby('group')[ID_COLUMN].first())
+    return pd.DataFrame({
+        'row': grouped['row'],
+        ID_COLUMN: grouped[ID_COLUMN],
+        'group': grouped['row'].groupby(grouped['group']).transform('min'),
+        'representative': representative,
+        'kind': np.where(by_group['hash'].transform('nunique') == 1, 'exact', 'near'),
+        'files': grouped['group'].map(by_group['file'].agg(lambda files: ';'.join(dict.fromkeys(files)))),
+    }).sort_values('row').reset_index(drop=True)
+
+
+def file_overlaps(duplicates):
+    # 两个文件共有的观测组数，用于找出重复收录的数据集
+    pairs = {}
+    for files in duplicates.drop_duplicates('group')['files']:
+        files = files.split(';')
+        for i, a in enumerate(files):
+            for b in files[i + 1:]:
+                pairs[(a, b)] = pairs.get((a, b), 0) + 1
+    overlaps = pd.DataFrame([(a, b, count) for (a, b), count in pairs.items()],
+                            columns=['file_a', 'file_b', 'observations'])
+    return overlaps.sort_values('observations', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def write_deduplicated(merged_path, output_path, duplicates, mode='flag'):
+    # flag：每行加上组号和代表行；collapse：每组只保留代表行，并在最后一列记下组内所有行的 id
+    rows = duplicates.set_index('row')
+    sources = duplicates.groupby('group')[ID_COLUMN].agg(';'.join)
+    with open(merged_path, 'r', encoding='utf-8', newline='') as source, atomic_open(output_path) as output:
+        reader = csv.reader(source)
+        writer = csv.writer(output)
+        header = next(reader)
+        writer.writerow(header + (FLAG_COLUMNS if mode == 'flag' else [SOURCES_COLUMN]))
+        for i, fields in enumerate(reader):
+            if i not in rows.index:
+                writer.writerow(fields + (['', ''] if mode == 'flag' else ['']))
+                continue
+            record = rows.loc[i]
+            if mode == 'flag':
+                duplicate_of = record['representative'] if record['representative'] != record[ID_COLUMN] else ''
+                writer.writerow(fields + [record['group'], duplicate_of])
+            elif record['representative'] == record[ID_COLUMN]:
+                writer.writerow(fields + [sources[record['group']]])
+
+
+def w_csv_dedup(merged_path, info_path, satellites_path=None, output_path=None, mode='flag',
+                time_tolerance=TIME_TOLERANCE, position_tolerance=POSITION_TOLERANCE, xy_tolerance=XY_TOLERANCE):
+    if mode not in ('flag', 'collapse'):
+        raise ValueError(f"未知的去重方式 {mode}，可选 flag、collapse")
+    result_path = os.path.dirname(merged_path)
+    output_path = output_path or os.path.join(result_path, 'merged_dedup.csv')
+    keys = observation_keys(merged_path, info_path, satellites_path)
+    duplicates = find_duplicates(keys, time_tolerance, position_tolerance, xy_tolerance)
+    overlaps = file_overlaps(duplicates)
+
+    duplicates.drop(columns='row').to_csv(os.path.join(result_path, 'duplicates.csv'), index=False)
+    overlaps.to_csv(os.path.join(result_path, 'overlaps.csv'), index=False)
+    write_deduplicated(merged_path, output_path, duplicates, mode)
+
+    removed = (duplicates['representative'] != duplicates[ID_COLUMN]).sum()
+    print(f"去重完成：{duplicates['group'].nunique()} 组重复观测，涉及 {len(duplicates)} 行，可去掉 {removed} 行"
+          f"（完全相同 {(duplicates['kind'] == 'exact').sum()} 行），输出到 {output_path}")
+    for _, overlap in overlaps.head(10).iterrows():
+        print(f"  {overlap['file_a']} 与 {overlap['file_b']} 共有 {overlap['observations']} 条观测")
+    return duplicates
+
+
+if __name__ == '__main__':
+    w_csv_dedup('./Result/merged.csv', './Result/informations.csv', './Result/satellites.csv')
@@ -0,0 +1,258 @@
+import io
+import os
+import json
+import socket
+import argparse
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+import pandas as pd
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from Sub.k_time_scale import calendar_to_jd
+from Sub.m_csv_index import INDEX_NAME, ObservationIndex, build_index
+
+HOST = '127.0.0.1'
+PORT = 8765
+# 结果缓存按条数和总字节数限制，超出时淘汰最久未使用的结果
+CACHE_ITEMS = 128
+CACHE_BYTES = 256 * 1024 * 1024
+QUERY_KEYS = ('satellite', 'file', 'observatory', 'start', 'end', 'years', 'columns', 'format')
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'json': 'application/json; charset=utf-8'}
+
+
+def parse_time(text):
+    # 儒略日或 YYYY-MM-DD 形式的日期
+    try:
+        return float(text)
+    except ValueError:
+        year, month, day = (int(part) for part in text.split('-'))
+        return float(calendar_to_jd(year, month, day))
+
+
+def parse_query(params):
+    # 查询参数转为 ObservationIndex.read 的参数，同时返回规范化后用作缓存键的元组
+    unknown = set(params) - set(QUERY_KEYS)
+    if unknown:
+        raise ValueError(f"未知的查询参数 {', '.join(sorted(unknown))}，可选 {', '.join(QUERY_KEYS)}")
+    query = {}
+    for key in ('satellite', 'file', 'observatory'):
+        if params.get(key):
+            query[key] = params[key]
+    for key in ('start', 'end'):
+        if params.get(key):
+            query[key] = parse_time(params[key])
+    if params.get('years'):
+        start, _, end = params['years'].partition('-')
+        query['years'] = (int(start), int(end or start))
+    if params.get('columns'):
+        query['columns'] = [column for column in params['columns'].split(',') if column]
+    output = params.get('format') or 'csv'
+    if output not in FORMATS:
+        raise ValueError(f"未知的输出格式 {output}，可选 {', '.join(FORMATS)}")
+    key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in query.items()))
+    return query, output, key + (('format', output),)
+
+
+class Catalogue:
+    # 合并表只映射一次，所有请求线程共用；merged.csv 更新后重新建立索引并清空缓存
+    def __init__(self, merged_path, info_path, satellites_path=None, index_path=None,
+                 cache_items=CACHE_ITEMS, cache_bytes=CACHE_BYTES):
+        self.merged_path = merged_path
+        self.info_path = info_path
+        self.satellites_path = satellites_path
+        self.index_path = index_path or os.path.join(os.path.dirname(merged_path), INDEX_NAME)
+        self.cache_items = cache_items
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.index = None
+        self.signature = None
+        self.open()
+
+    def open(self):
+        stat = os.stat(self.merged_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if not self.index_matches(signature):
+            build_index(self.merged_path, self.info_path, self.satellites_path, self.index_path)
+        # 旧的映射可能仍在其他线程中使用，不主动关闭，由垃圾回收释放
+        self.index = ObservationIndex(self.merged_path, self.index_path)
+        self.signature = signature
+        self.cache.clear()
+        self.cached_bytes = 0
+
+    def index_matches(self, signature):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with ObservationIndex.meta(self.index_path) as meta:
+                return (int(meta['size']), int(meta['mtime'])) == signature
+        except Exception:
+            return False
+
+    def refresh(self):
+        stat = os.stat(self.merged_path)
+        if (stat.st_size, stat.st_mtime_ns) != self.signature:
+            print(f"{self.merged_path} 已更新，重新加载")
+            self.open()
+
+    def query(self, params):
+        # 返回 (内容类型, 结果字节)；命中缓存时不再读取合并表
+        query, output, key = parse_query(params)
+        with self.lock:
+            self.refresh()
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return FORMATS[output], self.cache[key]
+            self.misses += 1
+            index = self.index
+            # 索引查询在锁内执行，SQLite 连接不在线程间并发使用
+            ranges = index.ranges(**{name: value for name, value in query.items() if name != 'columns'})
+        df = index.parse(ranges, query.get('columns'))
+        body = (df.to_csv(index=False) if output == 'csv' else df.to_json(orient='records', force_ascii=False))
+        body = body.encode('utf-8')
+        with self.lock:
+            if index is self.index:
+                self.remember(key, body)
+        return FORMATS[output], body
+
+    def remember(self, key, body):
+        if len(body) > self.cache_bytes:
+            return
+        self.cache[key] = body
+        self.cached_bytes += len(body)
+        while len(self.cache) > self.cache_items or self.cached_bytes > self.cache_bytes:
+            _, old = self.cache.popitem(last=False)
+            self.cached_bytes -= len(old)
+
+    def stats(self):
+        with self.lock:
+            return {'merged_path': os.path.abspath(self.merged_path), 'rows': self.index.rows(),
+                    'cached': len(self.cache), 'cached_bytes': self.cached_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def columns(self):
+        return pd.read_csv(io.BytesIO(self.index.header), nrows=0).columns.tolist()
+
+    def close(self):
+        self.index.close()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # GET /observations?satellite=Io&years=1990-2000&columns=jd,x,y&format=json
+    # GET /columns 列出合并表的列名，GET /stats 返回缓存命中情况
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        catalogue = self.server.catalogue
+        try:
+            if url.path == '/observations':
+                content_type, body = catalogue.query(params)
+            elif url.path == '/columns':
+                content_type, body = FORMATS['json'], json.dumps(catalogue.columns(), ensure_ascii=False).encode('utf-8')
+            elif url.path == '/stats':
+                content_type, body = FORMATS['json'], json.dumps(catalogue.stats(), ensure_ascii=False).encode('utf-8')
+            else:
+                return self.reply(404, FORMATS['json'], json.dumps({'error': f'没有 {url.path}'}, ensure_ascii=False))
+        except ValueError as e:
+            return self.reply(400, FORMATS['json'], json.dumps({'error': str(e)}, ensure_ascii=False))
+        except Exception as e:
+            return self.reply(500, FORMATS['json'], json.dumps({'error': str(e)}, ensure_ascii=False))
+        self.reply(200, content_type, body)
+
+    def reply(self, status, content_type, body):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix 套接字没有客户端地址
+        return self.client_address[0] if self.client_address else 'unix'
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def make_server(catalogue, host=HOST, port=PORT, unix_socket=None):
+    server = UnixHTTPServer(unix_socket, QueryHandler) if unix_socket else ThreadingHTTPServer((host, port), QueryHandler)
+    server.catalogue = catalogue
+    return server
+
+
+def serve(merged_path, info_path, satellites_path=None, host=HOST, port=PORT, unix_socket=None):
+    catalogue = Catalogue(merged_path, info_path, satellites_path)
+    server = make_server(catalogue, host, port, unix_socket)
+    print(f"查询服务已启动：{unix_socket or f'http://{host}:{port}'}，共 {catalogue.index.rows()} 行")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        catalogue.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def fetch(address, **query):
+    # 客户端：address 为 http://host:port 或 Unix 套接字的路径，返回与 query_observations 相同的 DataFrame
+    if 'columns' in query and not isinstance(query['columns'], str):
+        query['columns'] = ','.join(query['columns'])
+    if 'years' in query and not isinstance(query['years'], str):
+        query['years'] = '-'.join(str(year) for year in query['years'])
+    query['format'] = 'csv'
+    path = '/observations?' + urllib.parse.urlencode({key: value for key, value in query.items() if value is not None})
+    if address.startswith('http'):
+        with urllib.request.urlopen(address.rstrip('/') + path) as response:
+            body = response.read()
+    else:
+        connection = UnixConnection(address)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise RuntimeError(json.loads(body)['error'])
+        finally:
+            connection.close()
+    return pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--result', default='./Result', help='merged.csv、informations.csv 所在的文件夹')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--socket', help='改为监听 Unix 套接字')
+    args = parser.parse_args()
+    serve(os.path.join(args.result, 'merged.csv'), os.path.join(args.result, 'informations.csv'),
+          os.path.join(args.result, 'satellites.csv'), args.host, args.port, args.socket)
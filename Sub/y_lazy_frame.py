@@ -0,0 +1,241 @@
+import os
+import csv
+import operator
+import numpy as np
+import pandas as pd
+from Sub.d_csv_utils import read_csv_header
+from Sub.g_csv_merge import ID_COLUMN, normalize_headers, read_rows
+from Sub.j_csv_numeric import to_numbers, unwrap
+from Sub.u_batch import make_executor, match_files
+
+CHUNK_SIZE = 10000
+COMPARISONS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+               '>': operator.gt, '>=': operator.ge}
+OPERATORS = list(COMPARISONS) + ['in', 'contains', 'notna', 'isna']
+
+
+class Filter:
+    # 行过滤条件：数字比较按 j_csv_numeric 解析（去掉方括号、D 指数），文字比较用去掉方括号后的文本
+    def __init__(self, column, op='notna', value=None):
+        if op not in OPERATORS:
+            raise ValueError(f"未知的过滤条件 {op}，可选 {', '.join(OPERATORS)}")
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def __repr__(self):
+        return f'{self.column} {self.op}' + ('' if self.op in ('notna', 'isna') else f' {self.value!r}')
+
+    def requires_column(self):
+        # 除 isna 外，文件中没有该列时不可能有满足条件的行，整个文件可以跳过
+        return self.op != 'isna'
+
+    def mask(self, df):
+        if self.column not in df.columns:
+            return pd.Series(self.op == 'isna', index=df.index)
+        text = unwrap(df[self.column])
+        if self.op == 'notna':
+            return text.notna()
+        if self.op == 'isna':
+            return text.isna()
+        if self.op == 'contains':
+            return text.str.contains(str(self.value), regex=False).fillna(False).astype(bool)
+        if self.op == 'in':
+            values = list(self.value)
+            if all(isinstance(value, (int, float)) for value in values):
+                return to_numbers(text).isin(values)
+            return text.isin([str(value) for value in values]).fillna(False).astype(bool)
+        compare = COMPARISONS[self.op]
+        if isinstance(self.value, (int, float)):
+            numbers = to_numbers(text)
+            return compare(numbers, self.value).fillna(False).astype(bool) & numbers.notna()
+        return compare(text, str(self.value)).fillna(False).astype(bool)
+
+
+class FilePlan:
+    # 一个文件要读取的列（按位置）和它们的列名；skip 不为空时说明跳过的原因
+    def __init__(self, file_path, names=None, encoding=None, implicit=False, positions=(), skip=None):
+        self.file_path = file_path
+        self.names = names
+        self.encoding = encoding
+        self.implicit = implicit
+        self.positions = list(positions)
+        self.skip = skip
+
+    @property
+    def filename(self):
+        return os.path.basename(self.file_path)
+
+    @property
+    def columns(self):
+        return [self.names[position] for position in self.positions]
+
+
+def first_data_row(file_path, encoding):
+    with open(file_path, mode='r', encoding=encoding, errors='ignore', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        return next((fields for fields in reader if fields), [])
+
+
+def read_plan(plan, filters=(), numeric=(), limit=None, chunk_size=CHUNK_SIZE):
+    # 只读取计划中的列，逐块过滤；行号与 merge_csv_files 的 id 一致
+    columns = plan.columns
+    offset = 1 if plan.implicit else 0
+    frames = []
+    rows = 0
+    try:
+        # 按表头给出列数，字段较少的行补为空值
+        reader = pd.read_csv(plan.file_path, header=None, skiprows=1, names=range(len(plan.names) + offset),
+                             usecols=[p + offset for p in plan.positions] + ([0] if plan.implicit else []),
+                             dtype=str, keep_default_na=False,
+                             encoding=plan.encoding, encoding_errors='ignore', chunksize=chunk_size)
+        renames = {p + offset: name for p, name in zip(plan.positions, columns)}
+        for chunk in reader:
+            chunk = chunk.rename(columns=renames)
+            labels = chunk.pop(0) if plan.implicit else pd.Series(np.arange(rows, rows + len(chunk)).astype(str),
+                                                                   index=chunk.index)
+            rows += len(chunk)
+            frames.append(filter_chunk(plan, chunk[columns], labels, filters))
+            if limit is not None and sum(map(len, frames)) >= limit:
+                break
+    except pd.errors.ParserError:
+        # 有字段数超出表头的行，退回逐行读取
+        frames = []
+        records = list(read_rows(plan.file_path, plan.names, plan.encoding))
+        chunk = pd.DataFrame([[fields[p] if p < len(fields) else '' for p in plan.positions] for _, fields in records],
+                             columns=columns, dtype=object)
+        frames.append(filter_chunk(plan, chunk, pd.Series([label for label, _ in records], dtype=object), filters))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns + [ID_COLUMN])
+    for column in numeric:
+        if column in df.columns:
+            df[column] = to_numbers(df[column]).to_numpy()
+    return df.head(limit) if limit is not None else df
+
+
+def filter_chunk(plan, chunk, labels, filters):
+    chunk = chunk.reset_index(drop=True)
+    labels = labels.reset_index(drop=True)
+    keep = pd.Series(True, index=chunk.index)
+    for condition in filters:
+        keep &= condition.mask(chunk).to_numpy()
+    chunk = chunk[keep.to_numpy()].copy()
+    chunk[ID_COLUMN] = (plan.filename + '_' + labels[keep.to_numpy()].astype(str)).to_numpy()
+    return chunk
+
+
+class LazyFrame:
+    # 在 Result/final 上构建查询计划，collect 时才按计划只读取需要的文件和列：
+    # scan_final().where_info('Time Scale', 'UTC').select('jd', 'x', 'y').filter('x', '>', 0).collect()
+    def __init__(self, folder_path, info_path=None, plan=None):
+        self.folder_path = folder_path
+        self.info_path = info_path or os.path.join(os.path.dirname(os.path.abspath(folder_path)), 'informations.csv')
+        self.plan = plan or {'columns': None, 'patterns': None, 'info': [], 'filters': [], 'numeric': [],
+                             'limit': None}
+
+    def replace(self, **changes):
+        return LazyFrame(self.folder_path, self.info_path, {**self.plan, **changes})
+
+    def select(self, *columns):
+        return self.replace(columns=list(columns))
+
+    def files(self, *patterns):
+        # 按文件 id 的通配符选择文件，例如 jo00*
+        return self.replace(patterns=(self.plan['patterns'] or []) + list(patterns))
+
+    def where_info(self, column, value):
+        # 按 informations.csv 中的信息选择文件；value 为字符串（忽略大小写）、列表或对整列求值的函数
+        return self.replace(info=self.plan['info'] + [(column, value)])
+
+    def filter(self, column, op='notna', value=None):
+        return self.replace(filters=self.plan['filters'] + [Filter(column, op, value)])
+
+    def numeric(self, *columns):
+        # 这些列在结果中转换为 float64
+        return self.replace(numeric=self.plan['numeric'] + list(columns))
+
+    def head(self, count):
+        return self.replace(limit=count)
+
+    def info_files(self):
+        if not self.plan['info']:
+            return None
+        info = pd.read_csv(self.info_path, dtype=str)
+        keep = pd.Series(True, index=info.index)
+        for column, value in self.plan['info']:
+            if column not in info.columns:
+                raise ValueError(f"{self.info_path} 中没有 '{column}' 列")
+            values = info[column]
+            if callable(value):
+                keep &= value(values).fillna(False).astype(bool)
+            elif isinstance(value, (list, tuple, set)):
+                keep &= values.str.strip().str.lower().isin([str(item).lower() for item in value])
+            else:
+                keep &= values.str.strip().str.lower() == str(value).lower()
+        return set(info.loc[keep, 'id'])
+
+    def file_plans(self):
+        # 只读取表头决定每个文件读哪些列；缺少过滤所需的列或所选的列时整个文件跳过
+        csv_files = match_files(sorted(f for f in os.listdir(self.folder_path) if f.endswith('.csv')),
+                                self.plan['patterns'])
+        selected = self.info_files()
+        plans = []
+        for filename in csv_files:
+            file_path = os.path.join(self.folder_path, filename)
+            if selected is not None and os.path.splitext(filename)[0] not in selected:
+                plans.append(FilePlan(file_path, skip='informations 不符合'))
+                continue
+            header, encoding = read_csv_header(file_path)
+            names = normalize_headers(header)
+            missing = [f.column for f in self.plan['filters'] if f.requires_column() and f.column not in names]
+            if missing:
+                plans.append(FilePlan(file_path, names, encoding, skip=f"没有列 {', '.join(missing)}"))
+                continue
+            wanted = self.plan['columns'] if self.plan['columns'] is not None else names
+            needed = list(dict.fromkeys(list(wanted) + [f.column for f in self.plan['filters']]))
+            positions = [names.index(name) for name in needed if name in names]
+            if self.plan['columns'] is not None and not any(name in names for name in self.plan['columns']):
+                plans.append(FilePlan(file_path, names, encoding, skip='没有所选的列'))
+                continue
+            first = first_data_row(file_path, encoding)
+            plans.append(FilePlan(file_path, names, encoding, len(first) == len(names) + 1, positions))
+        return plans
+
+    def explain(self):
+        plans = self.file_plans()
+        lines = [f"计划：列 {self.plan['columns'] or '全部'}，过滤 {self.plan['filters'] or '无'}，"
+                 f"读取 {sum(plan.skip is None for plan in plans)}/{len(plans)} 个文件"]
+        for plan in plans:
+            lines.append(f"  {plan.filename}: " + (f"跳过（{plan.skip}）" if plan.skip else ', '.join(plan.columns)))
+        return '\n'.join(lines)
+
+    def collect(self, max_workers=None, executor_type='thread', chunk_size=CHUNK_SIZE):
+        # 各文件并行读取，按文件顺序拼接；没有选择列时结果的列为各文件列名的并集
+        plans = [plan for plan in self.file_plans() if plan.skip is None]
+        filters, numeric, limit = self.plan['filters'], self.plan['numeric'], self.plan['limit']
+        with make_executor(executor_type, max_workers) as executor:
+            frames = list(executor.map(read_plan, plans, [filters] * len(plans), [numeric] * len(plans),
+                                       [limit] * len(plans), [chunk_size] * len(plans)))
+        if self.plan['columns'] is not None:
+            columns = list(self.plan['columns'])
+        else:
+            columns = list(dict.fromkeys(name for plan in plans for name in plan.columns))
+        df = stack_frames([frame for frame in frames if len(frame)], columns + [ID_COLUMN], numeric)
+        return df.head(limit) if limit is not None else df
+
+
+def stack_frames(frames, columns, numeric=()):
+    # 各文件的列不同，逐列拼接 numpy 数组，文件中没有的列补空字符串（数字列补 NaN）；
+    # 比 pd.concat 按列并集对齐快得多
+    data = {}
+    for column in columns:
+        dtype = 'float64' if column in numeric else object
+        fill = np.nan if column in numeric else ''
+        parts = [frame[column].to_numpy(dtype=dtype, na_value=fill) if column in frame.columns
+                 else np.full(len(frame), fill, dtype=dtype) for frame in frames]
+        data[column] = np.concatenate(parts) if parts else np.array([], dtype=dtype)
+    return pd.DataFrame(data, columns=columns)
+
+
+def scan_final(folder_path='./Result/final', info_path=None):
+    return LazyFrame(folder_path, info_path)
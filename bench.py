@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import queue as queues
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import traceback
+import subprocess
+import multiprocessing
+import numpy as np
+from Sub.p_bench_corpus import generate_corpus
+
+STAGES = ['a', 'b', 'd', 'e', 'g']
+STAGE_NAMES = {'a': 'a_html_info', 'b': 'b_convert_csv', 'd': 'd_csv_utils', 'e': 'e_errror_info',
+               'g': 'merge_csv_files'}
+LATENCY_SAMPLES = 50
+# 单个阶段的最长运行时间（秒），超时的阶段记为失败
+STAGE_TIMEOUT = 3600
+
+
+def fresh_cache(cache_dir):
+    # 每个阶段都从空的共享缓存开始，测得的是冷启动的时间
+    from Sub.o_file_cache import shared_cache
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    shared_cache.cache_dir = cache_dir
+    shared_cache.connection = None
+    shared_cache.memory.clear()
+
+
+def list_files(folder, suffix):
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(suffix))
+
+
+def stage_job(stage, corpus_dir, work_dir):
+    # 返回 (整批运行的函数, 逐个文件计时的函数, 输入文件)
+    csv_dir = os.path.join(work_dir, 'csv')
+    if stage == 'a':
+        from Sub.a_html_info import a_html_info, parse_file
+        return (lambda: a_html_info(corpus_dir, os.path.join(work_dir, 'informations.csv')),
+                parse_file, list_files(corpus_dir, '.html'))
+    if stage == 'b':
+        from Sub.b_csv_convert import b_convert_csv, convert_file
+        latency_path = os.path.join(work_dir, 'latency.csv')
+        return (lambda: b_convert_csv(corpus_dir, csv_dir, use_cache=False),
+                lambda path: convert_file(path, latency_path), list_files(corpus_dir, '.txt'))
+    if stage == 'd':
+        from Sub.d_csv_utils import d_csv_utils, file_census
+        return (lambda: d_csv_utils(csv_dir, output_path=os.path.join(work_dir, 'column_info.csv')),
+                file_census, list_files(csv_dir, '.csv'))
+    if stage == 'e':
+        from Sub.e_csv_errror import e_errror_info, validate_file
+        return (lambda: e_errror_info(csv_dir, os.path.join(work_dir, 'error_info.csv')),
+                validate_file, list_files(csv_dir, '.csv'))
+    from Sub.g_csv_merge import merge_csv_files, collect_schema, merge_part
+    file_paths = list_files(csv_dir, '.csv')
+
+    def merge_one(path):
+        schema, headers = collect_schema([path])
+        merge_part(path, *headers[path], schema, os.devnull)
+    return (lambda: merge_csv_files(csv_dir, os.path.join(work_dir, 'merged.csv')),
+            merge_one, file_paths)
+
+
+def run_stage(stage, corpus_dir, work_dir, queue):
+    # 在子进程中运行，峰值内存包括进程池中的工作进程；出错时把错误信息放入队列，父进程不会一直等待
+    try:
+        queue.put(measure_stage(stage, corpus_dir, work_dir))
+    except Exception:
+        queue.put({'error': traceback.format_exc()})
+
+
+def measure_stage(stage, corpus_dir, work_dir):
+    cache_dir = os.path.join(work_dir, 'cache-' + stage)
+    fresh_cache(cache_dir)
+    batch, per_file, file_paths = stage_job(stage, corpus_dir, work_dir)
+    with open(os.devnull, 'w') as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            start = time.perf_counter()
+            batch()
+            seconds = time.perf_counter() - start
+            fresh_cache(cache_dir)
+            step = max(1, len(file_paths) // LATENCY_SAMPLES)
+            latencies = []
+            for path in file_paths[::step]:
+                start = time.perf_counter()
+                per_file(path)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            sys.stdout = stdout
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {
+        'seconds': seconds,
+        'input_bytes': sum(os.path.getsize(path) for path in file_paths),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3) if latencies else None,
+        'latency_p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 3) if latencies else None,
+    }
+
+
+def wait_result(process, queue, timeout=STAGE_TIMEOUT):
+    # 子进程异常退出（例如被系统杀掉）时不会放入结果，按退出码判断，不无限等待
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except queues.Empty:
+            if process.exitcode is not None:
+                # 进程已退出，结果可能刚好在退出前放入
+                try:
+                    return queue.get(timeout=1)
+                except queues.Empty:
+                    return {'error': f'进程异常退出，退出码 {process.exitcode}'}
+            if time.monotonic() > deadline:
+                process.terminate()
+                return {'error': f'超过 {timeout} 秒未完成'}
+
+
+def bench_scale(file_scale, row_scale, stages, root, timeout=STAGE_TIMEOUT):
+    corpus_dir = os.path.join(root, f'corpus-{file_scale}x{row_scale}')
+    work_dir = os.path.join(root, f'work-{file_scale}x{row_scale}')
+    os.makedirs(work_dir, exist_ok=True)
+    corpus = generate_corpus(corpus_dir, file_scale, row_scale)
+    # d/e/g 读取 b 的输出
+    if any(stage in stages for stage in 'deg') and 'b' not in stages:
+        stages = ['b'] + list(stages)
+
+    results = []
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_stage, args=(stage, corpus_dir, work_dir, queue))
+        process.start()
+        result = wait_result(process, queue, timeout)
+        process.join()
+        if 'error' in result:
+            results.append({'stage': STAGE_NAMES[stage], 'file_scale': file_scale, 'row_scale': row_scale,
+                            'files': corpus['files'], 'rows': corpus['rows'], 'error': result['error']})
+            print(f"{file_scale:>4}x{row_scale:<4} {STAGE_NAMES[stage]:<16} 失败：{result['error'].strip().splitlines()[-1]}",
+                  flush=True)
+            continue
+        result.update({
+            'stage': STAGE_NAMES[stage], 'file_scale': file_scale, 'row_scale': row_scale,
+            'files': corpus['files'], 'rows': corpus['rows'],
+            'files_per_s': round(corpus['files'] / result['seconds'], 1),
+            'rows_per_s': round(corpus['rows'] / result['seconds'], 1),
+            'mb_per_s': round(result['input_bytes'] / 1e6 / result['seconds'], 2),
+            'seconds': round(result['seconds'], 3),
+        })
+        results.append(result)
+        print(f"{file_scale:>4}x{row_scale:<4} {STAGE_NAMES[stage]:<16} {result['seconds']:>9.3f}s "
+              f"{result['files_per_s']:>9.1f} files/s {result['mb_per_s']:>8.2f} MB/s "
+              f"{result['peak_rss_mb']:>8.1f} MB  p50 {result['latency_p50_ms']} ms  p95 {result['latency_p95_ms']} ms",
+              flush=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, previous_path):
+    # 与之前的结果比较，显示耗时之比（大于 1 表示变慢）
+    with open(previous_path, 'r', encoding='utf-8') as file:
+        previous = json.load(file)
+    before = {(r['file_scale'], r['row_scale'], r['stage']): r for r in previous['runs']}
+    print(f"\n与 {previous_path} ({previous['meta'].get('commit')}) 比较：")
+    for result in results:
+        old = before.get((result['file_scale'], result['row_scale'], result['stage']))
+        if old and 'error' not in old and 'error' not in result:
+            print(f"{result['file_scale']:>4}x{result['row_scale']:<4} {result['stage']:<16} "
+                  f"耗时 {result['seconds'] / old['seconds']:.2f}x  内存 {result['peak_rss_mb'] / old['peak_rss_mb']:.2f}x")
+
+
+def parse_scales(text):
+    return [int(value) if float(value).is_integer() else float(value) for value in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用合成的 NSDC 数据测试各阶段的性能')
+    parser.add_argument('--file-scales', default='1', help='文件数倍数，逗号分隔，例如 1,10,100')
+    parser.add_argument('--row-scales', default='1', help='每个文件行数的倍数，逗号分隔')
+    parser.add_argument('--stages', default=''.join(STAGES), help='要测试的阶段，例如 abdeg')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='之前的结果文件')
+    parser.add_argument('--keep', help='保留生成的数据和输出的目录')
+    parser.add_argument('--timeout', type=float, default=STAGE_TIMEOUT, help='单个阶段的最长运行时间（秒）')
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix='ancoj-bench-')
+    results = []
+    try:
+        for file_scale in parse_scales(args.file_scales):
+            for row_scale in parse_scales(args.row_scales):
+                results += bench_scale(file_scale, row_scale, list(args.stages), root, args.timeout)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    meta = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({'meta': meta, 'runs': results}, file, ensure_ascii=False, indent=1)
+    print(f"结果保存到 {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
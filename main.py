@@ -1,32 +1,166 @@
 from Sub.a_html_info import a_html_info
-from Sub.b_csv_convert import b_convert_csv
-from Sub.c_html_value import c_info_value
-from Sub.d_csv_utils import d_csv_utils
+from Sub.b_csv_convert import b_convert_csv, find_jobs
+from Sub.c_html_value import c_value_profile
+from Sub.d_csv_utils import d_csv_utils, find_jobs as find_census_jobs
 from Sub.e_csv_errror import e_errror_info
+from Sub.g_csv_merge import merge_csv_files
+from Sub.h_pipeline import run_pipeline
+from Sub.k_time_scale import normalize_times
+from Sub.l_coord_frame import convert_frames
+from Sub.m_csv_index import build_index
+from Sub.q_profile import Profiler
+from Sub.u_batch import EXECUTOR_TYPES, STAGES, match_files, option, stage_options
+from Sub.w_csv_dedup import w_csv_dedup
+from contextlib import nullcontext
+import os
+import argparse
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main(a, b, c, d, e):
-    if a:
+def listed(folder_path, suffix, patterns):
+    if not os.path.exists(folder_path):
+        return []
+    return match_files(sorted(f for f in os.listdir(folder_path) if f.endswith(suffix)), patterns)
+
+
+def show_plan(stages, folder_path, result_path, patterns=None):
+    # 试运行：列出各阶段将要处理的文件，b 和 d 只列出缓存中没有结果的文件
+    csv_path = os.path.join(result_path, 'csv')
+    plan = {}
+    if 'a' in stages:
+        plan['a'] = listed(folder_path, '.html', patterns)
+    if 'b' in stages:
+        jobs, skipped = find_jobs(folder_path, csv_path, patterns)
+        plan['b'] = list(jobs)
+        logging.info(f'b: {skipped} 个文件未变化，将跳过')
+    if 'c' in stages:
+        plan['c'] = [os.path.join(result_path, 'informations.csv')]
+    if 'd' in stages:
+        final_path = os.path.join(result_path, 'final')
+        plan['d'] = list(find_census_jobs(final_path, patterns)[1]) if os.path.exists(final_path) else []
+    if 'e' in stages:
+        plan['e'] = listed(csv_path, '.csv', patterns) if 'b' not in stages else sorted(
+            set(listed(csv_path, '.csv', patterns)) | {f.replace('.txt', '.csv') for f in plan['b']})
+    if 'g' in stages:
+        plan['g'] = listed(os.path.join(result_path, 'final'), '.csv', patterns)
+    if 'k' in stages:
+        plan['k'] = [os.path.join(result_path, 'merged.csv')]
+    if 'l' in stages:
+        plan['l'] = [os.path.join(result_path, 'merged.csv')]
+    if 'w' in stages:
+        plan['w'] = [os.path.join(result_path, 'merged.csv')]
+    for name, files in plan.items():
+        logging.info(f"{name}: 将处理 {len(files)} 个文件" + (f"：{', '.join(files[:10])}" if files else '')
+                     + (' ...' if len(files) > 10 else ''))
+    return plan
+
+
+def main(stages='d', folder_path='./Data/J', result_path='./Result', patterns=None, workers=None, executors=None,
+         incremental=False, dry_run=False, profiler=None):
+    # workers、executors 为 stage_options 的结果，可以为每个阶段单独设置
+    workers = workers or stage_options([])
+    executors = executors or stage_options([], default='process')
+    csv_path = os.path.join(result_path, 'csv')
+    final_path = os.path.join(result_path, 'final')
+    # 每次转换后都做一次检测
+    if 'b' in stages and 'e' not in stages:
+        stages += 'e'
+    stages = ''.join(name for name in STAGES if name in stages)
+    # 开启性能记录时每个阶段单独计时
+    stage = profiler.stage if profiler else lambda name: nullcontext()
+    if incremental:
+        # 增量模式：只重新执行输入发生变化的节点
+        logging.info(f'增量构建阶段 {stages} ...')
+        with stage('run_pipeline'):
+            run_pipeline(folder_path, result_path, stages, workers, executors, patterns, dry_run)
+        return
+    if dry_run:
+        show_plan(stages, folder_path, result_path, patterns)
+        return
+    os.makedirs(result_path, exist_ok=True)
+
+    def pool(name):
+        return {'max_workers': option(workers, name), 'executor_type': option(executors, name), 'patterns': patterns}
+
+    if 'a' in stages:
         logging.info('提取天文数据...')
-        a_html_info(folder_path)
-    if b:
+        with stage('a_html_info'):
+            a_html_info(folder_path, os.path.join(result_path, 'informations.csv'), **pool('a'))
+    if 'b' in stages:
         logging.info('将TXT文件夹中的文件转换为CSV...')
-        b_convert_csv(folder_path, csv_path)
-    if c:
-        logging.info('打印CSV文件中指定列的所有唯一值...')
-        c_info_value(result_path + '/Informations.csv', 'Epoch of Equinox')
-        c_info_value(result_path + '/Informations.csv', 'Time Scale')
-    if d:
+        with stage('b_convert_csv'):
+            b_convert_csv(folder_path, csv_path, **pool('b'))
+    if 'd' in stages:
         logging.info('提取CSV文件的列名信息...')
-        d_csv_utils(result_path+'/final', sort_by=' ')
-    if e:
+        with stage('d_csv_utils'):
+            d_csv_utils(final_path, ' ', os.path.join(result_path, 'column_info.csv'), **pool('d'))
+    if 'e' in stages:
         logging.info('检测CSV文件的错误信息...')
-        e_errror_info(csv_path)
+        with stage('e_errror_info'):
+            e_errror_info(csv_path, os.path.join(result_path, 'error_info.csv'), **pool('e'))
+    if 'g' in stages:
+        merged_path = os.path.join(result_path, 'merged.csv')
+        logging.info('合并CSV文件...')
+        with stage('merge_csv_files'):
+            # 合并默认单进程顺序写入，只有指定了进程数才分块并行
+            merge_csv_files(final_path, merged_path, **{**pool('g'), 'max_workers': option(workers, 'g') or 1})
+        logging.info('建立观测索引...')
+        with stage('build_index'):
+            build_index(merged_path, os.path.join(result_path, 'informations.csv'),
+                        os.path.join(result_path, 'satellites.csv'))
+    # c 同时统计合并表，放在 g 之后，与 g 一起执行时统计的是本次的合并结果
+    if 'c' in stages:
+        logging.info('统计时间系统、坐标等列的取值...')
+        with stage('c_value_profile'):
+            c_value_profile(os.path.join(result_path, 'informations.csv'),
+                            merged_path=os.path.join(result_path, 'merged.csv'),
+                            output_path=os.path.join(result_path, 'value_profile.json'))
+    if 'k' in stages:
+        logging.info('统一观测时刻的时间系统...')
+        with stage('normalize_times'):
+            normalize_times(os.path.join(result_path, 'merged.csv'), os.path.join(result_path, 'informations.csv'),
+                            os.path.join(result_path, 'epochs.csv'), os.path.join(result_path, 'formats.csv'))
+    if 'l' in stages:
+        logging.info('将赤经赤纬转换到 J2000...')
+        with stage('convert_frames'):
+            convert_frames(os.path.join(result_path, 'merged.csv'), os.path.join(result_path, 'informations.csv'),
+                           os.path.join(result_path, 'frames.csv'), os.path.join(result_path, 'epochs.csv'))
+    if 'w' in stages:
+        logging.info('查找重复的观测...')
+        with stage('w_csv_dedup'):
+            w_csv_dedup(os.path.join(result_path, 'merged.csv'), os.path.join(result_path, 'informations.csv'),
+                        os.path.join(result_path, 'satellites.csv'))
 
 if __name__ == '__main__':
-    folder_path = './Data/J'
-    result_path = './Result'
-    csv_path = './Result/csv'
-    main(a=False, b=False, c=False, d=True, e=False)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('stages', nargs='?', default='d', help=f'要执行的阶段，例如 abd，可选 {STAGES}；执行 b 时总会执行 e')
+    parser.add_argument('--input', default='./Data/J', help='NSDC 的 html 和 txt 文件所在的文件夹')
+    parser.add_argument('--output', default='./Result', help='结果文件夹，其中 csv、final 为各阶段的子文件夹')
+    parser.add_argument('--files', metavar='GLOB', action='append', help='只处理文件 id 匹配的文件，例如 jo00*，可重复指定')
+    parser.add_argument('--workers', metavar='[STAGE=]N', action='append',
+                        help='进程（线程）数，例如 8 或 b=16、de=4，可重复指定')
+    parser.add_argument('--executor', metavar='[STAGE=]TYPE', action='append',
+                        help=f"执行方式 {'/'.join(EXECUTOR_TYPES)}，例如 thread 或 g=thread，可重复指定")
+    parser.add_argument('--incremental', action='store_true', help='只重新执行输入发生变化的节点')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要重新处理的文件或节点，不执行')
+    parser.add_argument('--profile', metavar='DIR', help='记录各阶段和每个文件的耗时，输出 DIR/profile.json 和 DIR/trace.json')
+    parser.add_argument('--cprofile', action='store_true', help='同时用 cProfile 记录每个阶段，保存为 DIR/<阶段>.prof')
+    parser.add_argument('--tracemalloc', action='store_true', help='同时用 tracemalloc 记录每个阶段的内存峰值')
+    args = parser.parse_args()
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知的阶段 {''.join(sorted(unknown))}，可选 {STAGES}")
+    try:
+        workers = stage_options(args.workers, int)
+        executors = stage_options(args.executor, default='process')
+    except ValueError as e:
+        parser.error(str(e))
+    for executor_type in executors.values():
+        if executor_type not in EXECUTOR_TYPES:
+            parser.error(f"未知的执行方式 {executor_type}，可选 {', '.join(EXECUTOR_TYPES)}")
+    profiler = Profiler(args.profile, args.cprofile, args.tracemalloc) if args.profile and not args.dry_run else None
 
+    main(args.stages, args.input, args.output, args.files, workers, executors, args.incremental, args.dry_run, profiler)
+    if profiler:
+        profiler.finish()